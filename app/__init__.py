@@ -8,9 +8,11 @@ from .extensions import db
 from .models import CryptoReport as Report
 
 # Import các blueprints và services khác
-from .utils.cache import cache
+from .utils.enhanced_cache import init_cache
 from .blueprints.crypto import crypto_bp
 from .services.auto_report_scheduler import start_auto_report_scheduler
+from .services.market_history import market_history
+from .services.market_poller import market_poller
 
 # Import WebSocket manager và progress tracker
 from .websocket.manager import websocket_manager
@@ -33,13 +35,15 @@ def create_app():
 
     # Khởi tạo các phần mở rộng
     db.init_app(app)
-    cache.init_app(app)
+    init_cache(app)
+    market_history.init_app(app)
     
     # Initialize WebSocket manager
     websocket_manager.init_app(app)
     
     # Connect progress tracker to WebSocket manager
     progress_tracker.set_websocket_manager(websocket_manager)
+    market_poller.set_websocket_manager(websocket_manager)
 
     # Initialize database tables in a non-blocking way for Railway
     def init_database():
@@ -67,6 +71,11 @@ def create_app():
     # Khởi động auto report scheduler
     start_auto_report_scheduler(app)
 
+    # Compile report workflow trước ở background để lần tạo báo cáo đầu không phải chờ
+    if os.getenv('WORKFLOW_WARMUP', 'true').lower() == 'true':
+        from .services.report_workflow_v2 import warmup_report_workflow
+        warmup_report_workflow()
+
     # Đăng ký routes
     register_all_routes(app)
     
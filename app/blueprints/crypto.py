@@ -1,9 +1,11 @@
-from flask import Blueprint, jsonify
-from ..utils.cache import cache
-from ..services import coingecko, alternative_me, taapi
+from flask import Blueprint, Response, jsonify, request
+from ..services import market_data, indicators
+from ..services.market_poller import market_poller, is_market_poller_enabled
+from ..services.market_history import market_history
+from ..services.api_client import response_cache
+from ..services import llm_gateway
+from ..utils.rate_limiter import api_service_manager
 import time
-import concurrent.futures
-import threading
 
 crypto_bp = Blueprint('crypto', __name__)
 
@@ -31,17 +33,14 @@ def api_status():
     """
     current_time = time.time()
     
-    # Lấy thông tin rate limiting từ TAAPI
-    time_since_last_taapi = current_time - taapi._last_request_time if hasattr(taapi, '_last_request_time') else 0
-    min_interval = getattr(taapi, '_min_request_interval', 60)
-    
     status = {
-        "taapi": {
-            "last_request_ago": int(time_since_last_taapi),
-            "min_interval": min_interval,
-            "can_request_now": time_since_last_taapi >= min_interval,
-            "wait_time": max(0, int(min_interval - time_since_last_taapi))
-        },
+        # Rate limiter + circuit breaker của từng upstream (coingecko, taapi, ...)
+        "services": api_service_manager.get_all_stats(),
+        "http_cache": response_cache.stats(),
+        "sources": market_data.market_data_cache.stats(),
+        "poller": market_poller.stats(),
+        # Gateway Gemini của report workflow: cache, budget, latency/token theo model
+        "llm": llm_gateway.gateway.stats(),
         "timestamp": int(current_time)
     }
     
@@ -49,132 +48,74 @@ def api_status():
 
 
 
+@crypto_bp.route('/indicators')
+def technical_indicators():
+    """
+    RSI-14, EMA, MACD và Bollinger Bands của BTC tính cục bộ từ nến OHLC.
+    Query param: interval=1d|1h (mặc định 1d).
+    """
+    data, error, status_code = indicators.get_indicators(request.args.get('interval', '1d'))
+    if error:
+        return jsonify({"error": error}), status_code
+    return jsonify(data)
+
+
+@crypto_bp.route('/history')
+def market_history_series():
+    """
+    Lịch sử OHLC của một chỉ số thị trường dạng cột {t, o, h, l, c, n}.
+    Query params: metric (vd. btc_price_usd), resolution=1m|1h|1d, start/end (unix seconds).
+    """
+    metric = request.args.get('metric', 'btc_price_usd')
+    resolution = request.args.get('resolution', '1h')
+    try:
+        start = request.args.get('start', type=float)
+        end = request.args.get('end', type=float)
+        return jsonify(market_history.query(metric, resolution, start, end))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@crypto_bp.route('/markets')
+def watchlist_markets():
+    """
+    Giá, thay đổi 24h, vốn hóa và volume của các coin trong watchlist,
+    dạng cột {id, symbol, name, price_usd, change_24h, market_cap, volume_24h, last_updated}.
+    """
+    data, error, status_code = market_data.market_data_cache.get("watchlist")
+    if error:
+        return jsonify({"error": error}), status_code
+    return jsonify(data)
+
+
+@crypto_bp.route('/markets/<symbol>')
+def watchlist_market(symbol):
+    """Dữ liệu một coin trong watchlist theo symbol (vd. ETH) hoặc CoinGecko id."""
+    data, error, status_code = market_data.get_watchlist_market(symbol)
+    if error:
+        return jsonify({"error": error}), status_code
+    return jsonify(data)
+
+
 @crypto_bp.route('/dashboard-summary')
-@cache.cached(timeout=300)  # Cache trong 5 phút thay vì 10 phút để cân bằng fresh data vs performance
 def dashboard_summary():
     """
     Endpoint tổng hợp, trả về tất cả dữ liệu cần thiết cho dashboard chính
     chỉ trong một lần gọi API để tối ưu tốc độ tải trang.
-    Sử dụng parallel API calls để giảm thời gian xử lý.
+    Payload được background poller tính sẵn và serialize thành JSON bytes;
+    nếu poller chưa có dữ liệu thì fallback sang SWR cache, nơi request đồng
+    thời dùng chung một lần fetch upstream.
     """
     try:
-        # Định nghĩa các service calls
-        def call_global_data():
-            return coingecko.get_global_market_data()
-        
-        def call_btc_data():
-            return coingecko.get_btc_price()
-        
-        def call_fng_data():
-            return alternative_me.get_fng_index()
-        
-        def call_rsi_data():
-            return taapi.get_btc_rsi()
-        
-        # Gọi tất cả API song song với timeout
-        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
-            future_global = executor.submit(call_global_data)
-            future_btc = executor.submit(call_btc_data)
-            future_fng = executor.submit(call_fng_data)
-            future_rsi = executor.submit(call_rsi_data)
-            
-            # Xử lý từng API call riêng biệt với timeout 15 giây cho mỗi cái
-            timeout_warnings = {}
-            
-            # Xử lý Global Market Data
-            try:
-                global_data, global_error, global_status = future_global.result(timeout=15)
-            except concurrent.futures.TimeoutError:
-                global_data = {"market_cap": None, "volume_24h": None}
-                global_error = "Timeout"
-                global_status = 408
-                timeout_warnings["global_data"] = "API timeout - using default values"
-            
-            # Xử lý BTC Data
-            try:
-                btc_data, btc_error, btc_status = future_btc.result(timeout=15)
-            except concurrent.futures.TimeoutError:
-                btc_data = {"btc_price_usd": None, "btc_change_24h": None}
-                btc_error = "Timeout"
-                btc_status = 408
-                timeout_warnings["btc_data"] = "API timeout - using default values"
-            
-            # Xử lý Fear & Greed Data
-            try:
-                fng_data, fng_error, fng_status = future_fng.result(timeout=15)
-            except concurrent.futures.TimeoutError:
-                fng_data = {"fng_value": 50, "fng_value_classification": "Neutral"}
-                fng_error = "Timeout"
-                fng_status = 408
-                timeout_warnings["fng_data"] = "API timeout - using default values"
-            
-            # Xử lý RSI Data
-            try:
-                rsi_data, rsi_error, rsi_status = future_rsi.result(timeout=15)
-            except concurrent.futures.TimeoutError:
-                rsi_data = {"rsi_14": 50}
-                rsi_error = "Timeout"
-                rsi_status = 408
-                timeout_warnings["rsi_data"] = "API timeout - using default values"
-
-        # Phân loại lỗi: critical vs non-critical
-        critical_errors = {}
-        warnings = {}
-        
-        # Thêm timeout warnings vào warnings
-        warnings.update(timeout_warnings)
-        
-        # Kiểm tra từng service (không coi timeout là critical error)
-        if global_error and global_status != 408:  # 408 là timeout
-            if global_status == 429:
-                warnings["global_data"] = "Rate limit reached - using cached data"
-            else:
-                critical_errors["global_data"] = global_error
-                
-        if btc_error and btc_status != 408:  # 408 là timeout
-            if btc_status == 429:
-                warnings["btc_data"] = "Rate limit reached - using cached data"
-            else:
-                critical_errors["btc_data"] = btc_error
-                
-        if fng_error and fng_status != 408:  # 408 là timeout
-            if fng_status == 429:
-                warnings["fng_data"] = "Rate limit reached - using default value"
-                fng_data = {"fng_value": 50, "fng_value_classification": "Neutral"}
-            elif "Timeout" not in str(fng_error):  # Không hiển thị timeout warning 2 lần
-                warnings["fng_data"] = fng_error
-                fng_data = {"fng_value": 50, "fng_value_classification": "Neutral"}
-                
-        if rsi_error and rsi_status != 408:  # 408 là timeout
-            if rsi_status == 429:
-                warnings["rsi_data"] = "Rate limit reached - using default value"
-                rsi_data = {"rsi_14": 50}
-            elif "Timeout" not in str(rsi_error):  # Không hiển thị timeout warning 2 lần
-                warnings["rsi_data"] = rsi_error
-                rsi_data = {"rsi_14": 50}
-                warnings["rsi_data"] = rsi_error
-            # Nếu là timeout hoặc lỗi khác, đã set default value ở trên
-
-        # Chỉ fail request nếu có critical error (không phải rate limit)
-        if critical_errors:
-            return jsonify({
-                "errors": critical_errors,
-                "warnings": warnings
-            }), 500
-
-        # Kết hợp tất cả dữ liệu thành một object duy nhất
-        combined_data = {
-            **(global_data or {}),
-            **(btc_data or {}),
-            **(fng_data or {}),
-            **(rsi_data or {}),
-        }
-        
-        # Thêm thông tin warnings nếu có
-        if warnings:
-            combined_data["warnings"] = warnings
+        if is_market_poller_enabled():
+            market_poller.ensure_started()
+            snapshot = market_poller.get_payload()
+            if snapshot is not None:
+                body, status_code = snapshot
+                return Response(body, status=status_code, mimetype='application/json')
 
-        return jsonify(combined_data)
+        payload, status_code = market_data.build_dashboard_summary()
+        return jsonify(payload), status_code
     
     except Exception as e:
         # Log lỗi để debug
@@ -92,3 +92,7 @@ def configure_app(app):
     else:
         app.config['CACHE_TYPE'] = 'SimpleCache'
         print("INFO: Using in-memory SimpleCache. For production, set REDIS_URL.")
+
+    # --- WEBSOCKET BACKPLANE ---
+    # Nhiều gunicorn worker cần message queue chung để broadcast đến mọi client
+    app.config['SOCKETIO_MESSAGE_QUEUE'] = os.getenv('SOCKETIO_MESSAGE_QUEUE') or os.getenv('REDIS_URL')
@@ -20,4 +20,46 @@ class CryptoReport(db.Model):
     created_at = db.Column(db.DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
 
     def __repr__(self):
-        return f'<CryptoReport {self.id}>'
\ No newline at end of file
+        return f'<CryptoReport {self.id}>'
+
+class MarketSnapshot(db.Model):
+    """
+    Bucket OHLC đã đóng của một chỉ số thị trường (giá BTC, market cap, F&G, RSI...).
+    Bucket 1m chỉ giữ trong bộ nhớ; bucket 1h và 1d được lưu để truy vấn lịch sử dài hạn.
+    """
+    __tablename__ = 'market_snapshot'
+    __table_args__ = (
+        db.UniqueConstraint('metric', 'resolution', 'bucket_start', name='uq_market_snapshot_bucket'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    metric = db.Column(db.String(64), nullable=False, index=True)
+    resolution = db.Column(db.String(8), nullable=False)
+    bucket_start = db.Column(db.DateTime(timezone=True), nullable=False, index=True)
+    open = db.Column(db.Float, nullable=False)
+    high = db.Column(db.Float, nullable=False)
+    low = db.Column(db.Float, nullable=False)
+    close = db.Column(db.Float, nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=1)
+
+    def __repr__(self):
+        return f'<MarketSnapshot {self.metric} {self.resolution} {self.bucket_start}>'
+
+
+class WorkflowCheckpoint(db.Model):
+    """
+    Checkpoint của một lần chạy report workflow: state sau node thành công cuối cùng,
+    để chạy lại từ node kế tiếp khi một bước sau (CSS, dịch...) lỗi.
+    Không lưu Gemini client, API key và prompt (được tạo lại ở prepare_data).
+    """
+    __tablename__ = 'workflow_checkpoint'
+    session_id = db.Column(db.String(64), primary_key=True)
+    last_node = db.Column(db.String(64), nullable=False)
+    completed_nodes = db.Column(db.Text, nullable=False, default='[]')  # JSON list
+    state = db.Column(db.Text, nullable=False)  # JSON object
+    status = db.Column(db.String(16), nullable=False, default='running')  # running | failed
+    updated_at = db.Column(db.DateTime(timezone=True), nullable=False,
+                           default=lambda: datetime.now(timezone.utc),
+                           onupdate=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f'<WorkflowCheckpoint {self.session_id} {self.last_node}>'
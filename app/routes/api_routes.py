@@ -3,10 +3,11 @@
 import os
 import threading
 import time
-from flask import jsonify
+from flask import Response, jsonify, request
 from ..models import CryptoReport as Report
 from ..services.progress_tracker import progress_tracker
 from ..utils.database_health import DatabaseHealthChecker
+from ..utils.enhanced_cache import cache_metrics, cache_metrics_prometheus
 
 
 def register_api_routes(app):
@@ -53,6 +54,16 @@ def register_api_routes(app):
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
+    @app.route('/api/metrics/cache')
+    def cache_metrics_api():
+        """
+        Metrics cache theo namespace/tier: hits, misses, sets, evictions, bytes và latency.
+        ?format=prometheus trả về Prometheus text format để scrape.
+        """
+        if request.args.get('format') == 'prometheus':
+            return Response(cache_metrics_prometheus(), mimetype='text/plain; version=0.0.4')
+        return jsonify(cache_metrics())
+
     @app.route('/api/health')
     def api_health_check():
         """Ultra-simple health check for Railway"""
@@ -5,6 +5,12 @@ from datetime import timezone
 from flask import render_template, request, flash, jsonify, send_from_directory, abort
 from ..extensions import db
 from ..models import CryptoReport as Report
+from ..utils.enhanced_cache import EnhancedCache, CacheStrategy
+
+# Trang báo cáo đã render được cache theo tag "reports"/"report:<id>" và bị
+# invalidate ngay khi có báo cáo mới được lưu
+PAGE_CACHE_TIMEOUT = 3600
+page_cache = EnhancedCache(CacheStrategy.HYBRID)
 
 
 def register_main_routes(app):
@@ -17,29 +23,41 @@ def register_main_routes(app):
         """Health check endpoint for Railway"""
         return jsonify({'status': 'healthy', 'message': 'Crypto Dashboard is running'}), 200
     
+    def _ensure_archive(report_id):
+        """Tạo file lưu trữ HTML cho báo cáo mới nhất nếu chưa có (chỉ khi dùng SimpleCache)"""
+        try:
+            archive_dir = os.path.join(app.instance_path, 'archive')
+            os.makedirs(archive_dir, exist_ok=True)
+            archive_filename = f"report_{report_id}.html"
+            archive_filepath = os.path.join(archive_dir, archive_filename)
+            if not os.path.exists(archive_filepath):
+                print(f"INFO: File lưu trữ {archive_filepath} chưa tồn tại. Đang tạo...")
+                archived_html_content = render_template(
+                    'index.html', 
+                    report=db.session.get(Report, report_id)
+                )
+                with open(archive_filepath, 'w', encoding='utf-8') as f:
+                    f.write(archived_html_content)
+                flash(f"Đã tạo thành công file lưu trữ: {archive_filename}", "success")
+                print(f"SUCCESS: Đã tạo file lưu trữ tại {archive_filepath}")
+        except Exception as e:
+            print(f"ERROR: Không thể tạo file lưu trữ. Lỗi: {e}")
+            flash(f"Lưu ý: Không thể tạo file lưu trữ cho báo cáo. Lỗi: {e}", "warning")
+
     @app.route('/')
     def index():
+        # Kiểm tra file lưu trữ trước khi trả trang từ cache, để cache hit không bỏ qua bước này
+        if app.config['CACHE_TYPE'] == 'SimpleCache':
+            latest_id = db.session.query(Report.id).order_by(Report.created_at.desc()).first()
+            if latest_id:
+                _ensure_archive(latest_id[0])
+
+        cached_page = page_cache.get("index", namespace="pages")
+        if cached_page is not None:
+            return cached_page
+
         latest_report = Report.query.order_by(Report.created_at.desc()).first()
 
-        if latest_report and app.config['CACHE_TYPE'] == 'SimpleCache':
-            try:
-                archive_dir = os.path.join(app.instance_path, 'archive')
-                os.makedirs(archive_dir, exist_ok=True)
-                archive_filename = f"report_{latest_report.id}.html"
-                archive_filepath = os.path.join(archive_dir, archive_filename)
-                if not os.path.exists(archive_filepath):
-                    print(f"INFO: File lưu trữ {archive_filepath} chưa tồn tại. Đang tạo...")
-                    archived_html_content = render_template(
-                        'index.html', 
-                        report=latest_report
-                    )
-                    with open(archive_filepath, 'w', encoding='utf-8') as f:
-                        f.write(archived_html_content)
-                    flash(f"Đã tạo thành công file lưu trữ: {archive_filename}", "success")
-                    print(f"SUCCESS: Đã tạo file lưu trữ tại {archive_filepath}")
-            except Exception as e:
-                print(f"ERROR: Không thể tạo file lưu trữ. Lỗi: {e}")
-                flash(f"Lưu ý: Không thể tạo file lưu trữ cho báo cáo. Lỗi: {e}", "warning")
         # Ensure created_at is timezone-aware UTC for templates
         if latest_report and latest_report.created_at is not None:
             try:
@@ -51,10 +69,18 @@ def register_main_routes(app):
                 # if any unexpected type, leave as-is and let template handle it
                 pass
 
-        return render_template('index.html', report=latest_report)
+        html = render_template('index.html', report=latest_report)
+        if latest_report:
+            page_cache.set("index", html, PAGE_CACHE_TIMEOUT, namespace="pages",
+                           tags=["reports", f"report:{latest_report.id}"])
+        return html
 
     @app.route('/report/<int:report_id>')
     def view_report(report_id):
+        cached_page = page_cache.get(f"report_{report_id}", namespace="pages")
+        if cached_page is not None:
+            return cached_page
+
         report = db.get_or_404(Report, report_id)
         if report and report.created_at is not None:
             try:
@@ -64,7 +90,10 @@ def register_main_routes(app):
                     report.created_at = report.created_at.astimezone(timezone.utc)
             except Exception:
                 pass
-        return render_template('index.html', report=report)
+        html = render_template('index.html', report=report)
+        page_cache.set(f"report_{report_id}", html, PAGE_CACHE_TIMEOUT, namespace="pages",
+                       tags=[f"report:{report_id}"])
+        return html
 
     @app.route('/pdf-template/<int:report_id>')
     def pdf_template(report_id):
@@ -8,6 +8,7 @@ from ..extensions import db
 from ..models import CryptoReport as Report
 from ..services.report_generator import create_report_from_content
 from ..services.progress_tracker import progress_tracker
+from ..utils.enhanced_cache import invalidate_tags
 
 
 def register_report_routes(app):
@@ -42,6 +43,7 @@ def register_report_routes(app):
                 )
                 db.session.add(new_report)
                 db.session.commit()
+                invalidate_tags("reports", f"report:{new_report.id}")
 
                 return jsonify({'success': True, 'message': 'Báo cáo đã được tạo và cập nhật thành công!'})
 
@@ -94,6 +96,52 @@ def register_report_routes(app):
         except Exception as e:
             return jsonify({'success': False, 'message': f'Đã xảy ra lỗi không mong muốn: {e}'})
 
+    @app.route('/resume-auto-report/<session_id>', methods=['POST'])
+    def resume_auto_report(session_id):
+        """Chạy lại session tạo báo cáo bị lỗi từ node thành công cuối cùng (checkpoint)"""
+        try:
+            api_key = os.getenv('GEMINI_API_KEY')
+
+            if not api_key:
+                return jsonify({'success': False, 'message': 'Vui lòng cung cấp API Key hoặc thiết lập GEMINI_API_KEY.'})
+
+            from ..services.workflow_checkpoints import checkpoint_store
+            from ..services.report_workflow_v2 import resume_report_workflow_v2
+
+            checkpoint = checkpoint_store.load(session_id)
+            resume_from = checkpoint_store.resume_point(checkpoint)
+            if resume_from is None:
+                return jsonify({'success': False, 'message': 'Không có checkpoint để resume cho session này'}), 404
+            if not checkpoint_store.is_resumable(checkpoint):
+                return jsonify({'success': False, 'message': 'Session đang chạy, chưa thể resume'}), 409
+
+            def run_resume_background():
+                """Resume workflow V2 trong background thread với application context"""
+                with app.app_context():
+                    try:
+                        result = resume_report_workflow_v2(api_key, session_id)
+                        print(f"Workflow V2 resumed: {result.get('success')} (session {session_id})")
+                    except Exception as e:
+                        print(f"Workflow resume error: {e}")
+                        progress_tracker.error_progress(session_id, f"Lỗi workflow: {e}")
+
+            progress_tracker.start_progress(session_id)
+
+            thread = threading.Thread(target=run_resume_background)
+            thread.daemon = True
+            thread.start()
+
+            return jsonify({
+                'success': True,
+                'message': f'Đã resume tạo báo cáo từ bước {resume_from}',
+                'session_id': session_id,
+                'resume_from': resume_from,
+                'completed_nodes': checkpoint.get('completed_nodes', [])
+            })
+
+        except Exception as e:
+            return jsonify({'success': False, 'message': f'Đã xảy ra lỗi không mong muốn: {e}'})
+
     @app.route('/report-fragment/<int:report_id>', methods=['GET'])
     def report_fragment(report_id):
         """
@@ -1,15 +1,12 @@
 import os
-from .api_client import fetch_json
+from .api_client import fetch_service_json, fetch_service_json_async, with_backup
+
+SERVICE_NAME = "alternative_me"
 
 BASE_FNG_URL = "https://api.alternative.me/fng/?limit=1"
 
-def get_fng_index():
-    """Lấy chỉ số Fear & Greed từ Alternative.me."""
-    json_data, error, status_code = fetch_json(BASE_FNG_URL)
-
-    if error:
-        return None, error, status_code
 
+def _parse_fng_index(json_data):
     try:
         fng_data = json_data.get('data', [{}])[0]
         data = {
@@ -18,4 +15,22 @@ def get_fng_index():
         }
         return data, None, 200
     except (IndexError, KeyError) as e:
-        return None, f"Lỗi xử lý dữ liệu F&G: {e}", 500
\ No newline at end of file
+        return None, f"Lỗi xử lý dữ liệu F&G: {e}", 500
+
+
+def _fng_result(json_data, error, status_code):
+    if error:
+        return None, error, status_code
+    return _parse_fng_index(json_data)
+
+
+def get_fng_index():
+    """Lấy chỉ số Fear & Greed từ Alternative.me (lỗi/circuit mở thì dùng backup cache)."""
+    result = _fng_result(*fetch_service_json(SERVICE_NAME, BASE_FNG_URL))
+    return with_backup("fng_index", result, max_age_hours=24)
+
+
+async def get_fng_index_async():
+    """Biến thể asyncio của get_fng_index."""
+    result = _fng_result(*await fetch_service_json_async(SERVICE_NAME, BASE_FNG_URL))
+    return with_backup("fng_index", result, max_age_hours=24)
@@ -1,5 +1,310 @@
+"""
+HTTP client dùng chung cho các upstream API (CoinGecko, Alternative.me, TAAPI).
+
+Mỗi host có một Session riêng với connection pool keep-alive, nên các lần gọi
+lặp lại không phải bắt tay TCP+TLS lại từ đầu. Hỗ trợ tách connect/read timeout,
+retry với exponential backoff + jitter và (tùy chọn) HTTP/2 qua httpx.
+fetch_json_async là biến thể asyncio dùng httpx.AsyncClient với cùng chính sách.
+
+Response được cache theo URL cùng validator (ETag/Last-Modified): còn trong max-age
+của Cache-Control thì trả ngay không gọi mạng, hết hạn thì gửi If-None-Match /
+If-Modified-Since để upstream trả 304 thay vì cả body.
+
+fetch_service_json/fetch_service_json_async đi qua api_service_manager: quota dùng
+chung và circuit breaker theo service, circuit mở thì trả lỗi ngay không gọi mạng.
+"""
+import os
+import asyncio
+import random
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
 import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException, HTTPError, ConnectionError, Timeout
+from urllib3.util.retry import Retry
+
+from ..utils.async_runtime import async_runtime
+from ..utils.rate_limiter import api_service_manager, CircuitState
+from ..utils.enhanced_cache import get_backup_cache, set_backup_cache
+from ..utils.memory_cache import BoundedMemoryCache
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:  # HTTP/2 là tùy chọn: cần httpx và h2
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = httpx is not None
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+DEFAULT_CONNECT_TIMEOUT = 3.05
+USER_AGENT = "crypto-dashboard-app/0.1"
+
+# Kích thước pool theo host: số kết nối keep-alive tối đa giữ cho mỗi upstream
+HOST_POOL_SIZES = {
+    "api.coingecko.com": 8,
+    "api.alternative.me": 4,
+    "api.taapi.io": 2,
+    "data-api.binance.vision": 2,
+}
+DEFAULT_POOL_SIZE = 4
+
+
+@dataclass
+class RetryPolicy:
+    """Chính sách retry cho lỗi kết nối và lỗi 5xx tạm thời"""
+    total: int = 2
+    backoff_factor: float = 0.3
+    max_backoff: float = 5.0
+    status_forcelist: tuple = (500, 502, 503, 504)
+
+    def backoff(self, attempt):
+        """Full jitter: chờ ngẫu nhiên trong [0, backoff_factor * 2^attempt]"""
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * (2 ** attempt)))
+
+
+class JitterRetry(Retry):
+    """urllib3 Retry với full jitter để tránh các worker retry đồng loạt"""
+
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        return random.uniform(0, backoff) if backoff > 0 else 0
+
+
+retry_policy = RetryPolicy()
+
+
+def _use_http2():
+    return HTTP2_AVAILABLE and os.getenv('API_CLIENT_HTTP2', 'false').lower() == 'true'
+
+
+class SessionRegistry:
+    """Quản lý một Session keep-alive cho mỗi host, tạo lại sau khi fork"""
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def get(self, url):
+        host = urlsplit(url).hostname or ""
+        if self._pid != os.getpid():
+            # Process được fork (gunicorn): không dùng lại socket của process cha
+            with self._lock:
+                self._sessions = {}
+                self._pid = os.getpid()
+
+        session = self._sessions.get(host)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(host)
+                if session is None:
+                    session = self._create_session(host)
+                    self._sessions[host] = session
+        return session
+
+    def _create_session(self, host):
+        pool_size = HOST_POOL_SIZES.get(host, DEFAULT_POOL_SIZE)
+        headers = {"Accept": "application/json", "User-Agent": USER_AGENT}
+
+        if _use_http2():
+            return httpx.Client(
+                http2=True,
+                headers=headers,
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+                transport=httpx.HTTPTransport(http2=True, retries=retry_policy.total),
+            )
+
+        session = requests.Session()
+        session.headers.update(headers)
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            max_retries=JitterRetry(
+                total=retry_policy.total,
+                backoff_factor=retry_policy.backoff_factor,
+                status_forcelist=retry_policy.status_forcelist,
+                allowed_methods=frozenset(["GET"]),
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            ),
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def close_all(self):
+        with self._lock:
+            for session in self._sessions.values():
+                try:
+                    session.close()
+                except Exception:
+                    pass
+            self._sessions = {}
+
+
+session_registry = SessionRegistry()
+
+
+def _parse_cache_control(value):
+    directives = {}
+    for part in (value or "").split(","):
+        name, _, arg = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = arg.strip().strip('"')
+    return directives
+
+
+def freshness_lifetime(headers):
+    """
+    Số giây response còn fresh theo Cache-Control max-age (trừ Age) hoặc Expires - Date.
+    None nếu không được cache (no-store); 0 nếu luôn phải revalidate.
+    """
+    directives = _parse_cache_control(headers.get("Cache-Control"))
+    if "no-store" in directives:
+        return None
+    if "no-cache" in directives:
+        return 0
+    try:
+        age = int(headers.get("Age") or 0)
+    except ValueError:
+        age = 0
+    if "max-age" in directives:
+        try:
+            return max(0, int(directives["max-age"]) - age)
+        except ValueError:
+            return 0
+    expires, date = headers.get("Expires"), headers.get("Date")
+    if expires and date:
+        try:
+            return max(0, int((parsedate_to_datetime(expires) - parsedate_to_datetime(date)).total_seconds()) - age)
+        except (TypeError, ValueError):
+            return 0
+    return 0
+
+
+class _CachedResponse:
+    __slots__ = ("data", "etag", "last_modified", "fresh_until", "size")
+
+    def __init__(self, data, etag, last_modified, fresh_until, size=0):
+        self.data = data
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fresh_until = fresh_until
+        # Số byte của body gốc, giữ nguyên khi entry được gia hạn bởi 304
+        self.size = size
+
+
+class HttpResponseCache:
+    """
+    Cache body JSON đã parse + validator theo URL, dùng chung cho sync/async client.
+    Entry được giữ `retention` giây sau lần cập nhật cuối để còn revalidate sau khi hết max-age.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=16 * 1024 * 1024, retention=3600):
+        self.retention = retention
+        self._entries = BoundedMemoryCache(max_entries=max_entries, max_bytes=max_bytes)
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+
+    def get(self, url):
+        return self._entries.get(url)
+
+    def fresh(self, url):
+        """Body còn fresh (không cần gọi upstream) hoặc None"""
+        entry = self._entries.get(url)
+        if entry is not None and time.monotonic() < entry.fresh_until:
+            self.hits += 1
+            return entry.data
+        return None
+
+    @staticmethod
+    def conditional_headers(entry):
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def store(self, url, data, headers, size):
+        self.misses += 1
+        lifetime = freshness_lifetime(headers)
+        etag, last_modified = headers.get("ETag"), headers.get("Last-Modified")
+        if lifetime is None or (lifetime == 0 and not etag and not last_modified):
+            self._entries.delete(url)
+            return
+        entry = _CachedResponse(data, etag, last_modified, time.monotonic() + lifetime, size)
+        self._entries.set(url, entry, ttl=max(self.retention, lifetime), size=size)
+
+    def revalidated(self, url, entry, headers):
+        """Upstream trả 304: gia hạn entry cũ theo header mới, trả lại body đã cache"""
+        self.revalidations += 1
+        lifetime = freshness_lifetime(headers) or 0
+        entry.etag = headers.get("ETag") or entry.etag
+        entry.last_modified = headers.get("Last-Modified") or entry.last_modified
+        entry.fresh_until = time.monotonic() + lifetime
+        self._entries.set(url, entry, ttl=max(self.retention, lifetime), size=entry.size)
+        return entry.data
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "revalidations": self.revalidations,
+            "misses": self.misses,
+        }
+
+
+response_cache = HttpResponseCache()
+
+
+def _split_timeout(timeout):
+    """timeout có thể là số (read timeout) hoặc tuple (connect, read)"""
+    if isinstance(timeout, (tuple, list)):
+        return tuple(timeout)
+    return (min(DEFAULT_CONNECT_TIMEOUT, timeout), timeout)
+
+
+def _fetch_json_http2(client, url, timeout, entry):
+    connect_timeout, read_timeout = _split_timeout(timeout)
+    httpx_timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+
+    for attempt in range(retry_policy.total + 1):
+        try:
+            response = client.get(url, timeout=httpx_timeout, headers=response_cache.conditional_headers(entry))
+            if response.status_code in retry_policy.status_forcelist and attempt < retry_policy.total:
+                time.sleep(retry_policy.backoff(attempt))
+                continue
+            if response.status_code == 304 and entry is not None:
+                return response_cache.revalidated(url, entry, response.headers), None, 200
+            response.raise_for_status()
+            data = response.json()
+            response_cache.store(url, data, response.headers, len(response.content))
+            return data, None, response.status_code
+        except httpx.HTTPStatusError as http_err:
+            return None, f"Lỗi HTTP: {http_err}", http_err.response.status_code
+        except httpx.TimeoutException:
+            return None, "Request timed out", 504
+        except httpx.TransportError as conn_err:
+            return None, f"Lỗi kết nối: {conn_err}", 503
+        except httpx.HTTPError as e:
+            return None, f"Lỗi không xác định: {e}", 500
+        except ValueError:  # Bắt lỗi khi JSON decode thất bại
+            return None, "Lỗi giải mã JSON từ API", 500
+
 
 def fetch_json(url, timeout=5):
     """
@@ -8,7 +313,7 @@ def fetch_json(url, timeout=5):
 
     Args:
         url (str): URL của API.
-        timeout (int): Thời gian chờ tối đa cho request.
+        timeout (float | tuple): Read timeout, hoặc tuple (connect, read).
 
     Returns:
         tuple: (data, error, status_code)
@@ -16,10 +321,24 @@ def fetch_json(url, timeout=5):
                - error (str or None): Thông báo lỗi nếu thất bại.
                - status_code (int): HTTP status code.
     """
+    cached = response_cache.fresh(url)
+    if cached is not None:
+        return cached, None, 200
+    entry = response_cache.get(url)
+
+    session = session_registry.get(url)
+    if HTTP2_AVAILABLE and isinstance(session, httpx.Client):
+        return _fetch_json_http2(session, url, timeout, entry)
+
     try:
-        response = requests.get(url, timeout=timeout)
+        response = session.get(url, timeout=_split_timeout(timeout),
+                               headers=response_cache.conditional_headers(entry))
+        if response.status_code == 304 and entry is not None:
+            return response_cache.revalidated(url, entry, response.headers), None, 200
         response.raise_for_status()
-        return response.json(), None, response.status_code
+        data = response.json()
+        response_cache.store(url, data, response.headers, len(response.content))
+        return data, None, response.status_code
     except HTTPError as http_err:
         return None, f"Lỗi HTTP: {http_err}", http_err.response.status_code
     except ConnectionError as conn_err:
@@ -29,4 +348,154 @@ def fetch_json(url, timeout=5):
     except RequestException as e:
         return None, f"Lỗi không xác định: {e}", 500
     except ValueError: # Bắt lỗi khi JSON decode thất bại
-        return None, "Lỗi giải mã JSON từ API", 500
\ No newline at end of file
+        return None, "Lỗi giải mã JSON từ API", 500
+
+
+# Async clients theo event loop rồi theo host: AsyncClient gắn với loop đã tạo ra nó.
+# Key là chính object loop (weak ref) nên loop bị thu gom thì các client của nó cũng được bỏ
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _get_async_client(url):
+    host = urlsplit(url).hostname or ""
+    loop = asyncio.get_running_loop()
+    # Loop đã đóng nhưng còn được giữ ở đâu đó: client của nó không dùng lại được nữa
+    for stale in [other for other in list(_async_clients) if other.is_closed()]:
+        _async_clients.pop(stale, None)
+    clients = _async_clients.setdefault(loop, {})
+    client = clients.get(host)
+    if client is None:
+        pool_size = HOST_POOL_SIZES.get(host, DEFAULT_POOL_SIZE)
+        client = httpx.AsyncClient(
+            http2=_use_http2(),
+            headers={"Accept": "application/json", "User-Agent": USER_AGENT},
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            transport=httpx.AsyncHTTPTransport(http2=_use_http2(), retries=retry_policy.total),
+        )
+        clients[host] = client
+    return client
+
+
+async def close_async_clients():
+    """Đóng các AsyncClient của loop đang chạy; gọi trước khi dừng một loop tự tạo"""
+    clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.aclose()
+
+
+# Loop dùng chung của process: đóng connection pool trước khi loop dừng lúc thoát
+async_runtime.on_shutdown(close_async_clients)
+
+
+async def fetch_json_async(url, timeout=5):
+    """
+    Biến thể asyncio của fetch_json, trả về cùng format (data, error, status_code).
+    Nếu httpx không được cài đặt thì chạy fetch_json trong thread mặc định của loop.
+    """
+    if httpx is None:
+        return await asyncio.to_thread(fetch_json, url, timeout)
+
+    cached = response_cache.fresh(url)
+    if cached is not None:
+        return cached, None, 200
+    entry = response_cache.get(url)
+
+    client = _get_async_client(url)
+    connect_timeout, read_timeout = _split_timeout(timeout)
+    httpx_timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+
+    for attempt in range(retry_policy.total + 1):
+        try:
+            response = await client.get(url, timeout=httpx_timeout, headers=response_cache.conditional_headers(entry))
+            if response.status_code in retry_policy.status_forcelist and attempt < retry_policy.total:
+                await asyncio.sleep(retry_policy.backoff(attempt))
+                continue
+            if response.status_code == 304 and entry is not None:
+                return response_cache.revalidated(url, entry, response.headers), None, 200
+            response.raise_for_status()
+            data = response.json()
+            response_cache.store(url, data, response.headers, len(response.content))
+            return data, None, response.status_code
+        except httpx.HTTPStatusError as http_err:
+            return None, f"Lỗi HTTP: {http_err}", http_err.response.status_code
+        except httpx.TimeoutException:
+            return None, "Request timed out", 504
+        except httpx.TransportError as conn_err:
+            return None, f"Lỗi kết nối: {conn_err}", 503
+        except httpx.HTTPError as e:
+            return None, f"Lỗi không xác định: {e}", 500
+        except ValueError:  # Bắt lỗi khi JSON decode thất bại
+            return None, "Lỗi giải mã JSON từ API", 500
+
+
+# Chờ tối đa bấy nhiêu giây cho tới lượt trong quota trước khi trả 429
+SERVICE_ACQUIRE_TIMEOUT = 1.0
+
+# Status của kết quả lấy từ backup cache (203 Non-Authoritative Information):
+# vẫn là thành công nhưng không phải giá trị mới từ upstream
+BACKUP_STATUS = 203
+
+
+def _service_unavailable(service_name):
+    limiter = api_service_manager.get_limiter(service_name)
+    if limiter.circuit_state == CircuitState.OPEN:
+        return None, f"{service_name} tạm ngưng (circuit breaker đang mở)", 503
+    return None, f"Rate limit {service_name}: chưa tới lượt gọi API", 429
+
+
+def _record_service_call(service_name, status_code, error, response_time):
+    # 429/5xx/timeout tính là lỗi của upstream; 4xx khác là lỗi request, upstream vẫn sống
+    failed = error is not None and (status_code == 429 or status_code >= 500)
+    api_service_manager.record_api_call(
+        service_name, not failed,
+        response_time=response_time,
+        error_code=status_code if failed else None
+    )
+
+
+def fetch_service_json(service_name, url, timeout=5, acquire_timeout=SERVICE_ACQUIRE_TIMEOUT):
+    """fetch_json qua rate limiter và circuit breaker của service_name"""
+    # Response còn fresh theo Cache-Control: không tốn quota
+    cached = response_cache.fresh(url)
+    if cached is not None:
+        return cached, None, 200
+    if not api_service_manager.acquire(service_name, acquire_timeout):
+        return _service_unavailable(service_name)
+
+    start_time = time.time()
+    data, error, status_code = fetch_json(url, timeout=timeout)
+    _record_service_call(service_name, status_code, error, time.time() - start_time)
+    return data, error, status_code
+
+
+async def fetch_service_json_async(service_name, url, timeout=5, acquire_timeout=SERVICE_ACQUIRE_TIMEOUT):
+    """Biến thể asyncio của fetch_service_json"""
+    cached = response_cache.fresh(url)
+    if cached is not None:
+        return cached, None, 200
+    if not await api_service_manager.acquire_async(service_name, acquire_timeout):
+        return _service_unavailable(service_name)
+
+    start_time = time.time()
+    data, error, status_code = await fetch_json_async(url, timeout=timeout)
+    _record_service_call(service_name, status_code, error, time.time() - start_time)
+    return data, error, status_code
+
+
+def with_backup(backup_key, result, max_age_hours=6):
+    """
+    Kết quả thành công được lưu vào backup cache; khi lỗi (circuit mở, rate limit,
+    upstream down) trả về giá trị backup gần nhất nếu còn hạn, với status BACKUP_STATUS.
+    """
+    data, error, status_code = result
+    try:
+        if error is None:
+            set_backup_cache(backup_key, data, max_age_hours=max_age_hours)
+            return result
+        backup_data = get_backup_cache(backup_key)
+    except Exception as cache_error:
+        print(f"Warning: Backup cache {backup_key} unavailable: {cache_error}")
+        return result
+    if backup_data:
+        return backup_data, None, BACKUP_STATUS
+    return result
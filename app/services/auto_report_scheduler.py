@@ -7,7 +7,8 @@ from google import genai
 from google.genai import types
 from ..extensions import db
 from ..models import CryptoReport as Report
-from .report_workflow_v2 import generate_auto_research_report_langgraph_v2
+from .report_workflow_v2 import generate_auto_research_report_langgraph_v2, resume_report_workflow_v2
+from .workflow_checkpoints import checkpoint_store
 
 
 
@@ -28,6 +29,14 @@ def generate_auto_research_report(api_key, max_attempts=3, use_fallback_on_500=T
     # Sử dụng workflow V2, parameter use_fallback_on_500 được ignore vì V2 có error handling tốt hơn
     result = generate_auto_research_report_langgraph_v2(api_key, max_attempts)
     
+    # Lỗi sau khi nghiên cứu đã PASS (HTML/CSS/dịch/lưu DB): resume một lần từ checkpoint
+    # thay vì để lần chạy sau làm lại cả bước research đắt nhất
+    if isinstance(result, dict) and not result.get('success') and result.get('session_id'):
+        checkpoint = checkpoint_store.load(result['session_id'])
+        if checkpoint and 'validate_report' in checkpoint.get('completed_nodes', []):
+            print(f"[SCHEDULER] Resuming session {result['session_id']} from checkpoint")
+            result = resume_report_workflow_v2(api_key, result['session_id'], max_attempts)
+    
     # Convert dict result to boolean for backward compatibility
     if isinstance(result, dict):
         return result.get('success', False)
@@ -1,16 +1,33 @@
+import hashlib
 import os
-from .api_client import fetch_json
+from .api_client import fetch_service_json, fetch_service_json_async, with_backup
+from ..utils.async_runtime import gather_with_timeouts
+
+SERVICE_NAME = "coingecko"
 
 BASE_GLOBAL_URL = "https://api.coingecko.com/api/v3/global"
 BASE_BTC_PRICE_URL = "https://api.coingecko.com/api/v3/simple/price?ids=bitcoin&vs_currencies=usd&include_24hr_change=true"
+BASE_MARKETS_URL = "https://api.coingecko.com/api/v3/coins/markets?vs_currency=usd&ids={ids}&per_page={per_page}&page=1&price_change_percentage=24h"
 
-def get_global_market_data():
-    """Lấy tổng vốn hóa và khối lượng giao dịch từ CoinGecko."""
-    json_data, error, status_code = fetch_json(BASE_GLOBAL_URL)
+# Số id tối đa mỗi request coins/markets (per_page tối đa của CoinGecko là 250,
+# giữ thấp hơn để URL không quá dài)
+MARKETS_CHUNK_SIZE = 100
+MARKETS_TIMEOUT = 10
+
+# Cột của bảng market dạng columnar: tên cột -> field trong phản hồi coins/markets
+MARKET_COLUMNS = {
+    "id": "id",
+    "symbol": "symbol",
+    "name": "name",
+    "price_usd": "current_price",
+    "change_24h": "price_change_percentage_24h",
+    "market_cap": "market_cap",
+    "volume_24h": "total_volume",
+    "last_updated": "last_updated",
+}
 
-    if error:
-        return None, error, status_code
 
+def _parse_global_market_data(json_data):
     try:
         global_data = json_data.get('data', {})
         data = {
@@ -22,13 +39,7 @@ def get_global_market_data():
         return None, f"Lỗi xử lý dữ liệu từ CoinGecko: {e}", 500
 
 
-def get_btc_price():
-    """Lấy giá và thay đổi 24h của BTC từ CoinGecko."""
-    json_data, error, status_code = fetch_json(BASE_BTC_PRICE_URL)
-
-    if error:
-        return None, error, status_code
-
+def _parse_btc_price(json_data):
     try:
         btc_data = json_data.get('bitcoin', {})
         data = {
@@ -37,4 +48,113 @@ def get_btc_price():
         }
         return data, None, 200
     except (AttributeError, KeyError) as e:
-        return None, f"Lỗi xử lý dữ liệu giá BTC: {e}", 500
\ No newline at end of file
+        return None, f"Lỗi xử lý dữ liệu giá BTC: {e}", 500
+
+
+def _result(parse, json_data, error, status_code):
+    if error:
+        return None, error, status_code
+    return parse(json_data)
+
+
+def get_global_market_data():
+    """Lấy tổng vốn hóa và khối lượng giao dịch từ CoinGecko (lỗi/circuit mở thì dùng backup cache)."""
+    result = _result(_parse_global_market_data, *fetch_service_json(SERVICE_NAME, BASE_GLOBAL_URL))
+    return with_backup("coingecko_global", result)
+
+
+def get_btc_price():
+    """Lấy giá và thay đổi 24h của BTC từ CoinGecko (lỗi/circuit mở thì dùng backup cache)."""
+    result = _result(_parse_btc_price, *fetch_service_json(SERVICE_NAME, BASE_BTC_PRICE_URL))
+    return with_backup("coingecko_btc_price", result)
+
+
+async def get_global_market_data_async():
+    """Biến thể asyncio của get_global_market_data."""
+    result = _result(_parse_global_market_data, *await fetch_service_json_async(SERVICE_NAME, BASE_GLOBAL_URL))
+    return with_backup("coingecko_global", result)
+
+
+async def get_btc_price_async():
+    """Biến thể asyncio của get_btc_price."""
+    result = _result(_parse_btc_price, *await fetch_service_json_async(SERVICE_NAME, BASE_BTC_PRICE_URL))
+    return with_backup("coingecko_btc_price", result)
+
+
+def _markets_backup_key(ids):
+    # Backup theo đúng tập coin được yêu cầu
+    return "coingecko_markets:" + hashlib.sha1(",".join(ids).encode()).hexdigest()[:16]
+
+
+def _chunks(ids):
+    size = MARKETS_CHUNK_SIZE
+    return [ids[i:i + size] for i in range(0, len(ids), size)]
+
+
+def _markets_url(ids):
+    return BASE_MARKETS_URL.format(ids=",".join(ids), per_page=len(ids))
+
+
+def _build_market_table(ids, chunk_results):
+    """
+    Gộp kết quả các chunk thành bảng columnar {cột: [giá trị...]} theo thứ tự của ids.
+    Coin không có trong phản hồi được liệt kê ở "missing".
+    """
+    rows = {}
+    errors = []
+    for json_data, error, status_code in chunk_results:
+        if error:
+            errors.append((error, status_code))
+            continue
+        if not isinstance(json_data, list):
+            errors.append(("Lỗi xử lý dữ liệu markets từ CoinGecko", 500))
+            continue
+        for coin in json_data:
+            if isinstance(coin, dict) and coin.get("id"):
+                rows[coin["id"]] = coin
+
+    if not rows and errors:
+        error, status_code = errors[0]
+        return None, error, status_code
+
+    present = [coin_id for coin_id in ids if coin_id in rows]
+    table = {column: [rows[coin_id].get(field) for coin_id in present]
+             for column, field in MARKET_COLUMNS.items()}
+    table["symbol"] = [symbol.upper() if symbol else symbol for symbol in table["symbol"]]
+    table["missing"] = [coin_id for coin_id in ids if coin_id not in rows]
+    return table, None, 200
+
+
+def get_coin_markets(ids):
+    """
+    Giá, thay đổi 24h, vốn hóa và volume của nhiều coin qua coins/markets,
+    mỗi request tối đa MARKETS_CHUNK_SIZE id. Trả về bảng columnar (xem _build_market_table).
+    """
+    ids = list(ids)
+    results = [fetch_service_json(SERVICE_NAME, _markets_url(chunk), timeout=MARKETS_TIMEOUT)
+               for chunk in _chunks(ids)]
+    return with_backup(_markets_backup_key(ids), _build_market_table(ids, results))
+
+
+async def get_coin_markets_async(ids):
+    """Biến thể asyncio của get_coin_markets: các chunk được gọi song song."""
+    ids = list(ids)
+    chunks = _chunks(ids)
+    results = await gather_with_timeouts(
+        {index: fetch_service_json_async(SERVICE_NAME, _markets_url(chunk), timeout=MARKETS_TIMEOUT)
+         for index, chunk in enumerate(chunks)},
+        timeout=MARKETS_TIMEOUT + 2,
+    )
+    table_result = _build_market_table(ids, [results[i] for i in range(len(chunks))])
+    return with_backup(_markets_backup_key(ids), table_result)
+
+
+def market_row(table, symbol):
+    """Một coin trong bảng columnar (tìm theo symbol hoặc id, không phân biệt hoa thường)"""
+    if not table:
+        return None
+    key = symbol.lower()
+    for index, (coin_id, coin_symbol) in enumerate(zip(table["id"], table["symbol"])):
+        if coin_id == key or (coin_symbol or "").lower() == key:
+            return {column: table[column][index] for column in MARKET_COLUMNS}
+    return None
@@ -0,0 +1,284 @@
+"""
+Indicator engine tính RSI/EMA/MACD/Bollinger cục bộ từ nến OHLC.
+
+Nến được lấy từ Binance market data (cùng nguồn TAAPI dùng cho RSI), giữ trong
+một rolling window dạng mảng NumPy và chỉ fetch phần nến mới ở mỗi lần refresh.
+Indicator được tính vectorized khi window thay đổi và cache lại, nên việc đọc
+RSI trên hot path không còn phụ thuộc vào rate limit của TAAPI.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .api_client import fetch_service_json, fetch_service_json_async
+from . import taapi
+
+BINANCE_API_URL = os.getenv('BINANCE_API_URL', 'https://data-api.binance.vision')
+KLINES_URL_TEMPLATE = "{base}/api/v3/klines?symbol={symbol}&interval={interval}&limit={limit}"
+
+DEFAULT_SYMBOL = "BTCUSDT"
+WINDOW_CAPACITY = 500
+
+# Số giây tối thiểu giữa hai lần fetch nến cho mỗi interval
+REFRESH_INTERVALS = {"1d": 60, "1h": 30}
+
+_COLUMNS = ("open_time", "open", "high", "low", "close", "volume")
+
+
+# ---------------------------------------------------------------------------
+# Các hàm indicator vectorized
+# ---------------------------------------------------------------------------
+
+def ewm(values, alpha, seed=None):
+    """
+    Exponential moving average vectorized: y_t = (1 - alpha) * y_{t-1} + alpha * x_t.
+
+    Nếu không có seed thì y_0 = x_0. Dùng dạng tổng tích lũy có hệ số tỉ lệ
+    (an toàn với float64 cho window vài nghìn phần tử).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.size == 0:
+        return values
+    if seed is None:
+        seed, values = values[0], values[1:]
+        head = np.array([seed])
+    else:
+        head = np.empty(0)
+
+    decay = 1.0 - alpha
+    n = values.size
+    powers = decay ** np.arange(1, n + 1)
+    # y_t = decay^(t+1) * seed + alpha * sum_{i<=t} decay^(t-i) * x_i
+    scaled = np.cumsum(values / powers) * powers * alpha
+    return np.concatenate([head, scaled + powers * seed])
+
+
+def ema(values, period):
+    """EMA chuẩn với alpha = 2 / (period + 1), seed bằng SMA của period giá trị đầu"""
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(values.size, np.nan)
+    if values.size < period:
+        return out
+    seed = values[:period].mean()
+    out[period - 1] = seed
+    out[period:] = ewm(values[period:], 2.0 / (period + 1), seed=seed)
+    return out
+
+
+def rsi(closes, period=14):
+    """RSI theo phương pháp Wilder (alpha = 1 / period), giống TAAPI/TradingView"""
+    closes = np.asarray(closes, dtype=np.float64)
+    out = np.full(closes.size, np.nan)
+    if closes.size <= period:
+        return out
+
+    deltas = np.diff(closes)
+    gains = np.clip(deltas, 0, None)
+    losses = np.clip(-deltas, 0, None)
+
+    alpha = 1.0 / period
+    avg_gain = np.concatenate([[gains[:period].mean()], ewm(gains[period:], alpha, seed=gains[:period].mean())])
+    avg_loss = np.concatenate([[losses[:period].mean()], ewm(losses[period:], alpha, seed=losses[:period].mean())])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rs = avg_gain / avg_loss
+        values = 100.0 - 100.0 / (1.0 + rs)
+    values = np.where(avg_loss == 0, 100.0, values)
+    out[period:] = values
+    return out
+
+
+def macd(closes, fast=12, slow=26, signal=9):
+    """Trả về (macd_line, signal_line, histogram)"""
+    closes = np.asarray(closes, dtype=np.float64)
+    macd_line = ema(closes, fast) - ema(closes, slow)
+    signal_line = np.full(closes.size, np.nan)
+    valid = np.flatnonzero(~np.isnan(macd_line))
+    if valid.size >= signal:
+        signal_line[valid[0]:] = ema(macd_line[valid[0]:], signal)
+    return macd_line, signal_line, macd_line - signal_line
+
+
+def bollinger(closes, period=20, num_std=2.0):
+    """Trả về (middle, upper, lower) của Bollinger Bands"""
+    closes = np.asarray(closes, dtype=np.float64)
+    middle = np.full(closes.size, np.nan)
+    upper = np.full(closes.size, np.nan)
+    lower = np.full(closes.size, np.nan)
+    if closes.size < period:
+        return middle, upper, lower
+    windows = sliding_window_view(closes, period)
+    mean = windows.mean(axis=1)
+    std = windows.std(axis=1)
+    middle[period - 1:] = mean
+    upper[period - 1:] = mean + num_std * std
+    lower[period - 1:] = mean - num_std * std
+    return middle, upper, lower
+
+
+# ---------------------------------------------------------------------------
+# Rolling window nến
+# ---------------------------------------------------------------------------
+
+class CandleWindow:
+    """Rolling window OHLCV dạng mảng NumPy với dung lượng cố định"""
+
+    def __init__(self, capacity=WINDOW_CAPACITY):
+        self.capacity = capacity
+        self._data = np.empty((0, len(_COLUMNS)), dtype=np.float64)
+        self.version = 0
+
+    def __len__(self):
+        return self._data.shape[0]
+
+    @property
+    def last_open_time(self):
+        return int(self._data[-1, 0]) if len(self) else None
+
+    def column(self, name):
+        return self._data[:, _COLUMNS.index(name)]
+
+    def replace(self, candles):
+        """Thay toàn bộ window bằng danh sách nến mới"""
+        self._data = np.empty((0, len(_COLUMNS)), dtype=np.float64)
+        return self.merge(candles)
+
+    def merge(self, candles):
+        """
+        Merge nến mới (list [open_time, open, high, low, close, volume, ...]).
+        Nến trùng open_time với nến cuối (nến đang hình thành) được ghi đè.
+        """
+        if not candles:
+            return False
+        rows = np.asarray([row[:len(_COLUMNS)] for row in candles], dtype=np.float64)
+        if len(self):
+            rows = rows[rows[:, 0] >= self._data[-1, 0]]
+            if rows.size == 0:
+                return False
+            keep = self._data[self._data[:, 0] < rows[0, 0]]
+            merged = np.vstack([keep, rows])
+        else:
+            merged = rows
+        self._data = merged[-self.capacity:]
+        self.version += 1
+        return True
+
+
+def _last(values):
+    value = values[-1] if len(values) else np.nan
+    return None if np.isnan(value) else round(float(value), 4)
+
+
+class IndicatorEngine:
+    """Giữ nến của một symbol/interval và cache kết quả indicator theo version của window"""
+
+    def __init__(self, symbol=DEFAULT_SYMBOL, interval="1d", capacity=WINDOW_CAPACITY):
+        self.symbol = symbol
+        self.interval = interval
+        self.window = CandleWindow(capacity)
+        self.refresh_interval = REFRESH_INTERVALS.get(interval, 60)
+        self._last_refresh = 0
+        self._needs_backfill = True
+        self._snapshot = None
+        self._snapshot_version = -1
+        self._lock = threading.Lock()
+
+    def klines_url(self):
+        # Lần đầu (hoặc khi bị hụt nến) lấy đủ window, sau đó chỉ lấy vài nến cuối
+        limit = self.window.capacity if self._needs_backfill else 3
+        return KLINES_URL_TEMPLATE.format(base=BINANCE_API_URL, symbol=self.symbol,
+                                          interval=self.interval, limit=limit)
+
+    def needs_refresh(self):
+        return time.time() - self._last_refresh >= self.refresh_interval
+
+    def _apply(self, json_data, error, status_code):
+        if error:
+            return error, status_code
+        if not isinstance(json_data, list):
+            return "Lỗi xử lý dữ liệu nến từ Binance", 500
+        with self._lock:
+            if self._needs_backfill:
+                self.window.replace(json_data)
+                self._needs_backfill = False
+            else:
+                # Không còn chồng lên nến cuối đã biết: có khoảng trống, lần sau tải lại đủ window
+                if json_data and self.window.last_open_time is not None and json_data[0][0] > self.window.last_open_time:
+                    self._needs_backfill = True
+                self.window.merge(json_data)
+            self._last_refresh = time.time()
+        return None, 200
+
+    def refresh(self):
+        """Fetch nến mới nếu đến hạn. Returns (error, status_code)"""
+        if not self.needs_refresh():
+            return None, 200
+        return self._apply(*fetch_service_json("binance", self.klines_url(), timeout=5))
+
+    async def refresh_async(self):
+        if not self.needs_refresh():
+            return None, 200
+        return self._apply(*await fetch_service_json_async("binance", self.klines_url(), timeout=5))
+
+    def snapshot(self):
+        """Indicator mới nhất; chỉ tính lại khi window có nến mới"""
+        with self._lock:
+            if self._snapshot_version == self.window.version:
+                return self._snapshot
+            closes = self.window.column("close")
+            if closes.size == 0:
+                return None
+            macd_line, signal_line, histogram = macd(closes)
+            middle, upper, lower = bollinger(closes)
+            self._snapshot = {
+                "symbol": self.symbol,
+                "interval": self.interval,
+                "close": _last(closes),
+                "rsi_14": _last(rsi(closes, 14)),
+                "ema_20": _last(ema(closes, 20)),
+                "ema_50": _last(ema(closes, 50)),
+                "macd": _last(macd_line),
+                "macd_signal": _last(signal_line),
+                "macd_histogram": _last(histogram),
+                "bb_middle": _last(middle),
+                "bb_upper": _last(upper),
+                "bb_lower": _last(lower),
+                "candles": len(self.window),
+                "last_open_time": self.window.last_open_time,
+            }
+            self._snapshot_version = self.window.version
+            return self._snapshot
+
+
+engines = {
+    "1d": IndicatorEngine(interval="1d"),
+    "1h": IndicatorEngine(interval="1h"),
+}
+
+
+def get_indicators(interval="1d"):
+    """Lấy indicator cho interval (refresh nến nếu đến hạn). Returns (data, error, status_code)"""
+    engine = engines.get(interval)
+    if engine is None:
+        return None, f"Interval không hỗ trợ: {interval}", 400
+    error, status_code = engine.refresh()
+    snapshot = engine.snapshot()
+    if snapshot is None:
+        return None, error or "Chưa có dữ liệu nến", status_code if error else 503
+    return snapshot, None, 200
+
+
+async def get_btc_rsi_async():
+    """
+    RSI-14 khung ngày tính từ nến cục bộ, cùng format với taapi.get_btc_rsi.
+    Chỉ fallback sang TAAPI khi chưa từng lấy được nến.
+    """
+    engine = engines["1d"]
+    await engine.refresh_async()
+    snapshot = engine.snapshot()
+    if snapshot is not None and snapshot["rsi_14"] is not None:
+        return {"rsi_14": snapshot["rsi_14"]}, None, 200
+    return await taapi.get_btc_rsi_async()
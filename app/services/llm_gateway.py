@@ -0,0 +1,489 @@
+"""
+Gateway dùng chung cho mọi lời gọi Gemini của workflow nodes.
+
+- Cache theo nội dung: key = sha256(model, contents, config), nên retry sau lỗi ở bước
+  sau (hoặc resume) với cùng prompt không phải trả tiền gọi lại AI. Chỉ cache text của
+  response (nodes chỉ dùng .text), lưu qua EnhancedCache namespace "llm".
+- Semaphore giới hạn số lời gọi đồng thời trong process (scheduler, /generate-auto-report
+  và các nhánh song song JS/CSS dùng chung).
+- Budget requests/phút và tokens/phút theo model qua token bucket (Redis khi có
+  REDIS_URL nên mọi worker cùng tiêu một quota).
+- Retry với exponential backoff + jitter theo loại lỗi (429, 5xx, mạng, response rỗng);
+  lỗi 4xx khác raise ngay. 429 có RetryInfo thì chờ ít nhất retryDelay của Gemini.
+- Metrics mỗi lời gọi: latency, token vào/ra, số lần thử, cache hit.
+- stream=True dùng generate_content_stream: số token/ký tự đã nhận và đoạn cuối của text
+  được đẩy vào progress_tracker (và WebSocket) trong lúc chờ; stop_when(text) cho phép
+  dừng stream ngay khi đã đủ kết luận (vd. validation FAIL).
+
+Cấu hình qua env:
+    LLM_CACHE_ENABLED     bật/tắt cache (mặc định true)
+    LLM_CACHE_TTL         thời gian sống của entry, giây (mặc định 86400)
+    LLM_CACHE_STRATEGY    tầng lưu trữ theo CacheStrategy: hybrid (memory + Redis khi có
+                          REDIS_URL), file_backup (memory + file trên đĩa khi không có Redis),
+                          memory_only, redis_only (mặc định hybrid)
+    LLM_MAX_CONCURRENCY   số lời gọi Gemini đồng thời tối đa (mặc định 2)
+    LLM_RPM / LLM_TPM     requests / tokens mỗi phút cho mỗi model (mặc định 10 / 250000)
+    LLM_MAX_ATTEMPTS      số lần thử mỗi lời gọi (mặc định 3)
+    LLM_BUDGET_TIMEOUT    thời gian chờ tối đa slot/budget trước khi bỏ cuộc, giây (mặc định 300)
+"""
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Optional
+
+from ..utils.enhanced_cache import EnhancedCache, CacheStrategy
+from ..utils.token_bucket import get_token_bucket
+from .progress_tracker import progress_tracker
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_NAMESPACE = "llm"
+DEFAULT_LLM_CACHE_TTL = 24 * 3600
+
+# Loại lỗi quyết định có retry không và backoff gốc (giây)
+ERROR_RATE_LIMIT = "rate_limit"
+ERROR_SERVER = "server"
+ERROR_NETWORK = "network"
+ERROR_EMPTY = "empty"
+ERROR_CLIENT = "client"
+
+BACKOFF_BASE = {
+    ERROR_RATE_LIMIT: 10.0,
+    ERROR_SERVER: 4.0,
+    ERROR_NETWORK: 2.0,
+    ERROR_EMPTY: 1.0,
+}
+BACKOFF_MAX = 120.0
+
+# Ước lượng token từ độ dài prompt khi chưa có usage_metadata (~4 ký tự/token)
+CHARS_PER_TOKEN = 4
+
+# Khoảng cách tối thiểu giữa hai lần cập nhật progress khi stream (giây)
+STREAM_PROGRESS_INTERVAL = 1.0
+STREAM_PREVIEW_CHARS = 200
+
+
+class LLMBudgetExceeded(RuntimeError):
+    """Không lấy được slot đồng thời hoặc budget RPM/TPM trong thời gian cho phép"""
+
+
+class CachedResponse:
+    """Response dựng lại từ cache, cùng interface .text như response của genai"""
+
+    cached = True
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+def _canonical(value: Any) -> Any:
+    """Đưa contents/config (pydantic model của genai, list, str) về dạng JSON ổn định"""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json", exclude_none=True)
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    return str(value)
+
+
+class LLMResponseCache:
+    """Cache text của response theo hash(model, contents, config)"""
+
+    def __init__(self, ttl: Optional[int] = None, strategy: Optional[str] = None, enabled: Optional[bool] = None):
+        if enabled is None:
+            enabled = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+        self.enabled = enabled
+        self.ttl = ttl if ttl is not None else int(os.getenv("LLM_CACHE_TTL", DEFAULT_LLM_CACHE_TTL))
+        self.store = EnhancedCache(strategy or os.getenv("LLM_CACHE_STRATEGY", CacheStrategy.HYBRID))
+
+    @staticmethod
+    def key(model: str, contents: Any, config: Any = None) -> str:
+        payload = json.dumps(
+            {"model": model, "contents": _canonical(contents), "config": _canonical(config)},
+            sort_keys=True, ensure_ascii=False, separators=(",", ":"),
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        return self.store.get(key, namespace=LLM_CACHE_NAMESPACE)
+
+    def set(self, key: str, text: str):
+        if self.enabled and text and self.ttl > 0:
+            self.store.set(key, text, self.ttl, namespace=LLM_CACHE_NAMESPACE)
+
+    def delete(self, key: str):
+        self.store.delete(key, namespace=LLM_CACHE_NAMESPACE)
+
+    def clear(self):
+        self.store.invalidate_namespace(LLM_CACHE_NAMESPACE)
+
+
+llm_cache = LLMResponseCache()
+
+
+class StreamedResponse:
+    """Text gộp từ các chunk của generate_content_stream, cùng interface .text"""
+
+    cached = False
+
+    def __init__(self, text: str, usage_metadata=None, chunks: int = 0, stopped_early: bool = False):
+        self.text = text
+        self.usage_metadata = usage_metadata
+        self.chunks = chunks
+        # True khi stop_when dừng stream trước khi model trả hết (text không đầy đủ)
+        self.stopped_early = stopped_early
+
+
+class EmptyResponseError(Exception):
+    """Gemini trả về response không có text (safety, MAX_TOKENS, lỗi tạm thời)"""
+
+    def __init__(self, response):
+        super().__init__("Gemini không trả về nội dung")
+        self.response = response
+
+
+def classify_error(error: Exception) -> str:
+    """Phân loại lỗi theo mã HTTP/status của google.genai.errors.APIError hoặc loại exception"""
+    if isinstance(error, EmptyResponseError):
+        return ERROR_EMPTY
+    code = getattr(error, "code", None)
+    status = str(getattr(error, "status", "") or "")
+    if code == 429 or status == "RESOURCE_EXHAUSTED":
+        return ERROR_RATE_LIMIT
+    if isinstance(code, int) and code >= 500:
+        return ERROR_SERVER
+    if status in ("UNAVAILABLE", "INTERNAL", "DEADLINE_EXCEEDED"):
+        return ERROR_SERVER
+    if isinstance(code, int) and 400 <= code < 500:
+        return ERROR_CLIENT
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return ERROR_NETWORK
+    name = type(error).__name__.lower()
+    if "timeout" in name or "connect" in name or "network" in name:
+        return ERROR_NETWORK
+    return ERROR_CLIENT
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """retryDelay (vd. "27s") trong RetryInfo của lỗi 429 từ Gemini, nếu có"""
+    details = getattr(error, "details", None)
+    if isinstance(details, dict):
+        body = details.get("error")
+        details = (body if isinstance(body, dict) else details).get("details")
+    if not isinstance(details, list):
+        return None
+    for item in details:
+        delay = item.get("retryDelay") if isinstance(item, dict) else None
+        match = re.fullmatch(r"(\d+(?:\.\d+)?)s", str(delay or ""))
+        if match:
+            return float(match.group(1))
+    return None
+
+
+def backoff_delay(error_class: str, attempt: int, hint: Optional[float] = None) -> float:
+    """Exponential backoff (equal jitter) theo loại lỗi; không nhỏ hơn hint của server"""
+    ceiling = min(BACKOFF_MAX, BACKOFF_BASE.get(error_class, 1.0) * (2 ** (attempt - 1)))
+    delay = ceiling / 2 + random.uniform(0, ceiling / 2)
+    if hint:
+        delay = max(delay, min(hint, BACKOFF_MAX))
+    return delay
+
+
+def estimate_tokens(contents: Any) -> int:
+    """Ước lượng số token của prompt để trừ vào budget TPM trước khi gọi"""
+    text = json.dumps(_canonical(contents), ensure_ascii=False)
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class LLMMetrics:
+    """Metrics theo model: số lời gọi, lỗi theo loại, retry, cache hit, token, latency"""
+
+    def __init__(self, recent: int = 50):
+        self._lock = threading.Lock()
+        self._models = {}
+        self._recent = deque(maxlen=recent)
+
+    def _model(self, model):
+        return self._models.setdefault(model, {
+            "calls": 0,
+            "failures": 0,
+            "retries": 0,
+            "cache_hits": 0,
+            "errors": {},
+            "prompt_tokens": 0,
+            "output_tokens": 0,
+            "latency_total": 0.0,
+            "latency_max": 0.0,
+            "budget_wait_total": 0.0,
+        })
+
+    def cache_hit(self, model):
+        with self._lock:
+            self._model(model)["cache_hits"] += 1
+
+    def retry(self, model, error_class):
+        with self._lock:
+            stats = self._model(model)
+            stats["retries"] += 1
+            stats["errors"][error_class] = stats["errors"].get(error_class, 0) + 1
+
+    def call(self, model, label, latency, attempts, budget_wait, prompt_tokens=None,
+             output_tokens=None, error_class=None):
+        with self._lock:
+            stats = self._model(model)
+            stats["calls"] += 1
+            stats["latency_total"] += latency
+            stats["latency_max"] = max(stats["latency_max"], latency)
+            stats["budget_wait_total"] += budget_wait
+            stats["prompt_tokens"] += prompt_tokens or 0
+            stats["output_tokens"] += output_tokens or 0
+            if error_class:
+                stats["failures"] += 1
+                stats["errors"][error_class] = stats["errors"].get(error_class, 0) + 1
+            self._recent.append({
+                "model": model,
+                "label": label,
+                "latency": round(latency, 3),
+                "budget_wait": round(budget_wait, 3),
+                "attempts": attempts,
+                "prompt_tokens": prompt_tokens,
+                "output_tokens": output_tokens,
+                "error": error_class,
+                "timestamp": int(time.time()),
+            })
+
+    def snapshot(self):
+        with self._lock:
+            models = {}
+            for model, stats in self._models.items():
+                calls = stats["calls"]
+                models[model] = {
+                    **stats,
+                    "errors": dict(stats["errors"]),
+                    "latency_avg": round(stats["latency_total"] / calls, 3) if calls else 0.0,
+                }
+            return {"models": models, "recent": list(self._recent)}
+
+    def reset(self):
+        with self._lock:
+            self._models.clear()
+            self._recent.clear()
+
+
+class LLMGateway:
+    """
+    Mọi lời gọi generate_content đi qua đây: cache → budget RPM/TPM → semaphore → gọi AI,
+    lỗi tạm thời thì backoff theo loại lỗi rồi thử lại.
+    """
+
+    def __init__(self, max_concurrency=None, rpm=None, tpm=None, max_attempts=None,
+                 budget_timeout=None, bucket=None, cache=None, sleep=time.sleep):
+        self.max_concurrency = max_concurrency or int(os.getenv("LLM_MAX_CONCURRENCY", 2))
+        self.rpm = rpm or float(os.getenv("LLM_RPM", 10))
+        self.tpm = tpm or float(os.getenv("LLM_TPM", 250000))
+        self.max_attempts = max_attempts or int(os.getenv("LLM_MAX_ATTEMPTS", 3))
+        self.budget_timeout = budget_timeout if budget_timeout is not None else float(os.getenv("LLM_BUDGET_TIMEOUT", 300))
+        self._bucket = bucket
+        self._cache = cache
+        self._sleep = sleep
+        self._semaphore = threading.BoundedSemaphore(self.max_concurrency)
+        self.metrics = LLMMetrics()
+
+    @property
+    def bucket(self):
+        if self._bucket is None:
+            self._bucket = get_token_bucket()
+        return self._bucket
+
+    @property
+    def cache(self):
+        # Mặc định dùng llm_cache của module (test có thể thay bằng monkeypatch)
+        return self._cache or llm_cache
+
+    def _wait_for_budget(self, model: str, tokens: int, deadline: float) -> float:
+        """Chờ đủ budget request và token của model; trả về thời gian đã chờ"""
+        started = time.monotonic()
+        budgets = (
+            (f"llm:rpm:{model}", self.rpm, 1),
+            (f"llm:tpm:{model}", self.tpm, min(tokens, self.tpm)),
+        )
+        for name, per_minute, requested in budgets:
+            while True:
+                allowed, wait = self.bucket.acquire(name, per_minute, per_minute / 60.0, requested)
+                if allowed:
+                    break
+                if time.monotonic() + wait > deadline:
+                    raise LLMBudgetExceeded(f"Hết budget {name}, cần chờ {wait:.1f}s")
+                self._sleep(wait)
+        return time.monotonic() - started
+
+    def _call(self, client, model, contents, config, deadline):
+        if not self._semaphore.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            raise LLMBudgetExceeded(f"Quá {self.max_concurrency} lời gọi Gemini đồng thời")
+        try:
+            response = client.models.generate_content(model=model, contents=contents, config=config)
+        finally:
+            self._semaphore.release()
+        text = getattr(response, "text", None)
+        if not text:
+            raise EmptyResponseError(response)
+        return response
+
+    def _call_stream(self, client, model, contents, config, deadline, session_id, label, stop_when):
+        """
+        Gọi generate_content_stream, gộp text các chunk. Trong lúc nhận, cập nhật progress
+        tối đa mỗi STREAM_PROGRESS_INTERVAL giây; stop_when(text) trả True thì đóng stream.
+        """
+        if not self._semaphore.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            raise LLMBudgetExceeded(f"Quá {self.max_concurrency} lời gọi Gemini đồng thời")
+        text = ""
+        chunks = 0
+        usage = None
+        stopped = False
+        last_report = time.monotonic()
+        try:
+            stream = client.models.generate_content_stream(model=model, contents=contents, config=config)
+            try:
+                for chunk in stream:
+                    chunks += 1
+                    usage = getattr(chunk, "usage_metadata", None) or usage
+                    piece = getattr(chunk, "text", None)
+                    if not piece:
+                        continue
+                    text += piece
+                    if stop_when and stop_when(text):
+                        stopped = True
+                        break
+                    now = time.monotonic()
+                    if session_id and now - last_report >= STREAM_PROGRESS_INTERVAL:
+                        last_report = now
+                        tokens = getattr(usage, "candidates_token_count", None) or len(text) // CHARS_PER_TOKEN
+                        progress_tracker.update_stream(session_id, label, len(text), tokens,
+                                                       text[-STREAM_PREVIEW_CHARS:])
+            finally:
+                close = getattr(stream, "close", None)
+                if close:
+                    close()
+                if session_id:
+                    progress_tracker.end_stream(session_id, label)
+        finally:
+            self._semaphore.release()
+        response = StreamedResponse(text, usage, chunks, stopped)
+        if not text:
+            raise EmptyResponseError(response)
+        return response
+
+    def generate_content(self, client, model: str, contents: Any, config: Any = None, use_cache: bool = True,
+                         session_id: Optional[str] = None, label: str = "AI", max_attempts: Optional[int] = None,
+                         stream: bool = False, stop_when=None):
+        """
+        Gọi Gemini qua cache, budget và semaphore.
+
+        Hit trả về CachedResponse (chỉ có .text). Lỗi 4xx (trừ 429) raise ngay; lỗi tạm thời
+        retry tối đa max_attempts lần rồi raise lỗi cuối. Response rỗng sau lần thử cuối
+        được trả về để node tự xử lý như trước.
+
+        stream=True: dùng generate_content_stream, trả về StreamedResponse; response bị
+        stop_when dừng sớm (stopped_early) không được cache.
+        """
+        cache = self.cache
+        key = cache.key(model, contents, config) if use_cache else None
+        if key:
+            text = cache.get(key)
+            if text is not None:
+                logger.info(f"[LLM] Cache hit {key[:12]} ({model}, {label})")
+                self.metrics.cache_hit(model)
+                return CachedResponse(text)
+
+        max_attempts = max_attempts or self.max_attempts
+        deadline = time.monotonic() + self.budget_timeout
+        tokens = estimate_tokens(contents)
+        budget_wait = 0.0
+        started = time.monotonic()
+
+        for attempt in range(1, max_attempts + 1):
+            try:
+                budget_wait += self._wait_for_budget(model, tokens, deadline)
+                if stream:
+                    response = self._call_stream(client, model, contents, config, deadline,
+                                                 session_id, label, stop_when)
+                else:
+                    response = self._call(client, model, contents, config, deadline)
+            except LLMBudgetExceeded:
+                self.metrics.call(model, label, time.monotonic() - started, attempt, budget_wait,
+                                  error_class="budget")
+                raise
+            except Exception as error:
+                error_class = classify_error(error)
+                last_attempt = attempt >= max_attempts or error_class == ERROR_CLIENT
+                if last_attempt:
+                    self.metrics.call(model, label, time.monotonic() - started, attempt, budget_wait,
+                                      error_class=error_class)
+                    if error_class == ERROR_EMPTY:
+                        return getattr(error, "response", None)
+                    raise
+                wait = backoff_delay(error_class, attempt, retry_after(error))
+                self.metrics.retry(model, error_class)
+                logger.warning(f"[LLM] {label} lỗi {error_class} (lần {attempt}/{max_attempts}), "
+                               f"thử lại sau {wait:.1f}s: {error}")
+                if session_id:
+                    progress_tracker.update_step(
+                        session_id, details=f"Lỗi {label} ({error_class}), thử lại sau {wait:.0f}s "
+                                            f"(lần {attempt}/{max_attempts})...")
+                self._sleep(wait)
+                continue
+
+            usage = getattr(response, "usage_metadata", None)
+            prompt_tokens = getattr(usage, "prompt_token_count", None)
+            output_tokens = getattr(usage, "candidates_token_count", None)
+            latency = time.monotonic() - started
+            self.metrics.call(model, label, latency, attempt, budget_wait, prompt_tokens, output_tokens)
+            stopped_early = getattr(response, "stopped_early", False)
+            logger.info(f"[LLM] {label} ({model}) {latency:.1f}s, attempts={attempt}, "
+                        f"tokens in/out={prompt_tokens}/{output_tokens}"
+                        f"{', dừng sớm' if stopped_early else ''}")
+            if key and not stopped_early:
+                cache.set(key, response.text)
+            return response
+
+    def stats(self):
+        return {
+            "max_concurrency": self.max_concurrency,
+            "rpm": self.rpm,
+            "tpm": self.tpm,
+            "max_attempts": self.max_attempts,
+            "cache_enabled": self.cache.enabled,
+            **self.metrics.snapshot(),
+        }
+
+
+gateway = LLMGateway()
+
+
+def generate_content(client, model: str, contents: Any, config: Any = None, use_cache: bool = True,
+                     session_id: Optional[str] = None, label: str = "AI", max_attempts: Optional[int] = None,
+                     stream: bool = False, stop_when=None):
+    """Gọi Gemini qua gateway dùng chung của process (xem LLMGateway.generate_content)"""
+    return gateway.generate_content(client, model, contents, config, use_cache=use_cache,
+                                    session_id=session_id, label=label, max_attempts=max_attempts,
+                                    stream=stream, stop_when=stop_when)
+
+
+def forget(model: str, contents: Any, config: Any = None):
+    """
+    Xóa response đã cache của request này. Node gọi khi kết quả bị từ chối (validation
+    FAIL, không trích xuất được mã) để lần retry với cùng prompt thực sự gọi lại AI.
+    """
+    cache = gateway.cache
+    cache.delete(cache.key(model, contents, config))
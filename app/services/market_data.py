@@ -0,0 +1,147 @@
+"""
+Tổng hợp dữ liệu thị trường cho dashboard từ các nguồn upstream
+(CoinGecko, Alternative.me, TAAPI) thông qua SWR cache dùng chung.
+"""
+import os
+
+from . import coingecko, alternative_me, indicators
+from .market_history import market_history
+from ..utils.swr_cache import SWRCache, SourcePolicy
+
+# Default values khi một nguồn không khả dụng
+DEFAULT_GLOBAL_DATA = {"market_cap": None, "volume_24h": None}
+DEFAULT_BTC_DATA = {"btc_price_usd": None, "btc_change_24h": None}
+DEFAULT_FNG_DATA = {"fng_value": 50, "fng_value_classification": "Neutral"}
+DEFAULT_RSI_DATA = {"rsi_14": 50}
+
+# Soft/hard TTL theo tần suất cập nhật và rate limit của từng nguồn
+SOURCE_POLICIES = {
+    "global_data": SourcePolicy(soft_ttl=120, hard_ttl=900),
+    "btc_data": SourcePolicy(soft_ttl=60, hard_ttl=600),
+    "fng_data": SourcePolicy(soft_ttl=600, hard_ttl=6 * 3600),
+    "rsi_data": SourcePolicy(soft_ttl=60, hard_ttl=3600),
+    "watchlist": SourcePolicy(soft_ttl=60, hard_ttl=600, wait_timeout=12),
+}
+
+DASHBOARD_SOURCES = ("global_data", "btc_data", "fng_data", "rsi_data", "watchlist")
+
+# Danh sách coin (CoinGecko id) của dashboard; lấy gộp bằng coins/markets, mỗi chunk một request
+DEFAULT_WATCHLIST = "bitcoin,ethereum,solana,binancecoin,ripple,cardano,dogecoin"
+WATCHLIST = [coin_id.strip().lower()
+             for coin_id in os.getenv('MARKET_WATCHLIST', DEFAULT_WATCHLIST).split(",")
+             if coin_id.strip()]
+
+
+async def get_watchlist_markets_async():
+    """Bảng columnar giá/vốn hóa/volume của các coin trong WATCHLIST"""
+    return await coingecko.get_coin_markets_async(WATCHLIST)
+
+
+# Loader async: mọi refresh chạy trên event loop dùng chung thay vì mỗi nguồn một thread
+market_data_cache = SWRCache(max_workers=len(SOURCE_POLICIES))
+market_data_cache.register("global_data", coingecko.get_global_market_data_async, SOURCE_POLICIES["global_data"])
+market_data_cache.register("btc_data", coingecko.get_btc_price_async, SOURCE_POLICIES["btc_data"])
+market_data_cache.register("fng_data", alternative_me.get_fng_index_async, SOURCE_POLICIES["fng_data"])
+# RSI tính cục bộ từ nến Binance, TAAPI chỉ còn là fallback
+market_data_cache.register("rsi_data", indicators.get_btc_rsi_async, SOURCE_POLICIES["rsi_data"])
+market_data_cache.register("watchlist", get_watchlist_markets_async, SOURCE_POLICIES["watchlist"])
+# Mỗi giá trị mới được gộp vào lịch sử time-series (1m/1h/1d)
+market_data_cache.add_listener(market_history.record_source)
+
+
+def build_dashboard_summary(results=None):
+    """
+    Kết hợp kết quả các nguồn thành payload cho /api/crypto/dashboard-summary.
+
+    Args:
+        results (dict, optional): {source: (data, error, status_code)}; nếu không
+            truyền sẽ lấy từ market_data_cache.
+
+    Returns:
+        tuple: (payload, status_code)
+    """
+    if results is None:
+        results = market_data_cache.get_many(DASHBOARD_SOURCES)
+
+    global_data, global_error, global_status = results["global_data"]
+    btc_data, btc_error, btc_status = results["btc_data"]
+    fng_data, fng_error, fng_status = results["fng_data"]
+    rsi_data, rsi_error, rsi_status = results["rsi_data"]
+    # Watchlist là nguồn phụ: thiếu thì dashboard vẫn hiển thị các chỉ số chính
+    markets, markets_error, markets_status = results.get("watchlist", (None, None, 200))
+
+    # Phân loại lỗi: critical vs non-critical
+    critical_errors = {}
+    warnings = {}
+
+    # Timeout (408) không phải critical error, dùng default values
+    if global_status == 408:
+        global_data = DEFAULT_GLOBAL_DATA
+        warnings["global_data"] = "API timeout - using default values"
+    elif global_error:
+        if global_status == 429:
+            warnings["global_data"] = "Rate limit reached - using cached data"
+        else:
+            critical_errors["global_data"] = global_error
+
+    if btc_status == 408:
+        btc_data = DEFAULT_BTC_DATA
+        warnings["btc_data"] = "API timeout - using default values"
+    elif btc_error:
+        if btc_status == 429:
+            warnings["btc_data"] = "Rate limit reached - using cached data"
+        else:
+            critical_errors["btc_data"] = btc_error
+
+    if fng_status == 408:
+        fng_data = DEFAULT_FNG_DATA
+        warnings["fng_data"] = "API timeout - using default values"
+    elif fng_error:
+        fng_data = DEFAULT_FNG_DATA
+        warnings["fng_data"] = "Rate limit reached - using default value" if fng_status == 429 else fng_error
+
+    if rsi_status == 408:
+        rsi_data = DEFAULT_RSI_DATA
+        warnings["rsi_data"] = "API timeout - using default values"
+    elif rsi_error:
+        rsi_data = DEFAULT_RSI_DATA
+        warnings["rsi_data"] = "Rate limit reached - using default value" if rsi_status == 429 else rsi_error
+
+    if markets_error:
+        markets = None
+        warnings["watchlist"] = "Rate limit reached - markets unavailable" if markets_status == 429 else markets_error
+
+    # Chỉ fail request nếu có critical error (không phải rate limit)
+    if critical_errors:
+        return {"errors": critical_errors, "warnings": warnings}, 500
+
+    # Kết hợp tất cả dữ liệu thành một object duy nhất
+    combined_data = {
+        **(global_data or {}),
+        **(btc_data or {}),
+        **(fng_data or {}),
+        **(rsi_data or {}),
+    }
+    if markets:
+        combined_data["markets"] = markets
+
+    if warnings:
+        combined_data["warnings"] = warnings
+
+    return combined_data, 200
+
+
+def get_watchlist_market(symbol):
+    """
+    Dữ liệu một coin trong watchlist theo symbol (vd. ETH) hoặc CoinGecko id.
+
+    Returns:
+        tuple: (data, error, status_code)
+    """
+    table, error, status_code = market_data_cache.get("watchlist")
+    if error:
+        return None, error, status_code
+    row = coingecko.market_row(table, symbol)
+    if row is None:
+        return None, f"Không có {symbol} trong watchlist", 404
+    return row, None, 200
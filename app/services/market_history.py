@@ -0,0 +1,206 @@
+"""
+Lưu lịch sử snapshot thị trường dạng time-series.
+
+Mỗi giá trị được poll (giá BTC, market cap, F&G, RSI...) được gộp vào các bucket
+OHLC 1m/1h/1d trong ring buffer của process. Bucket 1h/1d đã đóng được ghi xuống
+bảng market_snapshot để phục vụ truy vấn dài hơn dung lượng ring buffer.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+# Độ dài bucket (giây) và số bucket giữ trong bộ nhớ cho mỗi resolution
+RESOLUTIONS = {"1m": 60, "1h": 3600, "1d": 86400}
+RETENTION = {"1m": 1440, "1h": 24 * 30, "1d": 365}
+PERSISTED_RESOLUTIONS = ("1h", "1d")
+
+# Các field số được ghi lại từ từng nguồn dữ liệu dashboard
+SOURCE_METRICS = {
+    "global_data": ("market_cap", "volume_24h"),
+    "btc_data": ("btc_price_usd", "btc_change_24h"),
+    "fng_data": ("fng_value",),
+    "rsi_data": ("rsi_14",),
+}
+
+# Thứ tự cột trong một bucket
+_START, _OPEN, _HIGH, _LOW, _CLOSE, _COUNT = range(6)
+
+
+class MetricSeries:
+    """Ring buffer các bucket OHLC của một metric cho mọi resolution"""
+
+    def __init__(self):
+        self.closed = {res: deque(maxlen=RETENTION[res]) for res in RESOLUTIONS}
+        self.current = {}
+
+    def add(self, value, ts):
+        """Gộp một điểm vào bucket hiện tại; trả về list (resolution, bucket) vừa đóng"""
+        finished = []
+        for res, seconds in RESOLUTIONS.items():
+            start = int(ts // seconds * seconds)
+            bucket = self.current.get(res)
+            if bucket is not None and start < bucket[_START]:
+                continue  # Điểm đến trễ hơn bucket hiện tại: bỏ qua
+            if bucket is None or start > bucket[_START]:
+                if bucket is not None:
+                    self.closed[res].append(tuple(bucket))
+                    finished.append((res, tuple(bucket)))
+                self.current[res] = [start, value, value, value, value, 1]
+            else:
+                bucket[_HIGH] = max(bucket[_HIGH], value)
+                bucket[_LOW] = min(bucket[_LOW], value)
+                bucket[_CLOSE] = value
+                bucket[_COUNT] += 1
+        return finished
+
+    def buckets(self, resolution, start, end):
+        rows = [b for b in self.closed[resolution] if start <= b[_START] <= end]
+        current = self.current.get(resolution)
+        if current is not None and start <= current[_START] <= end:
+            rows.append(tuple(current))
+        return rows
+
+    def oldest(self, resolution):
+        closed = self.closed[resolution]
+        if closed:
+            return closed[0][_START]
+        current = self.current.get(resolution)
+        return current[_START] if current else None
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class MarketHistory:
+    """Time-series store trong process với rollup 1m/1h/1d và persistence 1h/1d"""
+
+    def __init__(self):
+        self._series = {}
+        self._pending = []
+        self._lock = threading.Lock()
+        self._app = None
+
+    def init_app(self, app):
+        """Gắn Flask app để flush bucket xuống database trong app context"""
+        self._app = app
+
+    def metrics(self):
+        return sorted(self._series)
+
+    def record(self, metric, value, ts=None):
+        value = _to_float(value)
+        if value is None:
+            return
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            series = self._series.setdefault(metric, MetricSeries())
+            for res, bucket in series.add(value, ts):
+                if res in PERSISTED_RESOLUTIONS:
+                    self._pending.append((metric, res, bucket))
+
+    def record_source(self, source, data):
+        """Listener cho market data cache: ghi lại các field số của nguồn vừa cập nhật"""
+        if not isinstance(data, dict):
+            return
+        ts = time.time()
+        for field in SOURCE_METRICS.get(source, ()):
+            self.record(field, data.get(field), ts)
+
+    def flush(self):
+        """Ghi các bucket 1h/1d đã đóng xuống database (gọi từ background thread)"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending or self._app is None:
+            return 0
+
+        from ..extensions import db
+        from ..models import MarketSnapshot
+
+        try:
+            with self._app.app_context():
+                for metric, res, bucket in pending:
+                    bucket_start = datetime.fromtimestamp(bucket[_START], tz=timezone.utc)
+                    row = MarketSnapshot.query.filter_by(
+                        metric=metric, resolution=res, bucket_start=bucket_start
+                    ).first()
+                    if row is None:
+                        row = MarketSnapshot(metric=metric, resolution=res, bucket_start=bucket_start)
+                        db.session.add(row)
+                    row.open, row.high, row.low, row.close, row.count = bucket[_OPEN:]
+                db.session.commit()
+            return len(pending)
+        except Exception as e:
+            logger.warning(f"Market history flush failed: {e}")
+            try:
+                db.session.rollback()
+            except Exception:
+                pass
+            # Giữ lại để thử ghi ở lần flush sau
+            with self._lock:
+                self._pending = pending + self._pending
+            return 0
+
+    def _load_persisted(self, metric, resolution, start, end):
+        from ..models import MarketSnapshot
+
+        rows = MarketSnapshot.query.filter(
+            MarketSnapshot.metric == metric,
+            MarketSnapshot.resolution == resolution,
+            MarketSnapshot.bucket_start >= datetime.fromtimestamp(start, tz=timezone.utc),
+            MarketSnapshot.bucket_start <= datetime.fromtimestamp(end, tz=timezone.utc),
+        ).order_by(MarketSnapshot.bucket_start).all()
+
+        result = []
+        for row in rows:
+            bucket_start = row.bucket_start
+            if bucket_start.tzinfo is None:
+                bucket_start = bucket_start.replace(tzinfo=timezone.utc)
+            result.append((int(bucket_start.timestamp()), row.open, row.high, row.low, row.close, row.count))
+        return result
+
+    def query(self, metric, resolution="1h", start=None, end=None):
+        """
+        Truy vấn bucket trong khoảng [start, end] (unix seconds), trả về dạng cột:
+        {"t": [...], "o": [...], "h": [...], "l": [...], "c": [...], "n": [...]}
+        """
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Resolution không hỗ trợ: {resolution}")
+        end = time.time() if end is None else end
+        start = end - RESOLUTIONS[resolution] * RETENTION[resolution] if start is None else start
+
+        with self._lock:
+            series = self._series.get(metric)
+            rows = series.buckets(resolution, start, end) if series else []
+            oldest = series.oldest(resolution) if series else None
+
+        # Phần cũ hơn ring buffer được lấy từ database
+        if self._app is not None and resolution in PERSISTED_RESOLUTIONS and (oldest is None or start < oldest):
+            try:
+                persisted_end = end if oldest is None else oldest - 1
+                with self._app.app_context():
+                    persisted = self._load_persisted(metric, resolution, start, persisted_end)
+                rows = persisted + rows
+            except Exception as e:
+                logger.warning(f"Market history query from database failed: {e}")
+
+        return {
+            "metric": metric,
+            "resolution": resolution,
+            "t": [row[_START] for row in rows],
+            "o": [row[_OPEN] for row in rows],
+            "h": [row[_HIGH] for row in rows],
+            "l": [row[_LOW] for row in rows],
+            "c": [row[_CLOSE] for row in rows],
+            "n": [row[_COUNT] for row in rows],
+        }
+
+
+market_history = MarketHistory()
@@ -0,0 +1,172 @@
+"""
+Background poller cập nhật dữ liệu thị trường ngoài request path.
+
+Mỗi nguồn được refresh theo lịch riêng (phù hợp với rate limit của upstream),
+sau mỗi lần cập nhật payload dashboard được tính sẵn và serialize thành JSON
+bytes để endpoint chỉ việc trả về.
+"""
+import os
+import json
+import time
+import logging
+import threading
+
+from . import market_data
+from .market_history import market_history
+
+logger = logging.getLogger(__name__)
+
+# Chu kỳ poll (giây) theo rate limit của từng upstream:
+# CoinGecko free tier ~50 req/phút dùng chung cho 2 nguồn, Alternative.me cập nhật
+# F&G theo ngày, RSI tính từ nến Binance (chỉ fetch vài nến cuối mỗi lần).
+POLL_INTERVALS = {
+    "global_data": 60,
+    "btc_data": 30,
+    "fng_data": 600,
+    "rsi_data": 60,
+}
+
+# Payload cũ hơn ngưỡng này coi như poller đã ngừng hoạt động
+MAX_PAYLOAD_AGE = 900
+
+# Các field được đẩy qua WebSocket channel market khi giá trị thay đổi
+LIVE_FIELDS = (
+    "btc_price_usd",
+    "btc_change_24h",
+    "market_cap",
+    "volume_24h",
+    "fng_value",
+    "fng_classification",
+    "rsi_14",
+)
+
+
+class MarketDataPoller:
+    """Poller chạy trong daemon thread, mỗi worker process có một instance riêng"""
+
+    def __init__(self, intervals=None, tick=1.0):
+        self.intervals = dict(intervals or POLL_INTERVALS)
+        self.tick = tick
+        self._next_run = {}
+        self._payload = None  # (body_bytes, status_code, built_at)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        self.websocket_manager = None
+        self._published = {}
+
+    def set_websocket_manager(self, websocket_manager):
+        """Set WebSocket manager để đẩy thay đổi lên channel market"""
+        self.websocket_manager = websocket_manager
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive() and self._pid == os.getpid()
+
+    def ensure_started(self):
+        """
+        Khởi động poller nếu chưa chạy trong process hiện tại.
+        Gọi lazy từ request path để thread luôn chạy trong worker (gunicorn --preload
+        fork sau khi import app nên thread tạo ở master sẽ không tồn tại trong worker).
+        """
+        if self.is_running():
+            return
+        with self._lock:
+            if self.is_running():
+                return
+            self._stop.clear()
+            self._next_run = {name: 0 for name in self.intervals}
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="market-poller", daemon=True)
+            self._thread.start()
+            logger.info(f"Market data poller started (pid {self._pid})")
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                logger.exception(f"Market poller tick failed: {e}")
+            self._stop.wait(self.tick)
+
+    def poll_once(self):
+        """Refresh các nguồn đến hạn và build lại payload nếu có dữ liệu mới"""
+        now = time.time()
+        due = [name for name, next_run in self._next_run.items() if now >= next_run]
+        if not due and self._payload is not None:
+            # Gửi frame đã coalesce còn chờ (nếu có)
+            if self.websocket_manager is not None:
+                self.websocket_manager.flush_channel_updates()
+            return
+
+        futures = {}
+        for name in due:
+            self._next_run[name] = now + self.intervals[name]
+            futures[name] = market_data.market_data_cache.refresh(name)
+
+        for name, future in futures.items():
+            try:
+                future.result(timeout=market_data.market_data_cache.policy(name).wait_timeout)
+            except Exception:
+                # Refresh vẫn chạy tiếp ở background, giá trị cũ vẫn được dùng
+                pass
+
+        payload, status_code = self.rebuild_payload()
+        if status_code == 200:
+            self.publish_changes(payload)
+        # Ghi bucket 1h/1d vừa đóng xuống database ngoài event loop
+        market_history.flush()
+
+    def rebuild_payload(self):
+        """Tính lại payload dashboard từ dữ liệu hiện có và serialize sẵn"""
+        payload, status_code = market_data.build_dashboard_summary()
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self._payload = (body, status_code, time.time())
+        return payload, status_code
+
+    def publish_changes(self, payload):
+        """Đẩy các field đã thay đổi so với lần publish trước lên channel market"""
+        if self.websocket_manager is None:
+            return {}
+        # Nhiều worker cùng poll: chỉ worker giữ lease publish để client không nhận trùng frame
+        if not self.websocket_manager.claim_publisher("market", ttl=max(30, self.tick * 10)):
+            self._published = {}
+            return {}
+
+        changes = {
+            field: payload[field]
+            for field in LIVE_FIELDS
+            if field in payload and self._published.get(field) != payload[field]
+        }
+        if changes:
+            self._published.update(changes)
+            self.websocket_manager.broadcast_market_update(changes)
+        return changes
+
+    def get_payload(self, max_age=MAX_PAYLOAD_AGE):
+        """Trả về (body_bytes, status_code) đã tính sẵn, hoặc None nếu chưa có/đã quá cũ"""
+        snapshot = self._payload
+        if snapshot is None:
+            return None
+        body, status_code, built_at = snapshot
+        if time.time() - built_at > max_age:
+            return None
+        return body, status_code
+
+    def stats(self):
+        snapshot = self._payload
+        return {
+            "running": self.is_running(),
+            "intervals": self.intervals,
+            "payload_age": round(time.time() - snapshot[2], 1) if snapshot else None,
+        }
+
+
+market_poller = MarketDataPoller()
+
+
+def is_market_poller_enabled():
+    return os.getenv('ENABLE_MARKET_POLLER', 'true').lower() == 'true'
@@ -59,6 +59,8 @@ class ProgressTracker:
                     progress['percentage'] = int((step / progress['total_steps']) * 100)
                     progress['details'] = f"{timestamp} {details}" if details else ""
                     progress['last_update'] = time.time()
+                    # Step mới: bỏ thông tin stream của step trước
+                    progress.pop('stream', None)
                     print(f"[PROGRESS] Step {step}: {step_name}")
                 
                 # Nếu chỉ có details, đây là log entry detail
@@ -71,6 +73,36 @@ class ProgressTracker:
                 # Broadcast progress update
                 self._broadcast_progress(session_id)
     
+    def update_stream(self, session_id: str, label: str, chars: int, tokens: int, preview: str = ''):
+        """Cập nhật tiến độ của lời gọi AI đang stream (số token/ký tự đã nhận, đoạn text cuối)"""
+        timestamp = datetime.now().strftime("[%H:%M:%S.%f]")[:-3]  # Include milliseconds
+
+        with self.lock:
+            if session_id not in self.current_progress:
+                return
+            progress = self.current_progress[session_id]
+            progress['details'] = f"{timestamp} {label}: đang nhận ~{tokens} tokens ({chars} ký tự)..."
+            progress['stream'] = {
+                'label': label,
+                'chars': chars,
+                'tokens': tokens,
+                'preview': preview,
+            }
+            progress['last_update'] = time.time()
+
+        self._broadcast_progress(session_id)
+
+    def end_stream(self, session_id: str, label: str):
+        """Bỏ thông tin stream khi lời gọi AI `label` đã kết thúc (các branch song song có label riêng)"""
+        with self.lock:
+            progress = self.current_progress.get(session_id)
+            if not progress or progress.get('stream', {}).get('label') != label:
+                return
+            progress.pop('stream')
+            progress['last_update'] = time.time()
+
+        self._broadcast_progress(session_id)
+
     def update_substep(self, session_id: str, details: str):
         """Backward compatibility - gọi update_step với chỉ details"""
         self.update_step(session_id, details=details)
@@ -87,6 +119,7 @@ class ProgressTracker:
                 progress['status'] = 'completed' if success else 'error'
                 progress['current_step_name'] = f"{timestamp} ✅ Hoàn thành!" if success else f"{timestamp} ❌ Có lỗi xảy ra"
                 progress['report_id'] = report_id
+                progress.pop('stream', None)
                 progress['end_time'] = time.time()
                 progress['last_update'] = time.time()
         
@@ -103,6 +136,7 @@ class ProgressTracker:
                 progress['status'] = 'error'
                 progress['current_step_name'] = f"{timestamp} ❌ Lỗi"
                 progress['details'] = f"{timestamp} {error_msg}"
+                progress.pop('stream', None)
                 progress['end_time'] = time.time()
                 progress['last_update'] = time.time()
         
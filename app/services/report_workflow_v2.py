@@ -9,10 +9,12 @@ is useful for tests and local development.
 from __future__ import annotations
 
 import logging
+import threading
 import time
 import uuid
 from datetime import datetime
-from typing import Any, Dict
+from functools import wraps
+from typing import Any, Callable, Dict, Optional
 
 try:
     from langgraph.graph import StateGraph, END
@@ -21,15 +23,157 @@ except Exception:  # pragma: no cover - allow code to run when langgraph is abse
     END = None
 
 from .progress_tracker import progress_tracker
+from .workflow_checkpoints import checkpoint_store, node_succeeded
 
 logger = logging.getLogger(__name__)
 
+# Tăng khi đổi cấu trúc graph (node, edge, routing) để registry compile lại
+WORKFLOW_VERSION = 3
+REPORT_WORKFLOW_NAME = "report_v2"
+
+
+def _checkpointed(name: str, node: Callable) -> Callable:
+    """Bọc node: sau khi node thành công, gộp update của nó vào checkpoint của session"""
+
+    @wraps(node)
+    def run(state):
+        update = node(state)
+        # Khi resume, prepare_data chỉ dựng lại client/prompt: không lùi điểm resume về đầu
+        if name == "prepare_data" and state.get("resume_from"):
+            return update
+        try:
+            if update and node_succeeded(name, state, update):
+                checkpoint_store.save(state["session_id"], name, update)
+        except Exception as e:
+            logger.warning(f"Checkpoint after {name} failed: {e}")
+        return update
+
+    return run
+
+
+def _workflow_components() -> Dict[str, Callable]:
+    """Node và routing function hiện tại của workflow (lazy import, đọc lại từ module mỗi lần)"""
+    from .workflow_nodes import (
+        prepare_data,
+        research_deep,
+        validate_report,
+        generate_report_content,
+        create_interface_components,
+        translate_content,
+        save_database,
+        routing,
+    )
+
+    return {
+        "prepare_data": prepare_data.prepare_data_node,
+        "research_deep": research_deep.research_deep_node,
+        "validate_report": validate_report.validate_report_node,
+        "generate_report_content": generate_report_content.generate_report_content_node,
+        "create_html": create_interface_components.create_html_node,
+        "create_javascript": create_interface_components.create_javascript_node,
+        "create_css": create_interface_components.create_css_node,
+        "join_interface": create_interface_components.join_interface_node,
+        "translate_content": translate_content.translate_content_node,
+        "save_database": save_database.save_database_node,
+        "route_after_prepare": routing.route_after_prepare,
+        "should_retry_or_continue": routing.should_retry_or_continue,
+        "route_after_html": routing.route_after_html,
+        "should_continue_after_interface": routing.should_continue_after_interface,
+    }
+
+
+def _workflow_fingerprint() -> tuple:
+    """
+    Phiên bản cấu hình của graph: WORKFLOW_VERSION + identity của từng node/routing function.
+    Reload module hoặc thay node (vd. monkeypatch trong test) đổi fingerprint nên graph được
+    compile lại; graph đã compile giữ tham chiếu tới các function nên id không bị tái sử dụng.
+    """
+    if StateGraph is None:
+        return (WORKFLOW_VERSION, None)
+    return (WORKFLOW_VERSION, tuple((name, id(fn)) for name, fn in _workflow_components().items()))
+
+
+class CompiledWorkflowRegistry:
+    """
+    Cache graph đã compile trong process theo tên workflow. Chỉ compile lại khi fingerprint
+    đổi; graph compile xong không giữ state nên các session chạy song song dùng chung được.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+
+    def get(self, name: str, builder: Callable[[], Any], fingerprint: Any) -> Any:
+        entry = self._entries.get(name)
+        if entry is not None and entry["fingerprint"] == fingerprint:
+            return entry["workflow"]
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry["fingerprint"] == fingerprint:
+                return entry["workflow"]
+            started = time.perf_counter()
+            workflow = builder()
+            build_seconds = time.perf_counter() - started
+            self._entries[name] = {
+                "fingerprint": fingerprint,
+                "workflow": workflow,
+                "build_seconds": build_seconds,
+                "built_at": time.time(),
+                "builds": (entry or {}).get("builds", 0) + 1,
+            }
+            logger.info(f"Compiled workflow {name} in {build_seconds * 1000:.1f}ms")
+            return workflow
+
+    def invalidate(self, name: Optional[str] = None):
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            name: {
+                "version": entry["fingerprint"][0],
+                "build_seconds": round(entry["build_seconds"], 4),
+                "built_at": int(entry["built_at"]),
+                "builds": entry["builds"],
+            }
+            for name, entry in list(self._entries.items())
+        }
+
+
+workflow_registry = CompiledWorkflowRegistry()
+
+
+def get_compiled_workflow() -> Any:
+    """Graph report v2 đã compile của process (compile ở lần gọi đầu hoặc khi cấu hình đổi)"""
+    return workflow_registry.get(REPORT_WORKFLOW_NAME, _build_workflow, _workflow_fingerprint())
+
+
+def warmup_report_workflow(background: bool = True):
+    """Compile trước report workflow (mặc định ở background thread) để lần chạy đầu không phải chờ"""
+
+    def warmup():
+        try:
+            get_compiled_workflow()
+        except Exception as e:
+            logger.warning(f"Workflow warmup failed: {e}")
+
+    if not background:
+        warmup()
+        return None
+    thread = threading.Thread(target=warmup, name="workflow-warmup", daemon=True)
+    thread.start()
+    return thread
+
 
 def _build_workflow() -> Any:
     """Return a compiled workflow or a stub object with invoke(state).
 
     The stub returns a minimal successful state so higher-level code can
     behave uniformly in environments without LangGraph installed.
+    Callers should use get_compiled_workflow(), which caches the result.
     """
     if StateGraph is None:
         logger.debug("LangGraph not available — using stub workflow")
@@ -49,39 +193,27 @@ def _build_workflow() -> Any:
 
     # Lazy imports for real workflow construction
     from .workflow_nodes.base import ReportState
-    from .workflow_nodes.prepare_data import prepare_data_node
-    from .workflow_nodes.research_deep import research_deep_node
-    from .workflow_nodes.validate_report import validate_report_node
-    from .workflow_nodes.generate_report_content import generate_report_content_node
-    from .workflow_nodes.create_interface_components import (
-        create_html_node,
-        create_javascript_node,
-        create_css_node,
-    )
-    from .workflow_nodes.translate_content import translate_content_node
-    from .workflow_nodes.save_database import save_database_node
-    from .workflow_nodes.routing import (
-        should_retry_or_continue,
-        should_retry_html_or_continue,
-        should_retry_js_or_continue,
-        should_retry_css_or_continue,
-    )
+
+    components = _workflow_components()
+    route_after_prepare = components.pop("route_after_prepare")
+    should_retry_or_continue = components.pop("should_retry_or_continue")
+    route_after_html = components.pop("route_after_html")
+    should_continue_after_interface = components.pop("should_continue_after_interface")
+    nodes = components
 
     workflow = StateGraph(ReportState)
 
-    workflow.add_node("prepare_data", prepare_data_node)
-    workflow.add_node("research_deep", research_deep_node)
-    workflow.add_node("validate_report", validate_report_node)
-    workflow.add_node("generate_report_content", generate_report_content_node)
-    workflow.add_node("create_html", create_html_node)
-    workflow.add_node("create_javascript", create_javascript_node)
-    workflow.add_node("create_css", create_css_node)
-    workflow.add_node("translate_content", translate_content_node)
-    workflow.add_node("save_database", save_database_node)
+    for name, node in nodes.items():
+        workflow.add_node(name, _checkpointed(name, node))
 
     workflow.set_entry_point("prepare_data")
 
-    workflow.add_edge("prepare_data", "research_deep")
+    # Chạy mới: tiếp tục research_deep; resume: nhảy tới node sau node thành công cuối cùng
+    workflow.add_conditional_edges(
+        "prepare_data",
+        route_after_prepare,
+        {name: name for name in nodes if name not in ("prepare_data", "join_interface")},
+    )
     workflow.add_edge("research_deep", "validate_report")
 
     workflow.add_conditional_edges(
@@ -92,22 +224,23 @@ def _build_workflow() -> Any:
 
     workflow.add_edge("generate_report_content", "create_html")
 
+    # JS và CSS chỉ phụ thuộc HTML: fan-out chạy song song, hội tụ ở join_interface
     workflow.add_conditional_edges(
         "create_html",
-        should_retry_html_or_continue,
-        {"retry_html": "create_html", "continue": "create_javascript", "end": END},
-    )
-
-    workflow.add_conditional_edges(
-        "create_javascript",
-        should_retry_js_or_continue,
-        {"retry_js": "create_javascript", "continue": "create_css", "end": END},
+        route_after_html,
+        {
+            "retry_html": "create_html",
+            "create_javascript": "create_javascript",
+            "create_css": "create_css",
+            "end": END,
+        },
     )
+    workflow.add_edge(["create_javascript", "create_css"], "join_interface")
 
     workflow.add_conditional_edges(
-        "create_css",
-        should_retry_css_or_continue,
-        {"retry_css": "create_css", "continue": "translate_content", "end": END},
+        "join_interface",
+        should_continue_after_interface,
+        {"continue": "translate_content", "end": END},
     )
 
     workflow.add_edge("translate_content", "save_database")
@@ -116,50 +249,33 @@ def _build_workflow() -> Any:
     return workflow.compile()
 
 
-def generate_auto_research_report_langgraph_v2(api_key: str, max_attempts: int = 3, session_id: str | None = None) -> Dict[str, Any]:
-    """Run the report workflow and return a stable result dict.
-
-    The function always returns a dictionary with predictable keys so callers
-    don't need to know whether LangGraph was present or a stub was used.
-    """
-    start = time.time()
-    if session_id is None:
-        session_id = str(uuid.uuid4())
-
-    progress_tracker.start_progress(session_id, total_steps=10)
-    progress_tracker.update_step(session_id, 0, "starting", "Initializing report workflow v2")
-
-    workflow = _build_workflow()
-
-    initial_state: Dict[str, Any] = {
-        "session_id": session_id,
-        "api_key": api_key,
-        "max_attempts": max_attempts,
-        "created_at": datetime.utcnow().isoformat(),
+def _failed_result(session_id: str, error: str, start: float) -> Dict[str, Any]:
+    return {
         "success": False,
-        "error_messages": [],
-        "html_attempt": 0,
-        "js_attempt": 0,
-        "css_attempt": 0,
+        "session_id": session_id,
+        "report_id": None,
+        "html_content": "",
+        "css_content": "",
+        "js_content": "",
+        "research_content": "",
+        "error_messages": [error],
+        "execution_time": time.time() - start,
+        "validation_result": "ERROR",
     }
 
+
+def _run_workflow(initial_state: Dict[str, Any], start: float) -> Dict[str, Any]:
+    """Chạy workflow từ initial_state, cập nhật checkpoint và trả về result dict ổn định"""
+    session_id = initial_state["session_id"]
+    workflow = get_compiled_workflow()
+
     try:
         final = workflow.invoke(initial_state)
     except Exception as exc:
         logger.exception("Workflow raised an exception")
         progress_tracker.error_progress(session_id, str(exc))
-        return {
-            "success": False,
-            "session_id": session_id,
-            "report_id": None,
-            "html_content": "",
-            "css_content": "",
-            "js_content": "",
-            "research_content": "",
-            "error_messages": [str(exc)],
-            "execution_time": time.time() - start,
-            "validation_result": "ERROR",
-        }
+        checkpoint_store.finish(session_id, success=False)
+        return _failed_result(session_id, str(exc), start)
 
     exec_time = time.time() - start
 
@@ -179,12 +295,69 @@ def generate_auto_research_report_langgraph_v2(api_key: str, max_attempts: int =
         "css_attempt": final.get("css_attempt", 0),
     }
 
+    # Thành công: bỏ checkpoint; lỗi: giữ lại để resume từ node thành công cuối cùng
+    checkpoint_store.finish(session_id, success=result["success"])
     if not result["success"]:
         progress_tracker.error_progress(session_id, ", ".join(result.get("error_messages", [])))
 
     return result
 
 
+def generate_auto_research_report_langgraph_v2(api_key: str, max_attempts: int = 3, session_id: str | None = None) -> Dict[str, Any]:
+    """Run the report workflow and return a stable result dict.
+
+    The function always returns a dictionary with predictable keys so callers
+    don't need to know whether LangGraph was present or a stub was used.
+    """
+    start = time.time()
+    if session_id is None:
+        session_id = str(uuid.uuid4())
+
+    progress_tracker.start_progress(session_id, total_steps=10)
+    progress_tracker.update_step(session_id, 0, "starting", "Initializing report workflow v2")
+
+    initial_state: Dict[str, Any] = {
+        "session_id": session_id,
+        "api_key": api_key,
+        "max_attempts": max_attempts,
+        "created_at": datetime.utcnow().isoformat(),
+        "success": False,
+        "error_messages": [],
+        "html_attempt": 0,
+        "js_attempt": 0,
+        "css_attempt": 0,
+    }
+
+    return _run_workflow(initial_state, start)
+
+
+def resume_report_workflow_v2(api_key: str, session_id: str, max_attempts: int = 3) -> Dict[str, Any]:
+    """Chạy lại một session lỗi từ node kế tiếp sau node thành công cuối cùng trong checkpoint.
+
+    Không có checkpoint (hoặc session đã xong hết các node) thì trả về result lỗi.
+    """
+    start = time.time()
+    checkpoint = checkpoint_store.load(session_id)
+    resume_from = checkpoint_store.resume_point(checkpoint)
+    if resume_from is None:
+        return _failed_result(session_id, f"Không có checkpoint để resume cho session {session_id}", start)
+
+    progress_tracker.start_progress(session_id, total_steps=10)
+    progress_tracker.update_step(session_id, 0, "resuming", f"Resume workflow v2 từ {resume_from}")
+
+    initial_state: Dict[str, Any] = {
+        **checkpoint["state"],
+        "session_id": session_id,
+        "api_key": api_key,
+        "max_attempts": max_attempts,
+        "success": False,
+        "error_messages": [],
+        "resume_from": resume_from,
+    }
+
+    return _run_workflow(initial_state, start)
+
+
 # Backwards compatibility wrappers
 def create_report_workflow():
     from .report_workflow import create_report_workflow as legacy
@@ -1,72 +1,49 @@
 import os
-import time
-from .api_client import fetch_json
-from ..utils.cache import get_backup_cache, set_backup_cache
+from .api_client import fetch_service_json, fetch_service_json_async, with_backup
 
-# Global variables for rate limiting
-_last_request_time = 0
-_min_request_interval = 60  # Minimum 60 seconds between requests
+# Quota TAAPI dùng chung cho mọi worker (token bucket trong Redis khi có REDIS_URL)
+SERVICE_NAME = "taapi"
 
 # Base URL template for TAAPI RSI endpoint
 BASE_RSI_URL_TEMPLATE = "https://api.taapi.io/rsi?secret={secret}&exchange=binance&symbol=BTC/USDT&interval=1d"
 
-def get_btc_rsi():
-    """Lấy chỉ số RSI của Bitcoin từ TAAPI.IO với rate limiting và backup cache."""
-    global _last_request_time, _min_request_interval
-    
+
+def _api_url():
     api_key = os.getenv('TAAPI_SECRET')
     if not api_key:
-        return None, "TAAPI_SECRET không được cấu hình", 500
-        
-    api_url = BASE_RSI_URL_TEMPLATE.format(secret=api_key)
+        return None
+    return BASE_RSI_URL_TEMPLATE.format(secret=api_key)
 
-    # Kiểm tra rate limiting
-    current_time = time.time()
-    time_since_last_request = current_time - _last_request_time
-    
-    if time_since_last_request < _min_request_interval:
-        # Thử lấy từ backup cache khi bị rate limit
+
+def _handle_response(json_data, error, status_code):
+    """Xử lý phản hồi TAAPI; lỗi, rate limit hay circuit mở đều fallback về backup cache."""
+    if error:
+        result = (None, f"Lỗi khi gọi TAAPI: {error}", status_code)
+    else:
         try:
-            backup_data = get_backup_cache("taapi_rsi")
-            if backup_data:
-                return backup_data, None, 200
-        except Exception as cache_error:
-            print(f"Warning: Could not read from backup cache: {cache_error}")
-        
-        time_to_wait = _min_request_interval - time_since_last_request
-        return None, f"Rate limit: phải chờ {int(time_to_wait)} giây nữa", 429
+            rsi_value = json_data.get('value')
+            if rsi_value is None:
+                raise KeyError("Không tìm thấy 'value' trong phản hồi của TAAPI.")
+            result = ({'rsi_14': rsi_value}, None, 200)
+        except (AttributeError, KeyError) as e:
+            result = (None, f"Lỗi xử lý dữ liệu RSI từ TAAPI: {e}", 500)
+    return with_backup("taapi_rsi", result, max_age_hours=6)
 
-    _last_request_time = current_time
-    json_data, error, status_code = fetch_json(api_url, timeout=3)
 
-    if error:
-        # Nếu gặp rate limit, tăng thời gian chờ và thử backup cache
-        if status_code == 429:
-            _min_request_interval = min(_min_request_interval * 2, 300)  # Tối đa 5 phút
-            
-            try:
-                backup_data = get_backup_cache("taapi_rsi")
-                if backup_data:
-                    return backup_data, None, 200
-            except Exception as cache_error:
-                print(f"Warning: Could not read from backup cache: {cache_error}")
-                
-        return None, f"Lỗi khi gọi TAAPI: {error}", status_code
+def get_btc_rsi():
+    """Lấy chỉ số RSI của Bitcoin từ TAAPI.IO với rate limiting và backup cache."""
+    api_url = _api_url()
+    if api_url is None:
+        return None, "TAAPI_SECRET không được cấu hình", 500
 
-    try:
-        rsi_value = json_data.get('value')
-        if rsi_value is None:
-            raise KeyError("Không tìm thấy 'value' trong phản hồi của TAAPI.")
-        data = {'rsi_14': rsi_value}
-        
-        # Lưu vào backup cache khi thành công (ignore errors)
-        try:
-            set_backup_cache("taapi_rsi", data, max_age_hours=6)
-        except Exception as cache_error:
-            print(f"Warning: Could not save to backup cache: {cache_error}")
-        
-        # Reset interval sau khi request thành công
-        _min_request_interval = 60
-        return data, None, 200
-    except (AttributeError, KeyError) as e:
-        return None, f"Lỗi xử lý dữ liệu RSI từ TAAPI: {e}", 500
\ No newline at end of file
+    # Quota TAAPI rất thấp (1 request/phút): không chờ tới lượt, dùng backup ngay
+    return _handle_response(*fetch_service_json(SERVICE_NAME, api_url, timeout=3, acquire_timeout=0))
+
+
+async def get_btc_rsi_async():
+    """Biến thể asyncio của get_btc_rsi."""
+    api_url = _api_url()
+    if api_url is None:
+        return None, "TAAPI_SECRET không được cấu hình", 500
+
+    return _handle_response(*await fetch_service_json_async(SERVICE_NAME, api_url, timeout=3, acquire_timeout=0))
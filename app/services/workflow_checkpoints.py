@@ -0,0 +1,210 @@
+"""
+Checkpoint theo node cho report workflow v2.
+
+Sau mỗi node thành công, phần state serialize được (trừ client, API key, prompt) được
+gộp vào checkpoint của session_id. Khi một bước sau lỗi, resume chạy lại prepare_data
+(rẻ: đọc prompt, tạo client) rồi nhảy thẳng tới node kế tiếp, không gọi lại các bước
+LLM đắt như research_deep.
+
+Có application context thì lưu vào bảng workflow_checkpoint, không thì giữ trong process.
+
+Checkpoint còn "running" nhưng không được cập nhật quá CHECKPOINT_STALE_AFTER giây được
+coi là run đã chết (worker bị kill/redeploy giữa chừng) và có thể resume.
+"""
+import os
+import json
+import logging
+import threading
+import time
+from datetime import timezone
+from typing import Any, Dict, List, Optional
+
+from flask import has_app_context
+
+logger = logging.getLogger(__name__)
+
+# Không lưu: object không serialize được, secret và prompt (prepare_data tạo lại)
+EXCLUDED_KEYS = frozenset({
+    "client",
+    "api_key",
+    "research_analysis_prompt",
+    "data_validation_prompt",
+    "create_report_prompt",
+    "resume_from",
+})
+
+# Điểm vào khi fan-out JS/CSS: nhánh đã có nội dung sẽ bỏ qua
+COMPONENTS_ENTRY = "create_components"
+
+# Node thành công cuối cùng -> node chạy tiếp khi resume
+RESUME_POINTS = {
+    "prepare_data": "research_deep",
+    "research_deep": "validate_report",
+    "validate_report": "generate_report_content",
+    "generate_report_content": "create_html",
+    "create_html": COMPONENTS_ENTRY,
+    "create_javascript": COMPONENTS_ENTRY,
+    "create_css": COMPONENTS_ENTRY,
+    "join_interface": "translate_content",
+    "translate_content": "save_database",
+}
+
+# Không node nào chạy lâu hơn ngần này giây (kể cả retry LLM) mà không lưu checkpoint
+CHECKPOINT_STALE_AFTER = int(os.getenv("CHECKPOINT_STALE_AFTER", 15 * 60))
+
+_BRANCH_ERROR_KEYS = {"create_javascript": "js_error", "create_css": "css_error"}
+
+
+def node_succeeded(node: str, state: Dict[str, Any], update: Dict[str, Any]) -> bool:
+    """Node có hoàn thành để làm điểm resume không"""
+    if node in _BRANCH_ERROR_KEYS:
+        return not update.get(_BRANCH_ERROR_KEYS[node])
+    merged = {**state, **update}
+    if node == "validate_report":
+        return merged.get("validation_result") == "PASS"
+    return bool(merged.get("success"))
+
+
+def serializable_state(update: Dict[str, Any]) -> Dict[str, Any]:
+    """Các key JSON-serializable của update, bỏ EXCLUDED_KEYS"""
+    result = {}
+    for key, value in update.items():
+        if key in EXCLUDED_KEYS:
+            continue
+        try:
+            json.dumps(value)
+        except (TypeError, ValueError):
+            continue
+        result[key] = value
+    return result
+
+
+class WorkflowCheckpointStore:
+    """
+    Lưu checkpoint theo session_id. Nhánh JS/CSS chạy song song cùng ghi nên mọi
+    thao tác đi qua một lock (cũng giữ db.session dùng chung giữa các thread an toàn).
+    """
+
+    def __init__(self, stale_after: float = CHECKPOINT_STALE_AFTER):
+        self._lock = threading.Lock()
+        self._memory: Dict[str, Dict[str, Any]] = {}
+        self.stale_after = stale_after
+
+    def save(self, session_id: str, node: str, update: Dict[str, Any]):
+        """Gộp update của node vừa thành công vào checkpoint"""
+        state = serializable_state(update)
+        with self._lock:
+            if has_app_context():
+                self._save_sql(session_id, node, state)
+            else:
+                checkpoint = self._memory.setdefault(
+                    session_id, {"state": {}, "completed_nodes": [], "status": "running"})
+                checkpoint["state"].update(state)
+                checkpoint["completed_nodes"].append(node)
+                checkpoint["last_node"] = node
+                checkpoint["status"] = "running"
+                checkpoint["updated_at"] = time.time()
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """{state, last_node, completed_nodes, status, updated_at (epoch giây)} hoặc None"""
+        with self._lock:
+            if has_app_context():
+                return self._load_sql(session_id)
+            checkpoint = self._memory.get(session_id)
+            if checkpoint is None:
+                return None
+            return {**checkpoint, "state": dict(checkpoint["state"]),
+                    "completed_nodes": list(checkpoint["completed_nodes"])}
+
+    def finish(self, session_id: str, success: bool):
+        """Workflow kết thúc: thành công thì xóa checkpoint, lỗi thì đánh dấu failed để resume"""
+        with self._lock:
+            if has_app_context():
+                self._finish_sql(session_id, success)
+            elif success:
+                self._memory.pop(session_id, None)
+            elif session_id in self._memory:
+                self._memory[session_id]["status"] = "failed"
+                self._memory[session_id]["updated_at"] = time.time()
+
+    @staticmethod
+    def resume_point(checkpoint: Optional[Dict[str, Any]]) -> Optional[str]:
+        if not checkpoint:
+            return None
+        return RESUME_POINTS.get(checkpoint.get("last_node"))
+
+    def is_resumable(self, checkpoint: Optional[Dict[str, Any]]) -> bool:
+        """Run đã lỗi, hoặc vẫn "running" nhưng quá stale_after giây không có node nào xong"""
+        if not checkpoint:
+            return False
+        if checkpoint.get("status") != "running":
+            return True
+        updated_at = checkpoint.get("updated_at")
+        return updated_at is not None and time.time() - updated_at > self.stale_after
+
+    # SQL backend
+    def _save_sql(self, session_id, node, state):
+        from ..extensions import db
+        from ..models import WorkflowCheckpoint
+
+        try:
+            row = db.session.get(WorkflowCheckpoint, session_id)
+            if row is None:
+                row = WorkflowCheckpoint(session_id=session_id, state='{}', completed_nodes='[]')
+                db.session.add(row)
+            merged = json.loads(row.state or '{}')
+            merged.update(state)
+            completed: List[str] = json.loads(row.completed_nodes or '[]')
+            completed.append(node)
+            row.state = json.dumps(merged, ensure_ascii=False)
+            row.completed_nodes = json.dumps(completed)
+            row.last_node = node
+            row.status = 'running'
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"[Checkpoint] Save {session_id}/{node} failed: {e}")
+
+    def _load_sql(self, session_id):
+        from ..extensions import db
+        from ..models import WorkflowCheckpoint
+
+        row = db.session.get(WorkflowCheckpoint, session_id)
+        if row is None:
+            return None
+        return {
+            "state": json.loads(row.state or '{}'),
+            "last_node": row.last_node,
+            "completed_nodes": json.loads(row.completed_nodes or '[]'),
+            "status": row.status,
+            "updated_at": _epoch(row.updated_at),
+        }
+
+    def _finish_sql(self, session_id, success):
+        from ..extensions import db
+        from ..models import WorkflowCheckpoint
+
+        try:
+            row = db.session.get(WorkflowCheckpoint, session_id)
+            if row is None:
+                return
+            if success:
+                db.session.delete(row)
+            else:
+                row.status = 'failed'
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"[Checkpoint] Finish {session_id} failed: {e}")
+
+
+def _epoch(value):
+    if value is None:
+        return None
+    # SQLite trả về datetime naive (giá trị đã lưu theo UTC)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+checkpoint_store = WorkflowCheckpointStore()
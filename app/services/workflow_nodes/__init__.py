@@ -6,14 +6,17 @@ from .research_deep import research_deep_node
 from .validate_report import validate_report_node
 from .create_interface import create_interface_node
 from .extract_code import extract_code_node
-from .create_interface_components import create_html_node, create_javascript_node, create_css_node
+from .create_interface_components import create_html_node, create_javascript_node, create_css_node, join_interface_node
 from .save_database import save_database_node
 from .routing import (
     should_retry_or_continue, 
     should_retry_interface_or_continue,
     should_retry_html_or_continue,
     should_retry_js_or_continue,
-    should_retry_css_or_continue
+    should_retry_css_or_continue,
+    route_after_html,
+    route_after_prepare,
+    should_continue_after_interface
 )
 
 __all__ = [
@@ -26,10 +29,14 @@ __all__ = [
     'create_html_node',
     'create_javascript_node', 
     'create_css_node',
+    'join_interface_node',
     'save_database_node',
     'should_retry_or_continue',
     'should_retry_interface_or_continue',
     'should_retry_html_or_continue',
     'should_retry_js_or_continue',
-    'should_retry_css_or_continue'
+    'should_retry_css_or_continue',
+    'route_after_html',
+    'route_after_prepare',
+    'should_continue_after_interface'
 ]
@@ -53,6 +53,13 @@ class ReportState(TypedDict):
     css_attempt: Optional[int]
     interface_attempt: Optional[int]  # For backward compatibility
     
+    # Lỗi của các nhánh chạy song song (JS/CSS), gộp lại ở join_interface
+    js_error: Optional[str]
+    css_error: Optional[str]
+    
+    # Resume từ checkpoint: node chạy tiếp sau prepare_data (None khi chạy mới)
+    resume_from: Optional[str]
+    
     # Timestamps
     created_at: Optional[str]
     
@@ -176,9 +183,14 @@ def extract_code_blocks(response_text):
     }
 
 
+# Dòng kết luận validation trong response của model
+VALIDATION_VERDICT_PATTERN = re.compile(r"KẾT QUẢ KIỂM TRA:\s*(PASS|FAIL)", re.IGNORECASE)
+
+
 def check_report_validation(report_text):
     """
     Kiểm tra kết quả validation của báo cáo.
+    Có nhiều dòng kết luận (vd. model tự sửa FAIL thành PASS) thì kết luận cuối cùng được tính.
     
     Returns:
         str: 'PASS', 'FAIL', hoặc 'UNKNOWN'
@@ -189,50 +201,25 @@ def check_report_validation(report_text):
         return 'UNKNOWN'
     
     # Tìm kết quả kiểm tra cuối cùng
-    pass_pattern = re.search(r"KẾT QUẢ KIỂM TRA:\s*PASS", report_text, re.IGNORECASE)
-    fail_pattern = re.search(r"KẾT QUẢ KIỂM TRA:\s*FAIL", report_text, re.IGNORECASE)
-    
-    if pass_pattern:
-        return 'PASS'
-    elif fail_pattern:
-        return 'FAIL'
-    else:
-        return 'UNKNOWN'
+    verdicts = VALIDATION_VERDICT_PATTERN.findall(report_text)
+    if verdicts:
+        return verdicts[-1].upper()
+    return 'UNKNOWN'
 
 
 def get_realtime_dashboard_data():
     """Lấy dữ liệu thời gian thực từ các services cơ bản"""
     try:
-        # Import trực tiếp các service cần thiết (không có RSI)
-        from ... import services
-        import concurrent.futures
+        # Dùng chung store với dashboard (poller/SWR cache) thay vì gọi lại upstream
+        from ..market_data import market_data_cache
         
-        print("Calling essential real-time data services...")
+        print("Reading essential real-time data from market data cache...")
         
-        # Định nghĩa các service calls cơ bản
-        def call_global_data():
-            return services.coingecko.get_global_market_data()
-        
-        def call_btc_data():
-            return services.coingecko.get_btc_price()
-        
-        def call_fng_data():
-            return services.alternative_me.get_fng_index()
-        
-        # Gọi tất cả API song song với timeout
-        with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-            future_global = executor.submit(call_global_data)
-            future_btc = executor.submit(call_btc_data)
-            future_fng = executor.submit(call_fng_data)
-            
-            # Chờ tất cả hoàn thành với timeout 10 giây
-            try:
-                global_data, global_error, global_status = future_global.result(timeout=10)
-                btc_data, btc_error, btc_status = future_btc.result(timeout=10)
-                fng_data, fng_error, fng_status = future_fng.result(timeout=10)
-            except concurrent.futures.TimeoutError:
-                print("Timeout when getting real-time data")
-                return None
+        # RSI không cần cho báo cáo
+        results = market_data_cache.get_many(["global_data", "btc_data", "fng_data"])
+        global_data, global_error, global_status = results["global_data"]
+        btc_data, btc_error, btc_status = results["btc_data"]
+        fng_data, fng_error, fng_status = results["fng_data"]
 
         # Xử lý lỗi và tạo fallback data
         if fng_error:
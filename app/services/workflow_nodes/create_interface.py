@@ -1,10 +1,10 @@
 """
 Node tạo giao diện từ báo cáo nghiên cứu
 """
-import time
 from google.genai import types
 from .base import ReportState
 from ...services.progress_tracker import progress_tracker
+from ...services import llm_gateway
 
 
 def create_interface_node(state: ReportState) -> ReportState:
@@ -34,27 +34,19 @@ def create_interface_node(state: ReportState) -> ReportState:
         candidate_count=1,
     )
     
-    # Retry cho interface generation
-    for interface_attempt in range(3):
-        try:
-            progress_tracker.update_step(session_id, details=f"Gọi AI tạo giao diện (lần {interface_attempt + 1}/3)...")
-            interface_response = state["client"].models.generate_content(
-                model=state["model"],
-                contents=interface_contents,
-                config=simple_config
-            )
-            break
-        except Exception as interface_error:
-            if interface_attempt < 2:
-                wait_time = (interface_attempt + 1) * 20
-                progress_tracker.update_step(session_id, details=f"Lỗi tạo giao diện, chờ {wait_time}s...")
-                time.sleep(wait_time)
-            else:
-                error_msg = "Không thể tạo interface sau 3 lần thử"
-                state["error_messages"].append(error_msg)
-                state["success"] = False
-                progress_tracker.error_progress(session_id, error_msg)
-                return state
+    # Gateway tự retry lỗi tạm thời với backoff theo loại lỗi
+    try:
+        progress_tracker.update_step(session_id, details="Gọi AI tạo giao diện...")
+        interface_response = llm_gateway.generate_content(
+            state["client"], state["model"], interface_contents, simple_config,
+            session_id=session_id, label="tạo giao diện"
+        )
+    except Exception as interface_error:
+        error_msg = f"Không thể tạo interface: {interface_error}"
+        state["error_messages"].append(error_msg)
+        state["success"] = False
+        progress_tracker.error_progress(session_id, error_msg)
+        return state
     
     # Kiểm tra interface response
     if not interface_response or not hasattr(interface_response, 'text'):
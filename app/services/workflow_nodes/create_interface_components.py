@@ -1,11 +1,11 @@
 """
 Node tạo giao diện theo từng thành phần riêng biệt (HTML, JS, CSS)
 """
-import time
 import re
 from google.genai import types
 from .base import ReportState, read_prompt_file
 from ...services.progress_tracker import progress_tracker
+from ...services import llm_gateway
 
 
 def create_html_node(state: ReportState) -> ReportState:
@@ -47,27 +47,19 @@ def create_html_node(state: ReportState) -> ReportState:
         candidate_count=1,
     )
     
-    # Retry cho HTML generation
-    for html_attempt in range(3):
-        try:
-            progress_tracker.update_step(session_id, details=f"Gọi AI tạo HTML (lần {html_attempt + 1}/3)...")
-            html_response = state["client"].models.generate_content(
-                model=state["model"],
-                contents=html_contents,
-                config=simple_config
-            )
-            break
-        except Exception as html_error:
-            if html_attempt < 2:
-                wait_time = (html_attempt + 1) * 20
-                progress_tracker.update_step(session_id, details=f"Lỗi tạo HTML, chờ {wait_time}s...")
-                time.sleep(wait_time)
-            else:
-                error_msg = f"Không thể tạo HTML sau 3 lần thử: {str(html_error)}"
-                state["error_messages"].append(error_msg)
-                state["success"] = False
-                progress_tracker.error_progress(session_id, error_msg)
-                return state
+    # Gateway tự retry lỗi tạm thời với backoff theo loại lỗi
+    try:
+        progress_tracker.update_step(session_id, details="Gọi AI tạo HTML...")
+        html_response = llm_gateway.generate_content(
+            state["client"], state["model"], html_contents, simple_config,
+            session_id=session_id, label="tạo HTML", stream=True
+        )
+    except Exception as html_error:
+        error_msg = f"Không thể tạo HTML: {str(html_error)}"
+        state["error_messages"].append(error_msg)
+        state["success"] = False
+        progress_tracker.error_progress(session_id, error_msg)
+        return state
     
     # Kiểm tra HTML response
     if not html_response or not hasattr(html_response, 'text') or not html_response.text:
@@ -80,6 +72,7 @@ def create_html_node(state: ReportState) -> ReportState:
     # Trích xuất HTML content
     html_content = _extract_html(html_response.text)
     if not html_content:
+        llm_gateway.forget(state["model"], html_contents, simple_config)
         error_msg = "Không thể trích xuất HTML từ phản hồi AI"
         state["error_messages"].append(error_msg)
         state["success"] = False
@@ -93,111 +86,39 @@ def create_html_node(state: ReportState) -> ReportState:
     return state
 
 
-def create_javascript_node(state: ReportState) -> ReportState:
-    """Node để tạo JavaScript từ báo cáo nghiên cứu"""
-    session_id = state["session_id"]
-    js_attempt_key = "js_attempt"
-    if js_attempt_key not in state:
-        state[js_attempt_key] = 0
-    state[js_attempt_key] += 1
-    
-    # Bước tạo JavaScript
-    progress_tracker.update_step(session_id, 6, f"Tạo JavaScript (lần {state[js_attempt_key]})", "Tạo tương tác JS từ nội dung HTML")
-    
-    # Đọc prompt tạo JavaScript
-    js_prompt = read_prompt_file('prompt_create_javascript.md')
-    if not js_prompt:
-        error_msg = "Không thể đọc prompt tạo JavaScript"
-        state["error_messages"].append(error_msg)
-        state["success"] = False
-        progress_tracker.error_progress(session_id, error_msg)
-        return state
-    
-    # Tạo request tạo JS (bao gồm HTML đã tạo để tương thích)
-    html_context = state.get("html_content", "")
-    full_request = f"{js_prompt}\n\n---\n\n**HTML ĐÃ TẠO:**\n\n{html_context}"
-    
-    js_contents = [
-        types.Content(
-            role="user",
-            parts=[
-                types.Part.from_text(text=full_request),
-            ],
-        ),
-    ]
-    
-    simple_config = types.GenerateContentConfig(
-        temperature=0.3,
-        candidate_count=1,
-    )
-    
-    # Retry cho JS generation
-    for js_attempt in range(3):
-        try:
-            progress_tracker.update_step(session_id, details=f"Gọi AI tạo JavaScript (lần {js_attempt + 1}/3)...")
-            js_response = state["client"].models.generate_content(
-                model=state["model"],
-                contents=js_contents,
-                config=simple_config
-            )
-            break
-        except Exception as js_error:
-            if js_attempt < 2:
-                wait_time = (js_attempt + 1) * 20
-                progress_tracker.update_step(session_id, details=f"Lỗi tạo JavaScript, chờ {wait_time}s...")
-                time.sleep(wait_time)
-            else:
-                error_msg = f"Không thể tạo JavaScript sau 3 lần thử: {str(js_error)}"
-                state["error_messages"].append(error_msg)
-                state["success"] = False
-                progress_tracker.error_progress(session_id, error_msg)
-                return state
-    
-    # Kiểm tra JS response
-    if not js_response or not hasattr(js_response, 'text') or not js_response.text:
-        error_msg = "Không nhận được nội dung JavaScript từ AI"
-        state["error_messages"].append(error_msg)
-        state["success"] = False
-        progress_tracker.error_progress(session_id, error_msg)
-        return state
-    
-    # Trích xuất JS content
-    js_content = _extract_javascript(js_response.text)
-    if not js_content:
-        js_content = "// JavaScript được tạo tự động\nconsole.log('Report loaded successfully');"
-    
-    state["js_content"] = js_content
-    state["success"] = True
-    progress_tracker.update_step(session_id, details=f"✓ Tạo JavaScript hoàn thành - {len(js_content)} chars")
-    
-    return state
+# JS và CSS chỉ phụ thuộc HTML nên chạy song song sau create_html, mỗi nhánh retry qua gateway
+COMPONENT_MAX_ATTEMPTS = 3
+DEFAULT_JS_CONTENT = "// JavaScript được tạo tự động\nconsole.log('Report loaded successfully');"
+DEFAULT_CSS_CONTENT = "/* CSS được tạo tự động */\nbody { font-family: Arial, sans-serif; margin: 20px; }"
+
 
+def _generate_from_html(state, kind, prompt_file, step, label, extract, fallback):
+    """
+    Tạo một thành phần (JS/CSS) từ HTML đã tạo; gateway retry tối đa COMPONENT_MAX_ATTEMPTS lần.
 
-def create_css_node(state: ReportState) -> ReportState:
-    """Node để tạo CSS từ báo cáo nghiên cứu"""
+    Nhánh này chạy song song với nhánh còn lại nên không sửa state dùng chung, chỉ trả
+    về các key riêng: {kind}_content, {kind}_attempt, {kind}_error. join_interface_node
+    gộp lỗi của các nhánh sau khi cả hai xong.
+    """
     session_id = state["session_id"]
-    css_attempt_key = "css_attempt"
-    if css_attempt_key not in state:
-        state[css_attempt_key] = 0
-    state[css_attempt_key] += 1
-    
-    # Bước tạo CSS
-    progress_tracker.update_step(session_id, 7, f"Tạo CSS (lần {state[css_attempt_key]})", "Tạo styling CSS từ nội dung HTML")
-    
-    # Đọc prompt tạo CSS
-    css_prompt = read_prompt_file('prompt_create_css.md')
-    if not css_prompt:
-        error_msg = "Không thể đọc prompt tạo CSS"
-        state["error_messages"].append(error_msg)
-        state["success"] = False
-        progress_tracker.error_progress(session_id, error_msg)
-        return state
-    
-    # Tạo request tạo CSS (bao gồm HTML đã tạo để tương thích)
+    attempt_key = f"{kind}_attempt"
+    error_key = f"{kind}_error"
+    attempts = state.get(attempt_key) or 0
+
+    # Resume từ checkpoint: nhánh đã tạo xong ở lần chạy trước thì không gọi lại AI
+    if state.get(f"{kind}_content") and not state.get(error_key):
+        return {attempt_key: attempts}
+
+    progress_tracker.update_step(session_id, step, f"Tạo {label}", f"Tạo {label} từ nội dung HTML")
+
+    prompt = read_prompt_file(prompt_file)
+    if not prompt:
+        return {attempt_key: attempts, error_key: f"Không thể đọc prompt tạo {label}"}
+
+    # Request gồm HTML đã tạo để JS/CSS khớp với cấu trúc trang
     html_context = state.get("html_content", "")
-    full_request = f"{css_prompt}\n\n---\n\n**HTML ĐÃ TẠO:**\n\n{html_context}"
-    
-    css_contents = [
+    full_request = f"{prompt}\n\n---\n\n**HTML ĐÃ TẠO:**\n\n{html_context}"
+    contents = [
         types.Content(
             role="user",
             parts=[
@@ -205,52 +126,49 @@ def create_css_node(state: ReportState) -> ReportState:
             ],
         ),
     ]
-    
     simple_config = types.GenerateContentConfig(
         temperature=0.3,
         candidate_count=1,
     )
-    
-    # Retry cho CSS generation
-    for css_attempt in range(3):
-        try:
-            progress_tracker.update_step(session_id, details=f"Gọi AI tạo CSS (lần {css_attempt + 1}/3)...")
-            css_response = state["client"].models.generate_content(
-                model=state["model"],
-                contents=css_contents,
-                config=simple_config
-            )
-            break
-        except Exception as css_error:
-            if css_attempt < 2:
-                wait_time = (css_attempt + 1) * 20
-                progress_tracker.update_step(session_id, details=f"Lỗi tạo CSS, chờ {wait_time}s...")
-                time.sleep(wait_time)
-            else:
-                error_msg = f"Không thể tạo CSS sau 3 lần thử: {str(css_error)}"
-                state["error_messages"].append(error_msg)
-                state["success"] = False
-                progress_tracker.error_progress(session_id, error_msg)
-                return state
-    
-    # Kiểm tra CSS response
-    if not css_response or not hasattr(css_response, 'text') or not css_response.text:
-        error_msg = "Không nhận được nội dung CSS từ AI"
-        state["error_messages"].append(error_msg)
-        state["success"] = False
-        progress_tracker.error_progress(session_id, error_msg)
-        return state
-    
-    # Trích xuất CSS content
-    css_content = _extract_css(css_response.text)
-    if not css_content:
-        css_content = "/* CSS được tạo tự động */\nbody { font-family: Arial, sans-serif; margin: 20px; }"
-    
-    state["css_content"] = css_content
-    state["success"] = True
-    progress_tracker.update_step(session_id, details=f"✓ Tạo CSS hoàn thành - {len(css_content)} chars")
-    
-    return state
+
+    attempts += 1
+    try:
+        progress_tracker.update_step(session_id, details=f"Gọi AI tạo {label}...")
+        response = llm_gateway.generate_content(
+            state["client"], state["model"], contents, simple_config,
+            session_id=session_id, label=f"tạo {label}", max_attempts=COMPONENT_MAX_ATTEMPTS, stream=True
+        )
+    except Exception as e:
+        return {attempt_key: attempts, error_key: f"Không thể tạo {label}: {str(e)}"}
+
+    if not response or not hasattr(response, 'text') or not response.text:
+        return {attempt_key: attempts, error_key: f"Không nhận được nội dung {label} từ AI"}
+
+    content = extract(response.text) or fallback
+    progress_tracker.update_step(session_id, details=f"✓ Tạo {label} hoàn thành - {len(content)} chars")
+    return {f"{kind}_content": content, attempt_key: attempts, error_key: None}
+
+
+def create_javascript_node(state: ReportState) -> dict:
+    """Node để tạo JavaScript từ HTML đã tạo (chạy song song với create_css_node)"""
+    return _generate_from_html(state, "js", 'prompt_create_javascript.md', 6, "JavaScript",
+                               _extract_javascript, DEFAULT_JS_CONTENT)
+
+
+def create_css_node(state: ReportState) -> dict:
+    """Node để tạo CSS từ HTML đã tạo (chạy song song với create_javascript_node)"""
+    return _generate_from_html(state, "css", 'prompt_create_css.md', 7, "CSS",
+                               _extract_css, DEFAULT_CSS_CONTENT)
+
+
+def join_interface_node(state: ReportState) -> dict:
+    """Điểm hội tụ sau khi cả nhánh JS và CSS xong: gộp lỗi và quyết định success"""
+    errors = [state.get(key) for key in ("js_error", "css_error") if state.get(key)]
+    if errors:
+        for error_msg in errors:
+            progress_tracker.error_progress(state["session_id"], error_msg)
+        return {"error_messages": state["error_messages"] + errors, "success": False}
+    return {"success": True}
 
 
 def _extract_html(response_text):
@@ -1,10 +1,10 @@
 """
 Node để soạn nội dung báo cáo markdown từ nội dung nghiên cứu
 """
-import time
 from google.genai import types
 from .base import ReportState, read_prompt_file
 from ...services.progress_tracker import progress_tracker
+from ...services import llm_gateway
 
 
 def generate_report_content_node(state: ReportState) -> ReportState:
@@ -51,27 +51,19 @@ def generate_report_content_node(state: ReportState) -> ReportState:
         max_output_tokens=10000,
     )
 
-    # Retry cho bước soạn báo cáo
-    for attempt in range(3):
-        try:
-            progress_tracker.update_step(session_id, details=f"Gọi AI soạn báo cáo (lần {attempt+1}/3)...")
-            response = state["client"].models.generate_content(
-                model=state["model"],
-                contents=contents,
-                config=config
-            )
-            break
-        except Exception as err:
-            if attempt < 2:
-                wait_time = (attempt + 1) * 20
-                progress_tracker.update_step(session_id, details=f"Lỗi soạn báo cáo, chờ {wait_time}s...")
-                time.sleep(wait_time)
-            else:
-                error_msg = f"Không thể soạn báo cáo sau 3 lần thử: {err}"
-                state["error_messages"].append(error_msg)
-                state["success"] = False
-                progress_tracker.error_progress(session_id, error_msg)
-                return state
+    # Gateway tự retry lỗi tạm thời với backoff theo loại lỗi
+    try:
+        progress_tracker.update_step(session_id, details="Gọi AI soạn báo cáo...")
+        response = llm_gateway.generate_content(
+            state["client"], state["model"], contents, config,
+            session_id=session_id, label="soạn báo cáo", stream=True
+        )
+    except Exception as err:
+        error_msg = f"Không thể soạn báo cáo: {err}"
+        state["error_messages"].append(error_msg)
+        state["success"] = False
+        progress_tracker.error_progress(session_id, error_msg)
+        return state
 
     # Kiểm tra response
     if not response or not hasattr(response, 'text') or not response.text:
@@ -1,11 +1,22 @@
 """
 Node thực hiện nghiên cứu sâu + validation
 """
-import time
 import json
 from google.genai import types
-from .base import ReportState, check_report_validation
+from .base import ReportState, VALIDATION_VERDICT_PATTERN, check_report_validation
 from ...services.progress_tracker import progress_tracker
+from ...services import llm_gateway
+
+
+def _validation_failed(text):
+    """
+    Điều kiện dừng stream: kết luận cuối cùng (cùng quy tắc với check_report_validation)
+    là FAIL và model đã viết xong dòng kết luận đó.
+    """
+    verdicts = list(VALIDATION_VERDICT_PATTERN.finditer(text))
+    if not verdicts or verdicts[-1].group(1).upper() != "FAIL":
+        return False
+    return "\n" in text[verdicts[-1].end():]
 
 
 def research_deep_node(state: ReportState) -> ReportState:
@@ -60,24 +71,17 @@ def research_deep_node(state: ReportState) -> ReportState:
             ),
         ]
         
-        # Retry cho combined API call
-        for api_attempt in range(3):
-            try:
-                progress_tracker.update_step(session_id, details=f"Gọi Combined AI API (lần {api_attempt + 1}/3)...")
-                response = state["client"].models.generate_content(
-                    model=state["model"],
-                    contents=contents,
-                    config=generate_content_config
-                )
-                break
-            except Exception as api_error:
-                if api_attempt < 2:
-                    wait_time = (api_attempt + 1) * 45  # Longer wait for complex combined calls
-                    # Log error và chờ retry
-                    progress_tracker.update_step(session_id, details=f"Lỗi Combined API, chờ {wait_time}s... ({api_error})")
-                    time.sleep(wait_time)
-                else:
-                    raise api_error
+        # Gateway tự retry lỗi tạm thời (backoff theo loại lỗi); lỗi cuối cùng raise ra except bên dưới.
+        # Stream để progress cập nhật trong lúc chờ và dừng ngay khi thấy kết quả kiểm tra FAIL.
+        # Không cache: kết quả Google Search thay đổi theo thời gian, mỗi lần chạy phải research lại
+        progress_tracker.update_step(session_id, details="Gọi Combined AI API...")
+        response = llm_gateway.generate_content(
+            state["client"], state["model"], contents, generate_content_config,
+            use_cache=False, session_id=session_id, label="Combined AI API",
+            stream=True, stop_when=_validation_failed
+        )
+        if getattr(response, "stopped_early", False):
+            progress_tracker.update_step(session_id, details="✗ Phát hiện KẾT QUẢ KIỂM TRA: FAIL, dừng stream sớm")
         
         # Kiểm tra response
         if not response or not hasattr(response, 'text'):
@@ -1,8 +1,9 @@
 """
 Conditional routing functions cho workflow
 """
-from typing import Literal
+from typing import List, Literal, Union
 from .base import ReportState
+from ..workflow_checkpoints import COMPONENTS_ENTRY
 
 
 def should_retry_or_continue(state: ReportState) -> Literal["retry", "continue", "end"]:
@@ -82,3 +83,27 @@ def should_retry_css_or_continue(state: ReportState) -> Literal["retry_css", "co
     
     # Còn lần thử CSS, retry
     return "retry_css"
+
+
+def route_after_html(state: ReportState) -> Union[Literal["retry_html", "end"], List[str]]:
+    """Sau create_html: retry/kết thúc, hoặc fan-out JS và CSS chạy song song"""
+    decision = should_retry_html_or_continue(state)
+    if decision == "continue":
+        return ["create_javascript", "create_css"]
+    return decision
+
+
+def should_continue_after_interface(state: ReportState) -> Literal["continue", "end"]:
+    """Quyết định hướng đi tiếp theo sau khi gộp nhánh JS/CSS"""
+    return "continue" if state["success"] else "end"
+
+
+def route_after_prepare(state: ReportState) -> Union[str, List[str]]:
+    """
+    Sau prepare_data: chạy mới thì sang research_deep; resume thì nhảy tới state["resume_from"]
+    (fan-out lại JS/CSS nếu dừng ở giữa hai nhánh, nhánh đã xong sẽ tự bỏ qua).
+    """
+    resume_from = state.get("resume_from")
+    if resume_from == COMPONENTS_ENTRY:
+        return ["create_javascript", "create_css"]
+    return resume_from or "research_deep"
@@ -17,6 +17,7 @@ from .base import ReportState
 from ...services.progress_tracker import progress_tracker
 from ...extensions import db
 from ...models import CryptoReport as Report
+from ...utils.enhanced_cache import invalidate_tags
 
 
 def _save_to_database_with_retry(state: ReportState, session_id: str, max_retries: int = 3) -> ReportState:
@@ -48,6 +49,12 @@ def _save_to_database_with_retry(state: ReportState, session_id: str, max_retrie
             state["report_id"] = new_report.id
             state["success"] = True
             
+            # Trang chủ và các trang suy ra từ danh sách báo cáo không còn đúng
+            try:
+                invalidate_tags("reports", f"report:{new_report.id}")
+            except Exception as cache_error:
+                print(f"⚠️ Cache invalidation failed: {cache_error}")
+            
             progress_tracker.complete_progress(session_id, True, new_report.id)
             print(f"✅ Lưu database thành công sau {attempt + 1} lần thử - Report ID: {new_report.id}")
             return state
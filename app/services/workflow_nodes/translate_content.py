@@ -1,10 +1,10 @@
 # app/services/workflow_nodes/translate_content.py
 
-import time
 from typing import Dict, Any
 from google.genai import types
 from .base import ReportState, read_prompt_file
 from ...services.progress_tracker import progress_tracker
+from ...services import llm_gateway
 
 
 def translate_content_node(state: ReportState) -> Dict[str, Any]:
@@ -121,40 +121,27 @@ def _translate_with_ai(client, model, content: str, content_type: str, session_i
         candidate_count=1,
     )
     
-    # Retry logic giống như các node khác
-    for attempt in range(3):
-        try:
-            progress_tracker.update_step(session_id, details=f"Gọi AI dịch {content_type} (lần {attempt + 1}/3)...")
-            response = client.models.generate_content(
-                model=model,
-                contents=contents,
-                config=config
-            )
-            
-            if response and hasattr(response, 'text') and response.text:
-                # Làm sạch response text
-                translated_content = response.text.strip()
-                
-                # Loại bỏ markdown code blocks nếu có
-                if translated_content.startswith('```'):
-                    lines = translated_content.split('\n')
-                    if len(lines) > 2:
-                        # Bỏ dòng đầu và cuối (markdown markers)
-                        translated_content = '\n'.join(lines[1:-1])
-                
-                return translated_content
-            else:
-                print(f"WARNING: AI không trả về nội dung cho {content_type}")
-                return None
-                
-        except Exception as e:
-            if attempt < 2:
-                wait_time = (attempt + 1) * 10
-                progress_tracker.update_step(session_id, details=f"Lỗi dịch {content_type}, chờ {wait_time}s...")
-                print(f"WARNING: Lỗi dịch {content_type} (lần {attempt + 1}), thử lại sau {wait_time}s: {e}")
-                time.sleep(wait_time)
-            else:
-                print(f"ERROR: Không thể dịch {content_type} sau 3 lần thử: {e}")
-                return None
-    
-    return None
+    # Gateway tự retry lỗi tạm thời với backoff theo loại lỗi
+    try:
+        progress_tracker.update_step(session_id, details=f"Gọi AI dịch {content_type}...")
+        response = llm_gateway.generate_content(client, model, contents, config,
+                                                session_id=session_id, label=f"dịch {content_type}", stream=True)
+    except Exception as e:
+        print(f"ERROR: Không thể dịch {content_type}: {e}")
+        return None
+
+    if not response or not hasattr(response, 'text') or not response.text:
+        print(f"WARNING: AI không trả về nội dung cho {content_type}")
+        return None
+
+    # Làm sạch response text
+    translated_content = response.text.strip()
+
+    # Loại bỏ markdown code blocks nếu có
+    if translated_content.startswith('```'):
+        lines = translated_content.split('\n')
+        if len(lines) > 2:
+            # Bỏ dòng đầu và cuối (markdown markers)
+            translated_content = '\n'.join(lines[1:-1])
+
+    return translated_content
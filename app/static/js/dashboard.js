@@ -185,76 +185,7 @@ async function fetchDashboardSummary() {
             throw new Error('Server trả về dữ liệu không hợp lệ');
         }
 
-        // Cập nhật Vốn hóa thị trường
-        const marketCapContainer = selectDashboardElementByLang('market-cap-container');
-        if (marketCapContainer) {
-            marketCapContainer.innerHTML = `
-                <p class="text-3xl font-bold text-gray-900">${'$' + formatNumber(data.market_cap)}</p>
-                <p class="text-sm text-gray-500">${getTranslatedText('whole-market')}</p>`;
-            // cache numeric value so we can re-render visuals without re-fetch
-            try { marketCapContainer.dataset.marketCap = String(data.market_cap); } catch(e){}
-        }
-
-        // Cập nhật Khối lượng giao dịch
-        const volumeContainer = selectDashboardElementByLang('volume-24h-container');
-        if (volumeContainer) {
-            volumeContainer.innerHTML = `
-                <p class="text-3xl font-bold text-gray-900">${'$' + formatNumber(data.volume_24h)}</p>
-                <p class="text-sm text-gray-500">${getTranslatedText('whole-market')}</p>`;
-            try { volumeContainer.dataset.volume24h = String(data.volume_24h); } catch(e){}
-        }
-
-        // Cập nhật giá BTC
-        const btcContainer = selectDashboardElementByLang('btc-price-container');
-        if (btcContainer) {
-            const change = data.btc_change_24h;
-            const changeClass = change >= 0 ? 'text-green-600' : 'text-red-600';
-            btcContainer.innerHTML = `
-                <p class="text-3xl font-bold text-gray-900">${'$' + (data.btc_price_usd ? data.btc_price_usd.toLocaleString('en-US') : 'N/A')}</p>
-                <p class="text-sm font-semibold ${changeClass}">${change !== null ? change.toFixed(2) : 'N/A'}% (24h)</p>`;
-            try { btcContainer.dataset.btcPriceUsd = String(data.btc_price_usd); btcContainer.dataset.btcChange24h = String(data.btc_change_24h); } catch(e){}
-        }
-
-        // Cập nhật chỉ số Sợ hãi & Tham lam
-        const fngContainer = selectDashboardElementByLang('fear-greed-container');
-        const fngValue = parseInt(data.fng_value, 10);
-        if (!isNaN(fngValue)) {
-            const fngConfig = {
-                min: 0, max: 100,
-                segments: [
-                    { limit: 24, color: 'var(--fng-extreme-fear-color)', label: getTranslatedText('extreme-fear') },
-                    { limit: 49, color: 'var(--fng-fear-color)', label: getTranslatedText('fear') },
-                    { limit: 54, color: 'var(--fng-neutral-color)', label: getTranslatedText('neutral') },
-                    { limit: 74, color: 'var(--fng-greed-color)', label: getTranslatedText('greed') },
-                    { limit: 100, color: 'var(--fng-extreme-greed-color)', label: getTranslatedText('extreme-greed') }
-                ]
-            };
-            createGauge(fngContainer, fngValue, fngConfig);
-            try { fngContainer.dataset.value = String(fngValue); } catch(e){}
-        } else {
-            displayError('fear-greed-container', 'Giá trị F&G không hợp lệ.');
-        }
-
-        // Cập nhật chỉ số RSI
-        const rsiContainer = selectDashboardElementByLang('rsi-container');
-        const rsiValue = data.rsi_14;
-        if (rsiValue !== null && rsiValue !== undefined) {
-            const rsiConfig = {
-                min: 0, max: 100,
-                segments: [
-                    { limit: 30, color: 'var(--rsi-oversold-color)', label: getTranslatedText('oversold') },
-                    { limit: 70, color: 'var(--rsi-neutral-color)', label: getTranslatedText('neutral') },
-                    { limit: 100, color: 'var(--rsi-overbought-color)', label: getTranslatedText('overbought') }
-                ]
-            };
-            createGauge(rsiContainer, rsiValue, rsiConfig);
-            try { rsiContainer.dataset.value = String(rsiValue); } catch(e){}
-        } else {
-             displayError('rsi-container', 'Không nhận được giá trị RSI.');
-        }
-
-        // Cache the last successful summary so we can re-render visuals on language change without re-fetching
-        try { window.dashboardSummaryCache = data; } catch(e) {}
+        renderDashboardSummary(data);
 
     } catch (error) {
         console.error('Lỗi fetchDashboardSummary:', error);
@@ -268,6 +199,130 @@ async function fetchDashboardSummary() {
     }
 }
 
+/**
+ * Render các thẻ dashboard từ dữ liệu tổng hợp (từ API hoặc từ WebSocket).
+ * @param {object} data - Payload giống /api/crypto/dashboard-summary.
+ */
+function renderDashboardSummary(data) {
+    // Cập nhật Vốn hóa thị trường
+    const marketCapContainer = selectDashboardElementByLang('market-cap-container');
+    if (marketCapContainer) {
+        marketCapContainer.innerHTML = `
+            <p class="text-3xl font-bold text-gray-900">${'$' + formatNumber(data.market_cap)}</p>
+            <p class="text-sm text-gray-500">${getTranslatedText('whole-market')}</p>`;
+        // cache numeric value so we can re-render visuals without re-fetch
+        try { marketCapContainer.dataset.marketCap = String(data.market_cap); } catch(e){}
+    }
+
+    // Cập nhật Khối lượng giao dịch
+    const volumeContainer = selectDashboardElementByLang('volume-24h-container');
+    if (volumeContainer) {
+        volumeContainer.innerHTML = `
+            <p class="text-3xl font-bold text-gray-900">${'$' + formatNumber(data.volume_24h)}</p>
+            <p class="text-sm text-gray-500">${getTranslatedText('whole-market')}</p>`;
+        try { volumeContainer.dataset.volume24h = String(data.volume_24h); } catch(e){}
+    }
+
+    // Cập nhật giá BTC
+    const btcContainer = selectDashboardElementByLang('btc-price-container');
+    if (btcContainer) {
+        const change = data.btc_change_24h;
+        const changeClass = change >= 0 ? 'text-green-600' : 'text-red-600';
+        btcContainer.innerHTML = `
+            <p class="text-3xl font-bold text-gray-900">${'$' + (data.btc_price_usd ? data.btc_price_usd.toLocaleString('en-US') : 'N/A')}</p>
+            <p class="text-sm font-semibold ${changeClass}">${change !== null ? change.toFixed(2) : 'N/A'}% (24h)</p>`;
+        try { btcContainer.dataset.btcPriceUsd = String(data.btc_price_usd); btcContainer.dataset.btcChange24h = String(data.btc_change_24h); } catch(e){}
+    }
+
+    // Cập nhật chỉ số Sợ hãi & Tham lam
+    const fngContainer = selectDashboardElementByLang('fear-greed-container');
+    const fngValue = parseInt(data.fng_value, 10);
+    if (!isNaN(fngValue)) {
+        const fngConfig = {
+            min: 0, max: 100,
+            segments: [
+                { limit: 24, color: 'var(--fng-extreme-fear-color)', label: getTranslatedText('extreme-fear') },
+                { limit: 49, color: 'var(--fng-fear-color)', label: getTranslatedText('fear') },
+                { limit: 54, color: 'var(--fng-neutral-color)', label: getTranslatedText('neutral') },
+                { limit: 74, color: 'var(--fng-greed-color)', label: getTranslatedText('greed') },
+                { limit: 100, color: 'var(--fng-extreme-greed-color)', label: getTranslatedText('extreme-greed') }
+            ]
+        };
+        createGauge(fngContainer, fngValue, fngConfig);
+        try { fngContainer.dataset.value = String(fngValue); } catch(e){}
+    } else {
+        displayError('fear-greed-container', 'Giá trị F&G không hợp lệ.');
+    }
+
+    // Cập nhật chỉ số RSI
+    const rsiContainer = selectDashboardElementByLang('rsi-container');
+    const rsiValue = data.rsi_14;
+    if (rsiValue !== null && rsiValue !== undefined) {
+        const rsiConfig = {
+            min: 0, max: 100,
+            segments: [
+                { limit: 30, color: 'var(--rsi-oversold-color)', label: getTranslatedText('oversold') },
+                { limit: 70, color: 'var(--rsi-neutral-color)', label: getTranslatedText('neutral') },
+                { limit: 100, color: 'var(--rsi-overbought-color)', label: getTranslatedText('overbought') }
+            ]
+        };
+        createGauge(rsiContainer, rsiValue, rsiConfig);
+        try { rsiContainer.dataset.value = String(rsiValue); } catch(e){}
+    } else {
+         displayError('rsi-container', 'Không nhận được giá trị RSI.');
+    }
+
+    // Cache the last successful summary so we can re-render visuals on language change without re-fetching
+    try { window.dashboardSummaryCache = data; } catch(e) {}
+}
+
+/**
+ * Nhận cập nhật thị trường qua WebSocket channel `market` thay cho polling định kỳ.
+ * Server chỉ gửi các field đã thay đổi nên được merge vào summary đang hiển thị.
+ * Nếu WebSocket không khả dụng thì quay lại polling mỗi 10 phút.
+ */
+async function subscribeMarketUpdates() {
+    let pollingTimer = null;
+    const startPolling = () => {
+        if (!pollingTimer) {
+            pollingTimer = setInterval(fetchDashboardSummary, 600000);
+        }
+    };
+
+    try {
+        const { wsClient } = await import('/static/js/modules/websocket-client.js');
+
+        wsClient.onMessage('market_update', (message) => {
+            const changes = message && message.data;
+            if (!changes) return;
+            renderDashboardSummary({ ...(window.dashboardSummaryCache || {}), ...changes });
+        });
+
+        let wasDisconnected = false;
+        wsClient.onConnectionChange((state) => {
+            if (state === 'connected') {
+                if (pollingTimer) {
+                    clearInterval(pollingTimer);
+                    pollingTimer = null;
+                }
+                // Có thể đã bỏ lỡ frame khi mất kết nối: lấy lại toàn bộ summary một lần
+                if (wasDisconnected) fetchDashboardSummary();
+                wasDisconnected = false;
+            } else if (state === 'disconnected' || state === 'error') {
+                wasDisconnected = true;
+            } else if (state === 'max_reconnect_attempts') {
+                startPolling();
+            }
+        });
+
+        wsClient.subscribe('market');
+        await wsClient.connect();
+    } catch (error) {
+        console.error('Không thể kết nối WebSocket, quay lại polling:', error);
+        startPolling();
+    }
+}
+
 /**
  * Hiển thị dữ liệu mặc định khi API không khả dụng
  */
@@ -513,8 +568,8 @@ function initDashboard() {
         // Gọi hàm tổng hợp một lần khi tải trang
         fetchDashboardSummary();
         
-        // Đặt lịch gọi lại hàm tổng hợp sau mỗi 10 phút
-        setInterval(fetchDashboardSummary, 600000);
+        // Sau đó nhận thay đổi qua WebSocket (fallback polling 10 phút nếu không kết nối được)
+        subscribeMarketUpdates();
         
         // Lắng nghe sự kiện thay đổi ngôn ngữ — chỉ cập nhật UI (nav & visuals), không re-fetch dữ liệu
         window.addEventListener('languageChanged', (e) => {
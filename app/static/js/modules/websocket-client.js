@@ -135,6 +135,10 @@ export class WebSocketClient {
         this.socket.on('report_completed', (data) => {
             this.handleMessage('report_completed', data);
         });
+        
+        this.socket.on('market_update', (data) => {
+            this.handleMessage('market_update', data);
+        });
     }
     
     /**
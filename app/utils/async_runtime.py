@@ -0,0 +1,118 @@
+"""
+Event loop asyncio dùng chung cho cả process, chạy trong một daemon thread.
+
+Code Flask đồng bộ có thể submit coroutine vào loop này (run_sync / submit)
+thay vì tạo ThreadPoolExecutor mới cho mỗi lần fan-out tới upstream.
+Khi process thoát, các callback on_shutdown (vd. đóng httpx AsyncClient) chạy trên
+loop trước khi loop dừng.
+"""
+import os
+import atexit
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Kết quả mặc định khi một upstream call bị timeout (cùng format với services)
+TIMEOUT_RESULT = (None, "Timeout", 408)
+
+
+class AsyncRuntime:
+    """Quản lý một event loop chạy nền, tạo lại sau khi process bị fork"""
+
+    def __init__(self):
+        self._loop = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._shutdown_callbacks = []
+
+    @property
+    def loop(self):
+        if self._loop is None or self._pid != os.getpid() or not self._thread.is_alive():
+            with self._lock:
+                if self._loop is None or self._pid != os.getpid() or not self._thread.is_alive():
+                    self._start()
+        return self._loop
+
+    def _start(self):
+        loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(loop)
+            loop.call_soon(ready.set)
+            loop.run_forever()
+            loop.close()
+
+        self._thread = threading.Thread(target=run, name="async-runtime", daemon=True)
+        self._thread.start()
+        ready.wait()
+        self._loop = loop
+        self._pid = os.getpid()
+        logger.info(f"Async runtime loop started (pid {self._pid})")
+
+    def submit(self, coro):
+        """Submit coroutine vào loop chung; trả về concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run_sync(self, coro, timeout=None):
+        """Chạy coroutine từ code đồng bộ và chờ kết quả"""
+        return self.submit(coro).result(timeout=timeout)
+
+    def on_shutdown(self, callback):
+        """Đăng ký coroutine function chạy trên loop ngay trước khi loop dừng"""
+        self._shutdown_callbacks.append(callback)
+
+    async def _run_shutdown_callbacks(self):
+        for callback in self._shutdown_callbacks:
+            try:
+                await callback()
+            except Exception as e:
+                logger.warning(f"Async runtime shutdown callback failed: {e}")
+
+    def stop(self, timeout=5):
+        """Chạy các callback on_shutdown rồi dừng loop (không làm gì nếu loop chưa chạy)"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            if loop is None or self._pid != os.getpid() or not thread.is_alive():
+                return
+            self._loop = None
+        try:
+            asyncio.run_coroutine_threadsafe(self._run_shutdown_callbacks(), loop).result(timeout=timeout)
+        except Exception as e:
+            logger.warning(f"Async runtime shutdown did not finish: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+
+
+async def _with_timeout(coro, timeout, default):
+    try:
+        return await asyncio.wait_for(coro, timeout=timeout)
+    except asyncio.TimeoutError:
+        return default
+
+
+async def gather_with_timeouts(coros, timeout, default=TIMEOUT_RESULT):
+    """
+    Chạy song song các coroutine trong dict {name: coro}, mỗi coroutine có
+    timeout riêng. Coroutine bị timeout nhận giá trị default thay vì làm hỏng
+    cả nhóm.
+
+    Returns:
+        dict: {name: result}
+    """
+    names = list(coros)
+    results = await asyncio.gather(
+        *(_with_timeout(coros[name], timeout, default) for name in names)
+    )
+    return dict(zip(names, results))
+
+
+async_runtime = AsyncRuntime()
+atexit.register(async_runtime.stop)
+
+
+def run_sync(coro, timeout=None):
+    return async_runtime.run_sync(coro, timeout)
@@ -0,0 +1,149 @@
+"""
+Codec cho giá trị cache lưu trên Redis: serialize nhị phân + nén tùy chọn.
+
+Mỗi payload bắt đầu bằng 1 byte header 0b1100CCSS (CC: compression, SS: serializer)
+để reader biết cách decode. Byte 0xC0-0xCF không thể là byte đầu của JSON text nên
+giá trị cũ (JSON thuần, chưa có header) vẫn đọc được.
+
+msgpack (ormsgpack), orjson và zstandard là tùy chọn; thiếu thì dùng json/zlib.
+"""
+import json
+import os
+import threading
+import zlib
+
+try:
+    import ormsgpack
+except ImportError:
+    ormsgpack = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SERIALIZER_JSON = 1
+SERIALIZER_ORJSON = 2
+SERIALIZER_MSGPACK = 3
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_ZSTD = 2
+
+_HEADER_BASE = 0xC0
+
+# Payload nhỏ hơn ngưỡng này không được nén (overhead lớn hơn lợi ích)
+COMPRESS_THRESHOLD = int(os.getenv('CACHE_COMPRESS_THRESHOLD', 1024))
+
+
+class CodecError(ValueError):
+    """Payload không decode được"""
+
+
+def _default_serializer():
+    if ormsgpack is not None:
+        return SERIALIZER_MSGPACK
+    if orjson is not None:
+        return SERIALIZER_ORJSON
+    return SERIALIZER_JSON
+
+
+def _default_compression():
+    return COMPRESSION_ZSTD if zstandard is not None else COMPRESSION_ZLIB
+
+
+def _serialize(value, serializer):
+    if serializer == SERIALIZER_MSGPACK:
+        return ormsgpack.packb(value, option=ormsgpack.OPT_NON_STR_KEYS)
+    if serializer == SERIALIZER_ORJSON:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+
+def _deserialize(body, serializer):
+    if serializer == SERIALIZER_MSGPACK:
+        if ormsgpack is None:
+            raise CodecError("Payload msgpack nhưng ormsgpack chưa được cài")
+        return ormsgpack.unpackb(body)
+    if serializer == SERIALIZER_ORJSON:
+        return orjson.loads(body) if orjson is not None else json.loads(body)
+    return json.loads(body)
+
+
+# Compressor/decompressor của zstandard không thread-safe: mỗi thread một bộ
+_zstd_local = threading.local()
+
+
+def _zstd():
+    if not hasattr(_zstd_local, "compressor"):
+        _zstd_local.compressor = zstandard.ZstdCompressor(level=3)
+        _zstd_local.decompressor = zstandard.ZstdDecompressor()
+    return _zstd_local
+
+
+def _compress(body, compression):
+    if compression == COMPRESSION_ZSTD:
+        return _zstd().compressor.compress(body)
+    if compression == COMPRESSION_ZLIB:
+        return zlib.compress(body, 6)
+    return body
+
+
+def _decompress(body, compression):
+    if compression == COMPRESSION_ZSTD:
+        if zstandard is None:
+            raise CodecError("Payload zstd nhưng zstandard chưa được cài")
+        return _zstd().decompressor.decompress(body)
+    if compression == COMPRESSION_ZLIB:
+        return zlib.decompress(body)
+    return body
+
+
+class CacheCodec:
+    """Encode/decode giá trị cache thành bytes có header"""
+
+    def __init__(self, serializer=None, compression=None, compress_threshold=COMPRESS_THRESHOLD):
+        self.serializer = serializer or _default_serializer()
+        self.compression = _default_compression() if compression is None else compression
+        self.compress_threshold = compress_threshold
+
+    def encode(self, value):
+        serializer = self.serializer
+        try:
+            body = _serialize(value, serializer)
+        except TypeError:
+            # Kiểu dữ liệu serializer nhị phân không hỗ trợ: thử lại bằng json chuẩn
+            serializer = SERIALIZER_JSON
+            body = _serialize(value, serializer)
+
+        compression = COMPRESSION_NONE
+        if self.compression != COMPRESSION_NONE and len(body) >= self.compress_threshold:
+            compressed = _compress(body, self.compression)
+            if len(compressed) < len(body):
+                body, compression = compressed, self.compression
+
+        return bytes([_HEADER_BASE | (compression << 2) | serializer]) + body
+
+    def decode(self, payload):
+        if payload is None:
+            return None
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        if not payload:
+            raise CodecError("Payload rỗng")
+
+        header = payload[0]
+        if header & 0xF0 != _HEADER_BASE:
+            # Giá trị cũ lưu dạng JSON text
+            return json.loads(payload)
+        compression = (header >> 2) & 0x03
+        serializer = header & 0x03
+        return _deserialize(_decompress(payload[1:], compression), serializer)
+
+
+default_codec = CacheCodec()
@@ -6,6 +6,7 @@ import psycopg2
 from sqlalchemy.exc import OperationalError
 from ..extensions import db
 from ..models import CryptoReport as Report
+from .enhanced_cache import invalidate_tags
 
 
 class DatabaseHealthChecker:
@@ -180,6 +181,8 @@ class DatabaseHealthChecker:
             db.session.add(test_report)
             db.session.commit()
             test_report_id = test_report.id
+            # Báo cáo test là báo cáo mới nhất nên trang index đang cache phải được làm mới
+            invalidate_tags("reports", f"report:{test_report_id}")
             result['operations']['create'] = {
                 'success': True,
                 'time': time.time() - create_start,
@@ -214,6 +217,7 @@ class DatabaseHealthChecker:
             delete_start = time.time()
             db.session.delete(found_report)
             db.session.commit()
+            invalidate_tags("reports", f"report:{test_report_id}")
             result['operations']['delete'] = {
                 'success': True,
                 'time': time.time() - delete_start
@@ -231,6 +235,7 @@ class DatabaseHealthChecker:
                     if cleanup_report:
                         db.session.delete(cleanup_report)
                         db.session.commit()
+                    invalidate_tags("reports", f"report:{test_report_id}")
                 except:
                     pass
             
@@ -2,21 +2,46 @@
 Enhanced Cache System với Redis và fallback strategies
 """
 from flask_caching import Cache
+import bisect
+import hashlib
 import json
+import math
 import os
+import queue
+import random
+import re
 import redis
 import pickle
+import threading
+import time
+import uuid
 from datetime import datetime, timedelta
 from functools import wraps
 import logging
 
+from .memory_cache import BoundedMemoryCache, DEFAULT_MAX_ENTRIES, DEFAULT_MAX_BYTES, estimate_size
+from .cache_codec import default_codec
+
 logger = logging.getLogger(__name__)
 
-# Khởi tạo cache objects
+# Flask-Caching object dùng chung cho cả app (app.utils.cache re-export object này)
 cache = Cache()
-_memory_cache = {}
+# Memory tier có giới hạn số entry và dung lượng, tự evict (LRU) và dọn entry hết hạn
+_memory_cache = BoundedMemoryCache(
+    max_entries=int(os.getenv('MEMORY_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)),
+    max_bytes=int(os.getenv('MEMORY_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)),
+)
 _redis_client = None
 
+# Reverse index tag -> set(cache_key) cho memory tier; trên Redis dùng set "tag:<tag>"
+_tag_index = {}
+_tag_lock = threading.Lock()
+TAG_KEY_PREFIX = "tag:"
+INVALIDATION_CHANNEL = "cache:invalidate"
+# Tag có nhiều key hơn ngưỡng này thì bỏ các key đã bị evict/hết hạn khỏi reverse index
+TAG_INDEX_PRUNE_SIZE = 4096
+_invalidation_listener_pid = None
+
 class CacheStrategy:
     """Enum cho cache strategies"""
     REDIS_ONLY = "redis_only"
@@ -33,7 +58,8 @@ def init_redis():
         try:
             _redis_client = redis.from_url(
                 redis_url,
-                decode_responses=True,
+                # Giá trị cache là bytes nhị phân (xem cache_codec), không decode sang str
+                decode_responses=False,
                 socket_timeout=5,
                 socket_connect_timeout=5,
                 retry_on_timeout=True,
@@ -53,23 +79,146 @@ def is_redis_available():
     """Kiểm tra Redis có sẵn không"""
     return _redis_client is not None
 
+
+def init_cache(app):
+    """Gắn Flask-Caching vào app và kết nối Redis tier nếu có REDIS_URL"""
+    cache.init_app(app)
+    init_redis()
+
+class _WriteBehindQueue:
+    """
+    Ghi xuống tier chậm (Redis/file) ở background thread để request không phải chờ.
+    Queue đầy thì ghi trực tiếp; thread được tạo lazy theo pid (an toàn khi fork).
+    """
+    
+    def __init__(self, maxsize=10000):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._pid = None
+        self._lock = threading.Lock()
+    
+    def _ensure_worker(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # Process con sau fork: queue của process cha không còn worker
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name="cache-write-behind", daemon=True).start()
+    
+    def _run(self):
+        while True:
+            func, args = self._queue.get()
+            try:
+                func(*args)
+            except Exception as e:
+                logger.warning(f"Write-behind cache write failed: {e}")
+                cache_stats.error()
+            finally:
+                self._queue.task_done()
+    
+    def submit(self, func, *args):
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((func, args))
+        except queue.Full:
+            func(*args)
+    
+    def pending(self):
+        return self._queue.unfinished_tasks
+    
+    def flush(self, timeout=2.0):
+        """Chờ các lần ghi đang chờ hoàn tất (trước khi xóa/invalidate key)"""
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.005)
+        return self._queue.unfinished_tasks == 0
+
+
+_write_behind = _WriteBehindQueue()
+BACKUP_CACHE_DIR = "instance/backup_cache"
+
+
 class EnhancedCache:
-    """Enhanced cache với multiple strategies và automatic failover"""
+    """
+    Cache nhiều tầng với thứ tự đọc thống nhất memory → Redis → file.
     
-    def __init__(self, strategy=CacheStrategy.HYBRID):
+    - Đọc: trả về từ tầng nhanh nhất có dữ liệu và đưa ngược lên memory (read-through).
+    - Ghi: memory ghi đồng bộ, Redis/file ghi ở background (write-behind).
+    - Strategy quyết định các tầng tham gia:
+        MEMORY_ONLY: memory; REDIS_ONLY: Redis; HYBRID: memory + Redis;
+        FILE_BACKUP: memory + Redis, hoặc memory + file khi không có Redis.
+    """
+    
+    def __init__(self, strategy=CacheStrategy.HYBRID, codec=None, write_behind=True):
         self.strategy = strategy
-        self.backup_dir = "instance/backup_cache"
-        self._ensure_backup_dir()
+        self.codec = codec or default_codec
+        self.write_behind = write_behind
+        self.backup_dir = BACKUP_CACHE_DIR
     
-    def _ensure_backup_dir(self):
-        """Tạo backup directory nếu cần"""
-        if not os.path.exists(self.backup_dir):
-            try:
-                os.makedirs(self.backup_dir, exist_ok=True)
-            except OSError:
-                logger.warning("Cannot create backup cache directory")
+    def _uses_memory(self):
+        return self.strategy != CacheStrategy.REDIS_ONLY
+    
+    def _uses_redis(self):
+        return is_redis_available() and self.strategy != CacheStrategy.MEMORY_ONLY
+    
+    def _uses_file(self):
+        return self.strategy == CacheStrategy.FILE_BACKUP and not is_redis_available()
+    
+    def _file_path(self, cache_key):
+        safe_name = re.sub(r'[^\w.-]', '_', cache_key.replace(":", "__", 1))
+        return os.path.join(self.backup_dir, f"{safe_name}.json")
+    
+    # --- Các thao tác trên từng tầng chậm ---
+    
+    def _redis_set(self, cache_key, payload, timeout, tags):
+        pipe = _redis_client.pipeline()
+        pipe.setex(cache_key, timeout, payload)
+        for tag in tags:
+            pipe.sadd(f"{TAG_KEY_PREFIX}{tag}", cache_key)
+            # Tag set sống ít nhất bằng key lâu nhất trong nó
+            pipe.expire(f"{TAG_KEY_PREFIX}{tag}", timeout, gt=True)
+            pipe.expire(f"{TAG_KEY_PREFIX}{tag}", timeout, nx=True)
+        pipe.execute()
+        logger.debug(f"Redis cache set: {cache_key}")
+    
+    def _file_set(self, cache_key, data, timeout):
+        os.makedirs(self.backup_dir, exist_ok=True)
+        cache_data = {
+            "data": data,
+            "timestamp": datetime.now().isoformat(),
+            "expires_at": (datetime.now() + timedelta(seconds=timeout)).isoformat()
+        }
+        cache_file = self._file_path(cache_key)
+        tmp_file = f"{cache_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(cache_data, f, ensure_ascii=False)
+        os.replace(tmp_file, cache_file)
+        logger.debug(f"File cache set: {cache_key}")
     
-    def set(self, key, data, timeout=3600, namespace="default"):
+    def _file_get(self, cache_key):
+        """Returns (data, remaining_seconds) hoặc (None, 0)"""
+        cache_file = self._file_path(cache_key)
+        if not os.path.exists(cache_file):
+            return None, 0
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cache_data = json.load(f)
+        remaining = (datetime.fromisoformat(cache_data["expires_at"]) - datetime.now()).total_seconds()
+        if remaining <= 0:
+            return None, 0
+        return cache_data["data"], remaining
+    
+    def _file_delete(self, cache_key):
+        try:
+            cache_file = self._file_path(cache_key)
+            if os.path.exists(cache_file):
+                os.remove(cache_file)
+        except OSError as e:
+            logger.warning(f"File cache delete failed: {e}")
+    
+    def set(self, key, data, timeout=3600, namespace="default", tags=None):
         """
         Set cache với multiple strategies
         Args:
@@ -77,103 +226,164 @@ class EnhancedCache:
             data: dữ liệu cần cache
             timeout: thời gian expire (giây)
             namespace: namespace để tránh conflict keys
+            tags: danh sách tag để invalidate hàng loạt (vd. ["reports", "report:42"])
         """
         cache_key = f"{namespace}:{key}"
+        # Mọi key đều thuộc tag của namespace để có thể xóa cả namespace
+        all_tags = [f"ns:{namespace}", *(tags or [])]
+        cache_stats.set_operation()
         
-        success_count = 0
-        
-        # Redis cache (primary)
-        if is_redis_available() and self.strategy != CacheStrategy.MEMORY_ONLY:
+        in_memory = False
+        if self._uses_memory():
             try:
-                serialized = json.dumps(data, ensure_ascii=False)
-                _redis_client.setex(cache_key, timeout, serialized)
-                success_count += 1
-                logger.debug(f"Redis cache set: {cache_key}")
+                size = estimate_size(data)
+                started = time.perf_counter()
+                in_memory = _memory_cache.set(cache_key, data, timeout, size=size)
+                if in_memory:
+                    cache_stats.set_operation("memory", namespace, time.perf_counter() - started, size)
+                else:
+                    logger.debug(f"Memory cache skipped (too large): {cache_key}")
             except Exception as e:
-                logger.warning(f"Redis cache set failed: {e}")
+                logger.warning(f"Memory cache set failed: {e}")
+                cache_stats.error()
         
-        # Memory cache (secondary)
-        if self.strategy in [CacheStrategy.MEMORY_ONLY, CacheStrategy.HYBRID]:
+        with _tag_lock:
+            for tag in all_tags:
+                keys = _tag_index.setdefault(tag, set())
+                keys.add(cache_key)
+                if len(keys) > TAG_INDEX_PRUNE_SIZE:
+                    keys.intersection_update([k for k in keys if k in _memory_cache])
+        
+        slow_writes = []
+        if self._uses_redis():
+            _ensure_invalidation_listener()
             try:
-                expire_time = datetime.now() + timedelta(seconds=timeout)
-                _memory_cache[cache_key] = {
-                    "data": data,
-                    "expires_at": expire_time
-                }
-                success_count += 1
-                logger.debug(f"Memory cache set: {cache_key}")
+                payload = self.codec.encode(data)
+                slow_writes.append((self._timed_write, ("redis", namespace, len(payload), self._redis_set,
+                                                        cache_key, payload, timeout, all_tags)))
             except Exception as e:
-                logger.warning(f"Memory cache set failed: {e}")
+                logger.warning(f"Redis cache encode failed: {e}")
+                cache_stats.error()
+        if self._uses_file():
+            slow_writes.append((self._timed_write, ("file", namespace, None, self._file_set,
+                                                    cache_key, data, timeout)))
         
-        # File backup (tertiary)
-        if self.strategy == CacheStrategy.FILE_BACKUP:
+        # Chỉ ghi nền khi memory đã giữ bản sao, nếu không lần đọc ngay sau sẽ miss
+        background = self.write_behind and in_memory
+        success = in_memory
+        for func, args in slow_writes:
+            if background:
+                _write_behind.submit(func, *args)
+                continue
             try:
-                cache_data = {
-                    "data": data,
-                    "expires_at": (datetime.now() + timedelta(seconds=timeout)).isoformat()
-                }
-                cache_file = os.path.join(self.backup_dir, f"{key}.json")
-                with open(cache_file, 'w', encoding='utf-8') as f:
-                    json.dump(cache_data, f, ensure_ascii=False, indent=2)
-                success_count += 1
-                logger.debug(f"File cache set: {cache_key}")
+                func(*args)
+                success = True
             except Exception as e:
-                logger.warning(f"File cache set failed: {e}")
-        
-        return success_count > 0
+                logger.warning(f"Cache write failed for {cache_key}: {e}")
+                cache_stats.error()
+        return success
+    
+    def _timed_write(self, tier, namespace, size, func, *args):
+        started = time.perf_counter()
+        func(*args)
+        cache_stats.set_operation(tier, namespace, time.perf_counter() - started, size)
     
     def get(self, key, namespace="default"):
         """
-        Get cache với automatic fallback
+        Get cache theo thứ tự memory → Redis → file, đưa dữ liệu tìm thấy lên memory
         """
         cache_key = f"{namespace}:{key}"
         
-        # Try Redis first (fastest for production)
-        if is_redis_available() and self.strategy != CacheStrategy.MEMORY_ONLY:
+        if self._uses_memory():
+            started = time.perf_counter()
+            data = _memory_cache.get(cache_key)
+            if data is not None:
+                cache_stats.hit("memory", namespace, time.perf_counter() - started)
+                logger.debug(f"Memory cache hit: {cache_key}")
+                return data
+            cache_stats.tier_miss("memory", namespace, time.perf_counter() - started)
+        
+        if self._uses_redis():
+            started = time.perf_counter()
             try:
-                cached = _redis_client.get(cache_key)
+                pipe = _redis_client.pipeline()
+                pipe.get(cache_key)
+                pipe.ttl(cache_key)
+                cached, ttl = pipe.execute()
                 if cached:
-                    data = json.loads(cached)
+                    data = self.codec.decode(cached)
+                    if self._uses_memory() and ttl and ttl > 0:
+                        _memory_cache.set(cache_key, data, ttl)
+                    cache_stats.hit("redis", namespace, time.perf_counter() - started)
                     logger.debug(f"Redis cache hit: {cache_key}")
                     return data
+                cache_stats.tier_miss("redis", namespace, time.perf_counter() - started)
             except Exception as e:
                 logger.warning(f"Redis cache get failed: {e}")
+                cache_stats.error()
         
-        # Try memory cache
-        if self.strategy in [CacheStrategy.MEMORY_ONLY, CacheStrategy.HYBRID]:
+        if self._uses_file():
+            started = time.perf_counter()
             try:
-                if cache_key in _memory_cache:
-                    cache_data = _memory_cache[cache_key]
-                    if datetime.now() <= cache_data["expires_at"]:
-                        logger.debug(f"Memory cache hit: {cache_key}")
-                        return cache_data["data"]
-                    else:
-                        # Expired, remove
-                        del _memory_cache[cache_key]
-            except Exception as e:
-                logger.warning(f"Memory cache get failed: {e}")
-        
-        # Try file backup
-        if self.strategy == CacheStrategy.FILE_BACKUP:
-            try:
-                cache_file = os.path.join(self.backup_dir, f"{key}.json")
-                if os.path.exists(cache_file):
-                    with open(cache_file, 'r', encoding='utf-8') as f:
-                        cache_data = json.load(f)
-                    
-                    expires_at = datetime.fromisoformat(cache_data["expires_at"])
-                    if datetime.now() <= expires_at:
-                        logger.debug(f"File cache hit: {cache_key}")
-                        return cache_data["data"]
+                data, remaining = self._file_get(cache_key)
+                if data is not None:
+                    if self._uses_memory():
+                        _memory_cache.set(cache_key, data, remaining)
+                    cache_stats.hit("file", namespace, time.perf_counter() - started)
+                    logger.debug(f"File cache hit: {cache_key}")
+                    return data
+                cache_stats.tier_miss("file", namespace, time.perf_counter() - started)
             except Exception as e:
                 logger.warning(f"File cache get failed: {e}")
+                cache_stats.error()
         
+        cache_stats.miss(namespace)
         logger.debug(f"Cache miss: {cache_key}")
         return None
     
+    def invalidate_tags(self, *tags):
+        """
+        Xóa mọi key gắn với các tag trên tất cả cache layers, O(số key trong tag).
+        Returns: số key đã invalidate
+        """
+        # Lần ghi nền còn chờ có thể ghi lại key sau khi đã xóa
+        _write_behind.flush()
+        cache_keys = set()
+        with _tag_lock:
+            for tag in tags:
+                cache_keys |= _tag_index.pop(tag, set())
+        
+        if is_redis_available():
+            try:
+                pipe = _redis_client.pipeline()
+                for tag in tags:
+                    pipe.smembers(f"{TAG_KEY_PREFIX}{tag}")
+                    pipe.delete(f"{TAG_KEY_PREFIX}{tag}")
+                results = pipe.execute()
+                for members in results[0::2]:
+                    cache_keys |= {m.decode() if isinstance(m, bytes) else m for m in members}
+                if cache_keys:
+                    _redis_client.delete(*cache_keys)
+                    # Báo các worker khác xóa bản sao trong memory tier của họ
+                    _redis_client.publish(INVALIDATION_CHANNEL, json.dumps(sorted(cache_keys)))
+            except Exception as e:
+                logger.warning(f"Redis tag invalidation failed: {e}")
+        
+        for cache_key in cache_keys:
+            _memory_cache.delete(cache_key)
+            self._file_delete(cache_key)
+        
+        logger.info(f"Invalidated {len(cache_keys)} cache keys for tags {list(tags)}")
+        return len(cache_keys)
+    
+    def invalidate_namespace(self, namespace):
+        """Xóa toàn bộ key của một namespace"""
+        return self.invalidate_tags(f"ns:{namespace}")
+    
     def delete(self, key, namespace="default"):
         """Delete từ tất cả cache layers"""
         cache_key = f"{namespace}:{key}"
+        _write_behind.flush()
         
         # Redis
         if is_redis_available():
@@ -184,121 +394,460 @@ class EnhancedCache:
         
         # Memory
         try:
-            if cache_key in _memory_cache:
-                del _memory_cache[cache_key]
+            _memory_cache.delete(cache_key)
         except Exception as e:
             logger.warning(f"Memory cache delete failed: {e}")
         
         # File
+        self._file_delete(cache_key)
+    
+    def flush(self, timeout=2.0):
+        """Chờ các lần ghi write-behind hoàn tất"""
+        return _write_behind.flush(timeout)
+    
+    def clear_expired(self):
+        """Cleanup expired entries từ memory cache (pop từ expiry heap, không quét toàn bộ)"""
+        removed = _memory_cache.purge_expired()
+        logger.info(f"Cleared {removed} expired cache entries")
+        return removed
+
+    def memory_stats(self):
+        """Số entry, dung lượng ước lượng và số lần evict của memory tier"""
+        return _memory_cache.stats()
+
+def _ensure_invalidation_listener():
+    """Subscribe kênh invalidation (một thread mỗi process) để đồng bộ memory tier giữa các worker"""
+    global _invalidation_listener_pid
+    if _invalidation_listener_pid == os.getpid():
+        return
+    with _tag_lock:
+        if _invalidation_listener_pid == os.getpid():
+            return
+        _invalidation_listener_pid = os.getpid()
+    
+    def listen():
+        global _invalidation_listener_pid
         try:
-            cache_file = os.path.join(self.backup_dir, f"{key}.json")
-            if os.path.exists(cache_file):
-                os.remove(cache_file)
+            pubsub = _redis_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            for message in pubsub.listen():
+                try:
+                    for cache_key in json.loads(message["data"]):
+                        _memory_cache.delete(cache_key)
+                except Exception as e:
+                    logger.warning(f"Invalid cache invalidation message: {e}")
         except Exception as e:
-            logger.warning(f"File cache delete failed: {e}")
+            logger.warning(f"Cache invalidation listener stopped: {e}")
+            _invalidation_listener_pid = None
     
-    def clear_expired(self):
-        """Cleanup expired entries từ memory cache"""
-        now = datetime.now()
-        expired_keys = []
-        
-        for key, data in _memory_cache.items():
-            try:
-                if now > data["expires_at"]:
-                    expired_keys.append(key)
-            except Exception:
-                expired_keys.append(key)
-        
-        for key in expired_keys:
-            try:
-                del _memory_cache[key]
-            except Exception:
-                pass
-        
-        logger.info(f"Cleared {len(expired_keys)} expired cache entries")
+    threading.Thread(target=listen, name="cache-invalidation", daemon=True).start()
+
+
+def invalidate_tags(*tags):
+    """Invalidate mọi key gắn với các tag (dùng khi dữ liệu gốc thay đổi, vd. có báo cáo mới)"""
+    return EnhancedCache(CacheStrategy.HYBRID).invalidate_tags(*tags)
+
 
 # Smart caching decorator
-def smart_cache(timeout=300, key_prefix="", strategy=CacheStrategy.HYBRID):
+class _Flight:
+    """Một lần tính đang chạy cho một cache key; các caller khác chờ kết quả của leader"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def _join_flight(cache_key):
+    """Returns (flight, is_leader)"""
+    with _flights_lock:
+        flight = _flights.get(cache_key)
+        if flight is not None:
+            return flight, False
+        flight = _Flight()
+        _flights[cache_key] = flight
+        return flight, True
+
+
+def _finish_flight(cache_key, flight, result=None, error=None):
+    flight.result, flight.error = result, error
+    with _flights_lock:
+        _flights.pop(cache_key, None)
+    flight.done.set()
+
+
+def _acquire_distributed_lock(cache_key, lock_timeout):
+    """SET NX trên Redis để chỉ một process tính lại key. Returns token hoặc None"""
+    if not is_redis_available():
+        return "local"
+    token = uuid.uuid4().hex
+    try:
+        if _redis_client.set(f"lock:{cache_key}", token, nx=True, px=int(lock_timeout * 1000)):
+            return token
+        return None
+    except Exception as e:
+        logger.warning(f"Redis lock failed for {cache_key}: {e}")
+        return "local"
+
+
+def _release_distributed_lock(cache_key, token):
+    if token in (None, "local") or not is_redis_available():
+        return
+    try:
+        # Chỉ xóa lock nếu vẫn là của mình (có thể đã hết hạn và process khác giữ)
+        _redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, f"lock:{cache_key}", token)
+    except Exception as e:
+        logger.warning(f"Redis unlock failed for {cache_key}: {e}")
+
+
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def _should_recompute_early(envelope, beta, now=None):
     """
-    Decorator for intelligent caching với automatic fallback
+    XFetch: tính lại sớm với xác suất tăng dần khi gần hết hạn,
+    tỉ lệ với thời gian tính (delta) để key tốn kém được làm mới sớm hơn.
+    """
+    now = time.time() if now is None else now
+    delta = envelope.get("delta", 0)
+    if beta <= 0 or delta <= 0:
+        return False
+    return now - delta * beta * math.log(max(random.random(), 1e-12)) >= envelope["expires_at"]
+
+
+def smart_cache(timeout=300, key_prefix="", strategy=CacheStrategy.HYBRID, beta=1.0, lock_timeout=30):
+    """
+    Decorator for intelligent caching với automatic fallback.
+
+    - Nhiều caller cùng miss một key chỉ chạy hàm một lần (leader), các caller khác nhận
+      kết quả của leader: trong process qua Event, giữa các process qua Redis SET NX.
+    - Trước khi hết hạn, key được tính lại sớm theo XFetch (beta > 1 làm mới sớm hơn,
+      beta = 0 tắt), trong lúc đó các caller khác vẫn nhận giá trị hiện tại.
     """
+    enhanced_cache = EnhancedCache(strategy)
+
     def decorator(func):
+        func_key = f"{func.__module__}.{func.__name__}"
+
+        def compute_and_store(cache_key, args, kwargs):
+            started = time.time()
+            result = func(*args, **kwargs)
+            delta = time.time() - started
+            enhanced_cache.set(cache_key, {
+                "value": result,
+                "delta": delta,
+                "expires_at": time.time() + timeout,
+            }, timeout, namespace="smart_cache")
+            return result
+
+        def lead(cache_key, flight, args, kwargs):
+            token = _acquire_distributed_lock(cache_key, lock_timeout)
+            try:
+                if token is None:
+                    # Process khác đang tính: chờ giá trị của nó xuất hiện trong cache
+                    deadline = time.time() + lock_timeout
+                    while time.time() < deadline:
+                        envelope = enhanced_cache.get(cache_key, namespace="smart_cache")
+                        if envelope is not None:
+                            _finish_flight(cache_key, flight, result=envelope["value"])
+                            return envelope["value"]
+                        time.sleep(0.05)
+                result = compute_and_store(cache_key, args, kwargs)
+                _finish_flight(cache_key, flight, result=result)
+                return result
+            except BaseException as e:
+                _finish_flight(cache_key, flight, error=e)
+                raise
+            finally:
+                _release_distributed_lock(cache_key, token)
+
         @wraps(func)
         def wrapper(*args, **kwargs):
             # Generate cache key
-            import hashlib
-            func_key = f"{func.__module__}.{func.__name__}"
             args_key = str(args) + str(sorted(kwargs.items()))
             cache_key = hashlib.md5(f"{key_prefix}{func_key}{args_key}".encode()).hexdigest()
-            
+
             # Try cache first
-            enhanced_cache = EnhancedCache(strategy)
-            cached_result = enhanced_cache.get(cache_key, namespace="smart_cache")
-            
-            if cached_result is not None:
-                return cached_result
-            
-            # Execute function
-            result = func(*args, **kwargs)
-            
-            # Cache result
-            enhanced_cache.set(cache_key, result, timeout, namespace="smart_cache")
-            
-            return result
+            envelope = enhanced_cache.get(cache_key, namespace="smart_cache")
+            if envelope is not None:
+                if not _should_recompute_early(envelope, beta):
+                    return envelope["value"]
+                # Làm mới sớm: chỉ một caller tính lại, caller khác dùng giá trị hiện tại
+                flight, is_leader = _join_flight(cache_key)
+                if not is_leader:
+                    return envelope["value"]
+                token = _acquire_distributed_lock(cache_key, lock_timeout)
+                if token is None:
+                    _finish_flight(cache_key, flight, result=envelope["value"])
+                    return envelope["value"]
+                try:
+                    result = compute_and_store(cache_key, args, kwargs)
+                    _finish_flight(cache_key, flight, result=result)
+                    return result
+                except Exception as e:
+                    logger.warning(f"Early recompute failed for {func_key}, serving cached value: {e}")
+                    _finish_flight(cache_key, flight, result=envelope["value"])
+                    return envelope["value"]
+                finally:
+                    _release_distributed_lock(cache_key, token)
+
+            flight, is_leader = _join_flight(cache_key)
+            if is_leader:
+                return lead(cache_key, flight, args, kwargs)
+
+            if flight.done.wait(lock_timeout):
+                if flight.error is not None:
+                    raise flight.error
+                return flight.result
+            # Leader quá lâu: tự tính thay vì treo request
+            return func(*args, **kwargs)
         return wrapper
     return decorator
 
-# Backup cache functions (backward compatibility)
+# Backup cache cho API bị rate limit: memory → Redis, hoặc file khi chạy local không có Redis
+_backup_cache = EnhancedCache(CacheStrategy.FILE_BACKUP)
+
 def set_backup_cache(key, data, max_age_hours=24):
-    """Backward compatible function"""
-    enhanced_cache = EnhancedCache(CacheStrategy.HYBRID)
-    return enhanced_cache.set(key, data, timeout=max_age_hours * 3600, namespace="backup")
+    """Lưu dữ liệu vào backup cache với thời gian hết hạn."""
+    return _backup_cache.set(key, data, timeout=int(max_age_hours * 3600), namespace="backup")
 
 def get_backup_cache(key):
-    """Backward compatible function"""
-    enhanced_cache = EnhancedCache(CacheStrategy.HYBRID)
-    return enhanced_cache.get(key, namespace="backup")
+    """Lấy dữ liệu từ backup cache nếu còn hạn."""
+    return _backup_cache.get(key, namespace="backup")
 
 # Performance monitoring
-class CacheStats:
-    """Cache performance monitoring"""
+# Bucket (giây) cho histogram latency get/set theo kiểu Prometheus
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class LatencyHistogram:
+    """Histogram latency với bucket cố định (không cumulative khi lưu, cộng dồn khi xuất)"""
+    
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+    
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+    
+    def cumulative(self):
+        """[(le, count_cumulative)] gồm cả +Inf"""
+        result, running = [], 0
+        for le, count in zip([*self.buckets, float("inf")], self.counts):
+            running += count
+            result.append((le, running))
+        return result
+    
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "avg_ms": round(self.total / self.count * 1000, 3) if self.count else None,
+            "buckets": {("+Inf" if le == float("inf") else str(le)): n for le, n in self.cumulative()},
+        }
+
+
+class _TierMetrics:
+    __slots__ = ("hits", "misses", "sets", "evictions", "bytes_written", "get_latency", "set_latency")
     
     def __init__(self):
         self.hits = 0
         self.misses = 0
         self.sets = 0
-        self.errors = 0
+        self.evictions = 0
+        self.bytes_written = 0
+        self.get_latency = LatencyHistogram()
+        self.set_latency = LatencyHistogram()
+
+
+class CacheStats:
+    """
+    Cache performance monitoring (thread-safe, dùng chung cho mọi EnhancedCache).
+    Tổng hits/misses cho toàn cache, chi tiết theo (namespace, tier): hits, misses,
+    sets, evictions, bytes ghi và histogram latency get/set.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def _tier(self, namespace, tier):
+        key = (namespace or "default", tier)
+        metrics = self._series.get(key)
+        if metrics is None:
+            metrics = self._series[key] = _TierMetrics()
+        return metrics
+    
+    def hit(self, tier=None, namespace=None, latency=None):
+        with self._lock:
+            self.hits += 1
+            if tier:
+                self.tier_hits[tier] = self.tier_hits.get(tier, 0) + 1
+                metrics = self._tier(namespace, tier)
+                metrics.hits += 1
+                if latency is not None:
+                    metrics.get_latency.observe(latency)
     
-    def hit(self):
-        self.hits += 1
+    def tier_miss(self, tier, namespace=None, latency=None):
+        """Tier không có key (request tiếp tục xuống tier chậm hơn)"""
+        with self._lock:
+            metrics = self._tier(namespace, tier)
+            metrics.misses += 1
+            if latency is not None:
+                metrics.get_latency.observe(latency)
     
-    def miss(self):
-        self.misses += 1
+    def miss(self, namespace=None):
+        with self._lock:
+            self.misses += 1
+            if namespace:
+                self.namespace_misses[namespace] = self.namespace_misses.get(namespace, 0) + 1
     
-    def set_operation(self):
-        self.sets += 1
+    def set_operation(self, tier=None, namespace=None, latency=None, size=None):
+        with self._lock:
+            if tier is None:
+                self.sets += 1
+                return
+            metrics = self._tier(namespace, tier)
+            metrics.sets += 1
+            if size:
+                metrics.bytes_written += size
+            if latency is not None:
+                metrics.set_latency.observe(latency)
+    
+    def eviction(self, namespace=None, tier="memory"):
+        with self._lock:
+            self._tier(namespace, tier).evictions += 1
     
     def error(self):
-        self.errors += 1
+        with self._lock:
+            self.errors += 1
     
     def get_stats(self):
-        total = self.hits + self.misses
-        hit_rate = (self.hits / total * 100) if total > 0 else 0
+        with self._lock:
+            total = self.hits + self.misses
+            hit_rate = (self.hits / total * 100) if total > 0 else 0
+            
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "sets": self.sets,
+                "errors": self.errors,
+                "hit_rate": round(hit_rate, 2),
+                "total_requests": total,
+                "tier_hits": dict(self.tier_hits)
+            }
+    
+    def get_detailed_stats(self):
+        """Tổng quan + chi tiết {namespace: {tier: metrics}}"""
+        stats = self.get_stats()
+        namespaces = {}
+        with self._lock:
+            for (namespace, tier), m in sorted(self._series.items()):
+                namespaces.setdefault(namespace, {"misses": self.namespace_misses.get(namespace, 0)})[tier] = {
+                    "hits": m.hits,
+                    "misses": m.misses,
+                    "sets": m.sets,
+                    "evictions": m.evictions,
+                    "bytes_written": m.bytes_written,
+                    "get_latency": m.get_latency.snapshot(),
+                    "set_latency": m.set_latency.snapshot(),
+                }
+        stats["namespaces"] = namespaces
+        return stats
+    
+    def to_prometheus(self, gauges=None):
+        """Xuất metrics theo Prometheus text exposition format"""
+        lines = []
         
-        return {
-            "hits": self.hits,
-            "misses": self.misses,
-            "sets": self.sets,
-            "errors": self.errors,
-            "hit_rate": round(hit_rate, 2),
-            "total_requests": total
-        }
+        def label(namespace, tier, **extra):
+            pairs = {"namespace": namespace, "tier": tier, **extra}
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs.items()) + "}"
+        
+        with self._lock:
+            series = sorted(self._series.items())
+            counters = [
+                ("cache_hits_total", "Cache hits theo namespace và tier", "hits"),
+                ("cache_misses_total", "Tier không có key", "misses"),
+                ("cache_sets_total", "Số lần ghi", "sets"),
+                ("cache_evictions_total", "Số entry bị evict", "evictions"),
+                ("cache_bytes_written_total", "Tổng bytes đã ghi", "bytes_written"),
+            ]
+            for name, help_text, attr in counters:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                for (namespace, tier), m in series:
+                    lines.append(f"{name}{label(namespace, tier)} {getattr(m, attr)}")
+            
+            for name, attr in (("cache_get_latency_seconds", "get_latency"), ("cache_set_latency_seconds", "set_latency")):
+                lines.append(f"# HELP {name} Latency {attr.split('_')[0]} theo namespace và tier")
+                lines.append(f"# TYPE {name} histogram")
+                for (namespace, tier), m in series:
+                    histogram = getattr(m, attr)
+                    for le, count in histogram.cumulative():
+                        le_text = "+Inf" if le == float("inf") else repr(le)
+                        lines.append(f"{name}_bucket{label(namespace, tier, le=le_text)} {count}")
+                    lines.append(f"{name}_sum{label(namespace, tier)} {histogram.total:.6f}")
+                    lines.append(f"{name}_count{label(namespace, tier)} {histogram.count}")
+            
+            lines.append("# TYPE cache_requests_missed_total counter")
+            for namespace, count in sorted(self.namespace_misses.items()):
+                lines.append(f'cache_requests_missed_total{{namespace="{namespace}"}} {count}')
+            lines.append("# TYPE cache_errors_total counter")
+            lines.append(f"cache_errors_total {self.errors}")
+        
+        for name, value in (gauges or {}).items():
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
     
     def reset(self):
-        self.hits = 0
-        self.misses = 0
-        self.sets = 0
-        self.errors = 0
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.sets = 0
+            self.errors = 0
+            self.tier_hits = {}
+            self.namespace_misses = {}
+            self._series = {}
 
 # Global stats instance
 cache_stats = CacheStats()
+
+
+def _on_memory_evict(cache_key):
+    cache_stats.eviction(cache_key.partition(":")[0], "memory")
+
+
+_memory_cache.on_evict = _on_memory_evict
+
+
+def cache_metrics():
+    """Metrics của toàn bộ cache: tổng quan, theo namespace/tier và trạng thái memory tier"""
+    stats = cache_stats.get_detailed_stats()
+    stats["memory_tier"] = _memory_cache.stats()
+    stats["write_behind_pending"] = _write_behind.pending()
+    stats["redis_available"] = is_redis_available()
+    return stats
+
+
+def cache_metrics_prometheus():
+    memory = _memory_cache.stats()
+    return cache_stats.to_prometheus(gauges={
+        "cache_memory_entries": memory["entries"],
+        "cache_memory_bytes": memory["bytes"],
+        "cache_memory_max_bytes": memory["max_bytes"],
+        "cache_write_behind_pending": _write_behind.pending(),
+    })
@@ -0,0 +1,163 @@
+"""
+Memory cache tier có giới hạn: LRU theo số entry và dung lượng ước lượng (bytes),
+hết hạn theo min-heap để việc dọn entry cũ là O(log n) thay vì quét toàn bộ.
+"""
+import heapq
+import itertools
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def estimate_size(value, _depth=0):
+    """Ước lượng dung lượng bộ nhớ của một giá trị JSON-like (dict/list/str/số)"""
+    size = sys.getsizeof(value)
+    if _depth >= 8:
+        return size
+    if isinstance(value, dict):
+        for k, v in value.items():
+            size += estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for item in value:
+            size += estimate_size(item, _depth + 1)
+    return size
+
+
+class _Entry:
+    __slots__ = ("value", "expires_at", "size", "token")
+
+    def __init__(self, value, expires_at, size, token):
+        self.value = value
+        self.expires_at = expires_at
+        self.size = size
+        self.token = token
+
+
+class BoundedMemoryCache:
+    """
+    Cache trong process, thread-safe.
+
+    - Giới hạn bởi max_entries và max_bytes; vượt giới hạn thì evict entry ít dùng gần đây nhất.
+    - Mỗi lần set đẩy (expires_at, token, key) vào heap; entry bị ghi đè/xóa được bỏ qua
+      khi pop nhờ token, nên không cần xóa khỏi heap ngay.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES, on_evict=None):
+        self.max_entries = max_entries
+        # callback(key) khi một entry bị evict do vượt giới hạn
+        self.on_evict = on_evict
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._expiry_heap = []
+        self._tokens = itertools.count()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, key):
+        # Không cập nhật thứ tự LRU
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry.expires_at > time.monotonic()
+
+    @property
+    def current_bytes(self):
+        return self._bytes
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if entry.expires_at <= now:
+                self._remove(key)
+                self.expirations += 1
+                return default
+            self._entries.move_to_end(key)
+            return entry.value
+
+    def set(self, key, value, ttl, size=None):
+        """Lưu value trong ttl giây. Trả về False nếu value lớn hơn cả giới hạn bytes"""
+        size = estimate_size(value) if size is None else size
+        if size > self.max_bytes:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            token = next(self._tokens)
+            entry = _Entry(value, now + ttl, size, token)
+            self._entries[key] = entry
+            self._bytes += size
+            heapq.heappush(self._expiry_heap, (entry.expires_at, token, key))
+
+            self._purge_expired(now)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+                if self.on_evict is not None:
+                    self.on_evict(oldest_key)
+            self._compact_heap()
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            return self._remove(key) is not None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._expiry_heap.clear()
+            self._bytes = 0
+
+    def purge_expired(self):
+        """Xóa toàn bộ entry đã hết hạn, trả về số entry đã xóa"""
+        with self._lock:
+            return self._purge_expired(time.monotonic())
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+        return entry
+
+    def _purge_expired(self, now):
+        removed = 0
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            _, token, key = heapq.heappop(heap)
+            entry = self._entries.get(key)
+            if entry is not None and entry.token == token:
+                self._remove(key)
+                removed += 1
+        self.expirations += removed
+        return removed
+
+    def _compact_heap(self):
+        # Heap giữ cả token cũ của key bị ghi đè/evict: dựng lại khi quá lớn so với số entry
+        if len(self._expiry_heap) > 2 * len(self._entries) + 64:
+            self._expiry_heap = [(e.expires_at, e.token, k) for k, e in self._entries.items()]
+            heapq.heapify(self._expiry_heap)
+
@@ -1,14 +1,18 @@
 """
 Advanced API Rate Limiting với Circuit Breaker và Adaptive Backoff
 """
+import asyncio
 import time
 import logging
+from collections import deque
 from enum import Enum
 from datetime import datetime, timedelta
 from dataclasses import dataclass
 from typing import Optional, Callable, Any
 import threading
 
+from .token_bucket import get_token_bucket
+
 logger = logging.getLogger(__name__)
 
 class CircuitState(Enum):
@@ -30,16 +34,25 @@ class RateLimitConfig:
 
 class AdaptiveRateLimiter:
     """
-    Advanced rate limiter với adaptive backoff và circuit breaker
+    Advanced rate limiter với adaptive backoff và circuit breaker.
+
+    Quota (burst_limit token, hồi requests_per_minute/60 token mỗi giây theo cấu hình)
+    nằm trong token bucket dùng chung (Redis khi có REDIS_URL) nên mọi worker cùng tiêu
+    một quota; circuit breaker và adaptive interval theo từng process, backoff chỉ giãn
+    nhịp gọi của process đó chứ không đổi tốc độ hồi của bucket chung.
     """
     
-    def __init__(self, service_name: str, config: RateLimitConfig):
+    def __init__(self, service_name: str, config: RateLimitConfig, bucket=None):
         self.service_name = service_name
         self.config = config
+        # None: dùng backend mặc định, resolve lazy để import module không kết nối Redis
+        self._bucket = bucket
         
         # Rate limiting state
-        self._requests = []
+        # Sliding log thời điểm request trong 60s gần nhất (cũ nhất ở bên trái)
+        self._requests = deque()
         self._last_request_time = 0
+        self._last_grant_time = 0
         self._current_interval = 60 / config.requests_per_minute
         self._lock = threading.RLock()
         
@@ -51,13 +64,15 @@ class AdaptiveRateLimiter:
         
         # Adaptive scaling
         self._success_count = 0
-        self._recent_response_times = []
+        self._recent_response_times = deque(maxlen=10)
+        self._response_time_sum = 0.0
         
         logger.info(f"Initialized rate limiter for {service_name}")
     
     def can_make_request(self) -> tuple[bool, float]:
         """
-        Kiểm tra có thể make request không
+        Kiểm tra có thể make request không; nếu được thì đã tiêu 1 token,
+        nên chỉ gọi ngay trước khi thực sự gọi API.
         Returns: (can_request, wait_time)
         """
         with self._lock:
@@ -73,24 +88,60 @@ class AdaptiveRateLimiter:
                     self._circuit_state = CircuitState.HALF_OPEN
                     logger.info(f"Circuit breaker {self.service_name}: OPEN -> HALF_OPEN")
             
-            # Check rate limiting
-            time_since_last = current_time - self._last_request_time
-            if time_since_last < self._current_interval:
-                wait_time = self._current_interval - time_since_last
-                return False, wait_time
-            
-            # Clean old requests for burst limiting
-            minute_ago = current_time - 60
-            self._requests = [req_time for req_time in self._requests if req_time > minute_ago]
-            
-            # Check burst limit
-            if len(self._requests) >= self.config.burst_limit:
-                # Calculate wait time to oldest request + 60s
-                oldest_request = min(self._requests)
-                wait_time = (oldest_request + 60) - current_time
-                return False, max(0, wait_time)
+            # Adaptive backoff (sau 429) chỉ giãn nhịp gọi của process này
+            if self._current_interval > 60 / self.config.requests_per_minute:
+                wait_time = self._last_grant_time + self._current_interval - current_time
+                if wait_time > 0:
+                    return False, wait_time
             
-            return True, 0
+            # Lấy token từ bucket dùng chung (tiêu token luôn nếu được phép)
+            bucket = self._bucket or get_token_bucket()
+            can_request, wait_time = bucket.acquire(
+                self.service_name,
+                capacity=self.config.burst_limit,
+                refill_rate=self.config.requests_per_minute / 60
+            )
+            if can_request:
+                self._last_grant_time = current_time
+            return can_request, wait_time
+    
+    @property
+    def circuit_state(self) -> CircuitState:
+        return self._circuit_state
+    
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """
+        Chờ đến khi được phép gọi API, tối đa timeout giây (None: chờ không giới hạn).
+        Ngủ đúng khoảng wait_time limiter trả về thay vì trả 429 cho caller;
+        nếu wait_time vượt quá thời gian còn lại thì trả False ngay, không ngủ vô ích.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            can_request, wait_time = self.can_make_request()
+            if can_request:
+                return True
+            if deadline is not None and time.monotonic() + wait_time > deadline:
+                return False
+            time.sleep(wait_time)
+    
+    async def acquire_async(self, timeout: Optional[float] = None) -> bool:
+        """Biến thể asyncio của acquire (không block event loop)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            # can_make_request có thể là một round-trip Redis (Lua script) nên chạy trong thread
+            can_request, wait_time = await asyncio.to_thread(self.can_make_request)
+            if can_request:
+                return True
+            if deadline is not None and time.monotonic() + wait_time > deadline:
+                return False
+            await asyncio.sleep(wait_time)
+    
+    def _prune_requests(self, current_time: float):
+        # Mỗi timestamp chỉ được append/popleft một lần: O(1) amortized
+        minute_ago = current_time - 60
+        requests = self._requests
+        while requests and requests[0] <= minute_ago:
+            requests.popleft()
     
     def record_request(self, response_time: Optional[float] = None):
         """Record a successful request"""
@@ -98,21 +149,24 @@ class AdaptiveRateLimiter:
             current_time = time.time()
             self._last_request_time = current_time
             self._requests.append(current_time)
+            self._prune_requests(current_time)
             
             # Record success for circuit breaker
             if self._circuit_state == CircuitState.HALF_OPEN:
                 self._circuit_state = CircuitState.CLOSED
-                self._failure_count = 0
                 logger.info(f"Circuit breaker {self.service_name}: HALF_OPEN -> CLOSED")
+            # Circuit chỉ mở khi lỗi liên tiếp, không cộng dồn lỗi lẻ tẻ giữa các lần thành công
+            self._failure_count = 0
             
             self._success_count += 1
             
             # Record response time for adaptive scaling
             if response_time:
+                # Giữ 10 response time gần nhất và tổng chạy của chúng
+                if len(self._recent_response_times) == self._recent_response_times.maxlen:
+                    self._response_time_sum -= self._recent_response_times[0]
                 self._recent_response_times.append(response_time)
-                # Keep only last 10 response times
-                if len(self._recent_response_times) > 10:
-                    self._recent_response_times.pop(0)
+                self._response_time_sum += response_time
             
             # Adaptive scaling - reduce interval if performing well
             if (self.config.adaptive_scaling and 
@@ -150,7 +204,7 @@ class AdaptiveRateLimiter:
         if not self._recent_response_times:
             return
         
-        avg_response_time = sum(self._recent_response_times) / len(self._recent_response_times)
+        avg_response_time = self._response_time_sum / len(self._recent_response_times)
         
         # If response times are good, we can be more aggressive
         if avg_response_time < 1.0:  # Less than 1 second
@@ -170,12 +224,12 @@ class AdaptiveRateLimiter:
             current_time = time.time()
             
             # Count requests in last minute
-            minute_ago = current_time - 60
-            recent_requests = len([req for req in self._requests if req > minute_ago])
+            self._prune_requests(current_time)
+            recent_requests = len(self._requests)
             
             avg_response_time = None
             if self._recent_response_times:
-                avg_response_time = sum(self._recent_response_times) / len(self._recent_response_times)
+                avg_response_time = self._response_time_sum / len(self._recent_response_times)
             
             return {
                 "service_name": self.service_name,
@@ -193,7 +247,8 @@ class APIServiceManager:
     Central manager cho tất cả API services với rate limiting
     """
     
-    def __init__(self):
+    def __init__(self, bucket=None):
+        self._bucket = bucket
         self._limiters = {}
         self._configs = {
             "coingecko": RateLimitConfig(
@@ -211,19 +266,24 @@ class APIServiceManager:
                 requests_per_minute=30,  # Fear & Greed API
                 burst_limit=3,
                 circuit_failure_threshold=3
+            ),
+            "binance": RateLimitConfig(
+                requests_per_minute=120,  # Klines public API, còn xa giới hạn weight của Binance
+                burst_limit=10,
+                circuit_failure_threshold=3
             )
         }
         
         # Initialize limiters
         for service, config in self._configs.items():
-            self._limiters[service] = AdaptiveRateLimiter(service, config)
+            self._limiters[service] = AdaptiveRateLimiter(service, config, self._bucket)
     
     def get_limiter(self, service_name: str) -> AdaptiveRateLimiter:
         """Get rate limiter for specific service"""
         if service_name not in self._limiters:
             # Create default limiter for unknown services
             config = RateLimitConfig()
-            self._limiters[service_name] = AdaptiveRateLimiter(service_name, config)
+            self._limiters[service_name] = AdaptiveRateLimiter(service_name, config, self._bucket)
         
         return self._limiters[service_name]
     
@@ -232,6 +292,14 @@ class APIServiceManager:
         limiter = self.get_limiter(service_name)
         return limiter.can_make_request()
     
+    def acquire(self, service_name: str, timeout: Optional[float] = None) -> bool:
+        """Chờ tối đa timeout giây để được gọi API"""
+        return self.get_limiter(service_name).acquire(timeout)
+    
+    async def acquire_async(self, service_name: str, timeout: Optional[float] = None) -> bool:
+        """Biến thể asyncio của acquire"""
+        return await self.get_limiter(service_name).acquire_async(timeout)
+    
     def record_api_call(self, service_name: str, success: bool, 
                        response_time: Optional[float] = None, 
                        error_code: Optional[int] = None):
@@ -262,11 +330,10 @@ def rate_limited_api_call(service_name: str, timeout: float = 5.0):
         def wrapper(*args, **kwargs):
             limiter = api_service_manager.get_limiter(service_name)
             
-            # Check if we can make request
-            can_request, wait_time = limiter.can_make_request()
-            if not can_request:
-                logger.warning(f"Rate limited {service_name}, wait {wait_time:.2f}s")
-                return None, f"Rate limited, wait {wait_time:.2f}s", 429
+            # Chờ tối đa timeout giây cho tới lượt, quá hạn mới trả 429
+            if not limiter.acquire(timeout):
+                logger.warning(f"Rate limited {service_name}, no slot within {timeout:.2f}s")
+                return None, f"Rate limited, no slot within {timeout:.2f}s", 429
             
             # Make request
             start_time = time.time()
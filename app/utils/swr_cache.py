@@ -0,0 +1,208 @@
+"""
+Stale-while-revalidate cache với single-flight refresh cho dữ liệu upstream
+"""
+import time
+import inspect
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, asdict
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from .async_runtime import async_runtime
+
+logger = logging.getLogger(__name__)
+
+# Kết quả chuẩn của các service: (data, error, status_code)
+ServiceResult = Tuple[Optional[dict], Optional[str], int]
+
+
+@dataclass
+class SourcePolicy:
+    """TTL cho một nguồn dữ liệu"""
+    soft_ttl: float = 60       # Quá soft_ttl: vẫn trả dữ liệu cũ, refresh ở background
+    hard_ttl: float = 600      # Quá hard_ttl: không dùng dữ liệu cũ nữa, phải chờ fetch mới
+    wait_timeout: float = 15   # Thời gian tối đa request chờ fetch khi không có dữ liệu dùng được
+
+
+class _Entry:
+    """Giá trị tốt gần nhất của một nguồn"""
+    __slots__ = ("data", "fetched_at")
+
+    def __init__(self, data, fetched_at):
+        self.data = data
+        self.fetched_at = fetched_at
+
+
+class SWRCache:
+    """
+    Cache stale-while-revalidate cho các nguồn dữ liệu đã đăng ký.
+
+    - Mỗi nguồn chỉ có tối đa một lần fetch upstream đang chạy (single-flight);
+      mọi request đồng thời cùng chờ kết quả của lần fetch đó.
+    - Trong soft_ttl: trả ngay từ cache.
+    - Giữa soft_ttl và hard_ttl: trả ngay dữ liệu cũ và refresh ở background.
+    - Quá hard_ttl hoặc chưa có dữ liệu: chờ lần fetch đang chạy (tối đa wait_timeout).
+
+    Loader có thể là hàm đồng bộ (chạy trên executor dùng chung) hoặc coroutine
+    function (chạy trên event loop dùng chung của process).
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self._loaders: Dict[str, Callable[[], ServiceResult]] = {}
+        self._policies: Dict[str, SourcePolicy] = {}
+        self._entries: Dict[str, _Entry] = {}
+        self._inflight = {}
+        self._last_errors: Dict[str, Tuple[str, int, float]] = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        # Executor dùng chung cho cả process, không tạo mới theo từng request
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="swr-refresh")
+
+    def register(self, name: str, loader: Callable, policy: Optional[SourcePolicy] = None):
+        """Đăng ký một nguồn dữ liệu với loader (sync hoặc async) trả về (data, error, status_code)"""
+        with self._lock:
+            self._loaders[name] = loader
+            self._policies[name] = policy or SourcePolicy()
+
+    def configure(self, name: str, **policy_overrides):
+        """Cập nhật soft/hard TTL của một nguồn đã đăng ký"""
+        with self._lock:
+            current = asdict(self._policies[name])
+            current.update(policy_overrides)
+            self._policies[name] = SourcePolicy(**current)
+
+    def add_listener(self, listener: Callable[[str, dict], None]):
+        """
+        Đăng ký callback(name, data) được gọi mỗi khi một nguồn có giá trị mới từ upstream.
+        Kết quả thành công với status khác 200 (vd. 203 khi loader trả giá trị backup)
+        vẫn được cache nhưng không gọi listener.
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, name: str, data):
+        for listener in self._listeners:
+            try:
+                listener(name, data)
+            except Exception:
+                logger.exception(f"SWR listener failed for {name}")
+
+    def policy(self, name: str) -> SourcePolicy:
+        return self._policies[name]
+
+    def put(self, name: str, data):
+        """Ghi trực tiếp giá trị mới (dùng khi dữ liệu được fetch ở nơi khác)"""
+        with self._lock:
+            self._entries[name] = _Entry(data, time.time())
+            self._last_errors.pop(name, None)
+        self._notify(name, data)
+
+    def peek(self, name: str):
+        """Trả về (data, age_seconds) của giá trị tốt gần nhất, không kích hoạt refresh"""
+        entry = self._entries.get(name)
+        if entry is None:
+            return None, None
+        return entry.data, time.time() - entry.fetched_at
+
+    def refresh(self, name: str):
+        """Kích hoạt refresh cho nguồn; trả về future của lần fetch đang chạy (single-flight)"""
+        with self._lock:
+            future = self._inflight.get(name)
+            if future is None:
+                if inspect.iscoroutinefunction(self._loaders[name]):
+                    future = async_runtime.submit(self._run_async_loader(name))
+                else:
+                    future = self._executor.submit(self._run_loader, name)
+                self._inflight[name] = future
+            return future
+
+    def _run_loader(self, name: str) -> ServiceResult:
+        try:
+            result = self._loaders[name]()
+        except Exception as e:
+            logger.exception(f"SWR loader {name} raised")
+            result = (None, f"Lỗi không xác định: {e}", 500)
+        return self._store_result(name, result)
+
+    async def _run_async_loader(self, name: str) -> ServiceResult:
+        try:
+            result = await self._loaders[name]()
+        except Exception as e:
+            logger.exception(f"SWR async loader {name} raised")
+            result = (None, f"Lỗi không xác định: {e}", 500)
+        return self._store_result(name, result)
+
+    def _store_result(self, name: str, result: ServiceResult) -> ServiceResult:
+        data, error, status_code = result
+        with self._lock:
+            if error is None:
+                self._entries[name] = _Entry(data, time.time())
+                self._last_errors.pop(name, None)
+            else:
+                self._last_errors[name] = (error, status_code, time.time())
+                logger.warning(f"SWR refresh {name} failed ({status_code}): {error}")
+            self._inflight.pop(name, None)
+
+        if error is None and status_code == 200:
+            self._notify(name, data)
+        return data, error, status_code
+
+    def _lookup(self, name: str):
+        """Trả về (result|None, future|None) — result nếu phục vụ được ngay từ cache"""
+        policy = self._policies[name]
+        entry = self._entries.get(name)
+        if entry is not None:
+            age = time.time() - entry.fetched_at
+            if age < policy.soft_ttl:
+                return (entry.data, None, 200), None
+            if age < policy.hard_ttl:
+                self.refresh(name)
+                return (entry.data, None, 200), None
+        return None, self.refresh(name)
+
+    def get(self, name: str) -> ServiceResult:
+        """Lấy dữ liệu của một nguồn theo chính sách stale-while-revalidate"""
+        return self.get_many([name])[name]
+
+    def get_many(self, names: Iterable[str]) -> Dict[str, ServiceResult]:
+        """
+        Lấy nhiều nguồn cùng lúc. Các nguồn cần fetch được chạy song song và
+        chờ chung một deadline (wait_timeout lớn nhất trong các nguồn cần chờ).
+        """
+        results: Dict[str, ServiceResult] = {}
+        pending = {}
+
+        for name in names:
+            result, future = self._lookup(name)
+            if result is not None:
+                results[name] = result
+            else:
+                pending[name] = future
+
+        if pending:
+            deadline = time.time() + max(self._policies[n].wait_timeout for n in pending)
+            for name, future in pending.items():
+                try:
+                    results[name] = future.result(timeout=max(0, deadline - time.time()))
+                except FutureTimeoutError:
+                    # Fetch vẫn tiếp tục ở background, lần sau sẽ có dữ liệu
+                    results[name] = (None, "Timeout", 408)
+
+        return results
+
+    def stats(self) -> dict:
+        """Thông tin trạng thái từng nguồn cho endpoint giám sát"""
+        now = time.time()
+        with self._lock:
+            sources = {}
+            for name, policy in self._policies.items():
+                entry = self._entries.get(name)
+                last_error = self._last_errors.get(name)
+                sources[name] = {
+                    "soft_ttl": policy.soft_ttl,
+                    "hard_ttl": policy.hard_ttl,
+                    "age": round(now - entry.fetched_at, 1) if entry else None,
+                    "refreshing": name in self._inflight,
+                    "last_error": last_error[0] if last_error else None,
+                }
+            return sources
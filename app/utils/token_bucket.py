@@ -0,0 +1,129 @@
+"""
+Token bucket dùng chung cho rate limit các API upstream (TAAPI, CoinGecko...).
+
+Khi có REDIS_URL, trạng thái bucket nằm trong Redis và được cập nhật nguyên tử bằng
+Lua script, nên mọi gunicorn worker/instance cùng tiêu một quota. Không có Redis
+(hoặc Redis lỗi) thì dùng bucket trong process.
+"""
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "ratelimit:"
+
+# KEYS[1]: hash {tokens, ts}; ARGV: capacity, refill_rate (token/giây), requested
+# Dùng TIME của Redis để mọi worker chung một đồng hồ. Trả về {allowed, wait_time}
+# (wait_time dạng string vì Lua number -> Redis integer bị cắt phần thập phân).
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil then
+    tokens = capacity
+    ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local allowed = 0
+local wait = 0
+if tokens >= requested then
+    tokens = tokens - requested
+    allowed = 1
+else
+    wait = (requested - tokens) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return {allowed, tostring(wait)}
+"""
+
+
+class InMemoryTokenBucket:
+    """Token bucket trong process hiện tại (một worker, dùng cho dev/test)"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, name, capacity, refill_rate, tokens=1):
+        """
+        Lấy `tokens` token từ bucket `name`.
+        Returns: (allowed, wait_time) — wait_time là số giây cần chờ nếu chưa đủ token.
+        """
+        now = time.monotonic()
+        with self._lock:
+            available, last = self._buckets.get(name, (capacity, now))
+            available = min(capacity, available + max(0.0, now - last) * refill_rate)
+            if available >= tokens:
+                self._buckets[name] = (available - tokens, now)
+                return True, 0.0
+            self._buckets[name] = (available, now)
+            return False, (tokens - available) / refill_rate
+
+    def reset(self, name):
+        with self._lock:
+            self._buckets.pop(name, None)
+
+
+class RedisTokenBucket:
+    """Token bucket lưu trong Redis, dùng chung cho mọi worker"""
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+        self._script = redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+        # Redis lỗi thì tạm dùng bucket trong process thay vì chặn hoặc thả hết request
+        self._fallback = InMemoryTokenBucket()
+
+    def acquire(self, name, capacity, refill_rate, tokens=1):
+        try:
+            allowed, wait = self._script(keys=[f"{KEY_PREFIX}{name}"],
+                                         args=[capacity, refill_rate, tokens])
+            return bool(int(allowed)), float(wait)
+        except Exception as e:
+            logger.warning(f"[RateLimit] Redis token bucket {name} failed, using local bucket: {e}")
+            return self._fallback.acquire(name, capacity, refill_rate, tokens)
+
+    def reset(self, name):
+        try:
+            self.redis.delete(f"{KEY_PREFIX}{name}")
+        except Exception as e:
+            logger.warning(f"[RateLimit] Redis reset {name} failed: {e}")
+        self._fallback.reset(name)
+
+
+def create_token_bucket(redis_url=None):
+    """Chọn backend theo cấu hình; lỗi kết nối Redis thì fallback về bucket trong process"""
+    if not redis_url:
+        return InMemoryTokenBucket()
+    try:
+        import redis
+        client = redis.Redis.from_url(redis_url, socket_timeout=2, socket_connect_timeout=2)
+        client.ping()
+        return RedisTokenBucket(client)
+    except Exception as e:
+        print(f"WARNING: Redis token bucket unavailable ({e}), using in-process rate limiter")
+        return InMemoryTokenBucket()
+
+
+_default_bucket = None
+_default_bucket_lock = threading.Lock()
+
+
+def get_token_bucket():
+    """Backend mặc định theo REDIS_URL, tạo lazy ở lần dùng đầu tiên"""
+    global _default_bucket
+    if _default_bucket is None:
+        with _default_bucket_lock:
+            if _default_bucket is None:
+                _default_bucket = create_token_bucket(os.getenv('REDIS_URL'))
+    return _default_bucket
@@ -0,0 +1,269 @@
+"""
+Backplane cho WebSocket khi chạy nhiều gunicorn worker.
+
+Việc phát event giữa các worker do message queue của Flask-SocketIO đảm nhiệm
+(Redis pub/sub); module này lưu trạng thái subscription dùng chung để mọi worker
+biết channel nào đang có client, kể cả client kết nối vào worker khác.
+Không có REDIS_URL thì dùng store trong process (một worker, dùng cho test).
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+MEMBERS_PREFIX = "ws:members:"
+WORKERS_KEY = "ws:workers"
+WORKER_PREFIX = "ws:worker:"
+LEASE_PREFIX = "ws:lease:"
+
+# Membership của worker hết hạn nếu không được heartbeat gia hạn trong khoảng này (giây)
+MEMBERSHIP_TTL = 90
+HEARTBEAT_INTERVAL = 30
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class InMemorySubscriptionStore:
+    """Subscription channel -> set(session_id) trong process hiện tại"""
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def add(self, channel, session_id):
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(session_id)
+
+    def remove(self, channel, session_id):
+        with self._lock:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(session_id)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+    def remove_session(self, session_id, channels):
+        for channel in channels:
+            self.remove(channel, session_id)
+
+    def count(self, channel):
+        with self._lock:
+            return len(self._subscribers.get(channel, ()))
+
+    def has_subscribers(self, channel):
+        return self.count(channel) > 0
+
+    def channels(self):
+        with self._lock:
+            return {channel: len(subscribers) for channel, subscribers in self._subscribers.items()}
+
+    def acquire_lease(self, name, owner, ttl):
+        # Chỉ có một worker: luôn là publisher
+        return True
+
+    def heartbeat(self):
+        # Trong process: subscription mất cùng process, không có gì để gia hạn
+        pass
+
+
+class RedisSubscriptionStore:
+    """
+    Subscription lưu trong Redis, dùng chung cho mọi worker.
+
+    Mỗi worker ghi vào set riêng ws:members:<channel>:<worker> có TTL và gia hạn bằng
+    heartbeat; worker chỉ được tính khi heartbeat trong ws:workers còn mới. Worker bị kill
+    (không chạy được cleanup khi disconnect) thì subscription của nó hết hạn theo TTL và
+    được dọn ở lần prune kế tiếp, nên has_subscribers không bị kẹt ở True.
+    """
+
+    def __init__(self, redis_client, ttl=MEMBERSHIP_TTL):
+        self.redis = redis_client
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._owner = None
+        self._owner_pid = None
+        # channel -> set(session_id) của worker hiện tại, dùng để heartbeat ghi lại membership
+        self._local = {}
+
+    @property
+    def owner(self):
+        """Id của worker hiện tại; sau fork (gunicorn --preload) mỗi worker có id riêng"""
+        pid = os.getpid()
+        if self._owner_pid != pid:
+            with self._lock:
+                if self._owner_pid != pid:
+                    self._owner = f"{socket.gethostname()}:{pid}:{uuid.uuid4().hex[:8]}"
+                    self._owner_pid = pid
+                    self._local = {}
+        return self._owner
+
+    def _key(self, channel, owner):
+        return f"{MEMBERS_PREFIX}{channel}:{owner}"
+
+    def _worker_channels_key(self, owner):
+        return f"{WORKER_PREFIX}{owner}:channels"
+
+    def _alive_workers(self):
+        workers = self.redis.zrangebyscore(WORKERS_KEY, time.time() - self.ttl, "+inf")
+        return [_decode(worker) for worker in workers]
+
+    def add(self, channel, session_id):
+        owner = self.owner
+        with self._lock:
+            self._local.setdefault(channel, set()).add(session_id)
+        try:
+            pipe = self.redis.pipeline()
+            pipe.sadd(self._key(channel, owner), session_id)
+            pipe.expire(self._key(channel, owner), self.ttl)
+            pipe.sadd(self._worker_channels_key(owner), channel)
+            pipe.expire(self._worker_channels_key(owner), self.ttl)
+            pipe.zadd(WORKERS_KEY, {owner: time.time()})
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"[WebSocket] Redis subscribe failed for {channel}: {e}")
+
+    def remove(self, channel, session_id):
+        self.remove_session(session_id, [channel])
+
+    def remove_session(self, session_id, channels):
+        channels = list(channels)
+        if not channels:
+            return
+        owner = self.owner
+        emptied = []
+        with self._lock:
+            for channel in channels:
+                subscribers = self._local.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(session_id)
+                    if not subscribers:
+                        del self._local[channel]
+                        emptied.append(channel)
+        try:
+            pipe = self.redis.pipeline()
+            for channel in channels:
+                pipe.srem(self._key(channel, owner), session_id)
+            if emptied:
+                pipe.srem(self._worker_channels_key(owner), *emptied)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"[WebSocket] Redis unsubscribe failed for {session_id}: {e}")
+
+    def count(self, channel):
+        try:
+            workers = self._alive_workers()
+            pipe = self.redis.pipeline()
+            for worker in workers:
+                pipe.scard(self._key(channel, worker))
+            return sum(int(count) for count in pipe.execute())
+        except Exception as e:
+            logger.warning(f"[WebSocket] Redis count failed for {channel}: {e}")
+            return None
+
+    def has_subscribers(self, channel):
+        # Không đọc được Redis thì vẫn phát: message queue sẽ tự bỏ qua room rỗng
+        count = self.count(channel)
+        return count is None or count > 0
+
+    def heartbeat(self):
+        """Đánh dấu worker còn sống, ghi lại và gia hạn membership của nó, dọn worker đã chết"""
+        owner = self.owner
+        with self._lock:
+            local = {channel: list(sessions) for channel, sessions in self._local.items()}
+        try:
+            pipe = self.redis.pipeline()
+            pipe.zadd(WORKERS_KEY, {owner: time.time()})
+            for channel, sessions in local.items():
+                pipe.sadd(self._key(channel, owner), *sessions)
+                pipe.expire(self._key(channel, owner), self.ttl)
+            if local:
+                pipe.sadd(self._worker_channels_key(owner), *local)
+                pipe.expire(self._worker_channels_key(owner), self.ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"[WebSocket] Redis heartbeat failed: {e}")
+        self.prune_stale_workers()
+
+    def prune_stale_workers(self):
+        """Xóa membership của các worker không heartbeat trong ttl giây (crash, restart)"""
+        try:
+            stale = [_decode(worker) for worker in
+                     self.redis.zrangebyscore(WORKERS_KEY, "-inf", time.time() - self.ttl)]
+            for worker in stale:
+                channels = [_decode(channel) for channel in
+                            self.redis.smembers(self._worker_channels_key(worker))]
+                pipe = self.redis.pipeline()
+                for channel in channels:
+                    pipe.delete(self._key(channel, worker))
+                pipe.delete(self._worker_channels_key(worker))
+                pipe.zrem(WORKERS_KEY, worker)
+                pipe.execute()
+            if stale:
+                logger.info(f"[WebSocket] Pruned subscriptions of {len(stale)} stale worker(s)")
+            return len(stale)
+        except Exception as e:
+            logger.warning(f"[WebSocket] Redis prune failed: {e}")
+            return 0
+
+    def acquire_lease(self, name, owner, ttl):
+        """
+        Giữ/gia hạn lease để chỉ một worker publish dữ liệu định kỳ (vd. channel market).
+        Lease hết hạn sau ttl giây nếu worker giữ nó dừng lại.
+        """
+        key = f"{LEASE_PREFIX}{name}"
+        try:
+            if self.redis.set(key, owner, nx=True, ex=ttl):
+                return True
+            current = self.redis.get(key)
+            if current is not None and _decode(current) == owner:
+                self.redis.expire(key, ttl)
+                return True
+            return False
+        except Exception as e:
+            logger.warning(f"[WebSocket] Redis lease {name} failed: {e}")
+            return True
+
+    def channels(self):
+        try:
+            workers = self._alive_workers()
+            pipe = self.redis.pipeline()
+            for worker in workers:
+                pipe.smembers(self._worker_channels_key(worker))
+            pairs = [(worker, _decode(channel))
+                     for worker, channels in zip(workers, pipe.execute()) for channel in channels]
+            pipe = self.redis.pipeline()
+            for worker, channel in pairs:
+                pipe.scard(self._key(channel, worker))
+            counts = pipe.execute()
+        except Exception as e:
+            logger.warning(f"[WebSocket] Redis channel stats failed: {e}")
+            return {}
+
+        result = {}
+        for (_, channel), count in zip(pairs, counts):
+            if count:
+                result[channel] = result.get(channel, 0) + int(count)
+        return result
+
+
+def create_subscription_store(redis_url=None):
+    """Chọn store theo cấu hình; lỗi kết nối Redis thì fallback về store trong process"""
+    if not redis_url:
+        return InMemorySubscriptionStore()
+    try:
+        import redis
+        client = redis.Redis.from_url(redis_url, socket_timeout=2, socket_connect_timeout=2)
+        client.ping()
+        store = RedisSubscriptionStore(client)
+        # Lúc khởi động: dọn membership của worker đã chết
+        store.prune_stale_workers()
+        return store
+    except Exception as e:
+        print(f"WARNING: Redis subscription store unavailable ({e}), using in-process store")
+        return InMemorySubscriptionStore()
@@ -4,19 +4,35 @@ Handles all real-time communication between server and clients
 """
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask import request
+import os
 import uuid
 import json
 import threading
 import time
 from datetime import datetime
 
+from .backplane import HEARTBEAT_INTERVAL, InMemorySubscriptionStore, create_subscription_store
+
+# Khoảng cách tối thiểu (giây) giữa hai frame của cùng một channel khi coalesce
+CHANNEL_MIN_INTERVALS = {
+    'market': 5,
+}
+DEFAULT_MIN_INTERVAL = 1
+
 class WebSocketManager:
     def __init__(self, app=None, redis_client=None):
         self.socketio = None
         self.app = app
         self.redis_client = redis_client
+        # Kết nối của worker hiện tại; subscription dùng chung qua backplane
         self.active_connections = {}
-        self.room_subscribers = {}
+        self.subscriptions = InMemorySubscriptionStore()
+        self._background_pid = None
+        self._background_lock = threading.Lock()
+        # channel -> {'event': event_type, 'data': {field: value}} chờ gửi
+        self._pending_updates = {}
+        self._last_flush = {}
+        self._pending_lock = threading.Lock()
         
         if app:
             self.init_app(app)
@@ -24,19 +40,23 @@ class WebSocketManager:
     def init_app(self, app):
         """Initialize SocketIO with Flask app"""
         self.app = app
+        # Message queue (Redis pub/sub) để emit từ bất kỳ worker nào cũng đến được
+        # client đang kết nối ở worker khác
+        message_queue = app.config.get('SOCKETIO_MESSAGE_QUEUE')
         self.socketio = SocketIO(
             app, 
             cors_allowed_origins="*",
             async_mode='threading',
+            message_queue=message_queue,
             logger=True,
             engineio_logger=True
         )
+        self.subscriptions = create_subscription_store(message_queue)
+        if message_queue:
+            print("INFO: WebSocket using Redis message queue backplane")
         
         # Register event handlers
         self.register_handlers()
-        
-        # Start background tasks
-        self.start_background_tasks()
     
     def register_handlers(self):
         """Register all WebSocket event handlers"""
@@ -46,6 +66,9 @@ class WebSocketManager:
             client_id = str(uuid.uuid4())
             session_id = request.sid
             
+            # Thread cleanup chạy trong worker (không tạo ở master khi --preload)
+            self.start_background_tasks()
+            
             # Store connection info
             self.active_connections[session_id] = {
                 'client_id': client_id,
@@ -73,8 +96,7 @@ class WebSocketManager:
                 # Leave all rooms
                 for subscription in client_info['subscriptions']:
                     leave_room(subscription)
-                    if subscription in self.room_subscribers:
-                        self.room_subscribers[subscription].discard(session_id)
+                self.subscriptions.remove_session(session_id, client_info['subscriptions'])
                 
                 # Remove from active connections
                 del self.active_connections[session_id]
@@ -96,9 +118,7 @@ class WebSocketManager:
             if session_id in self.active_connections:
                 self.active_connections[session_id]['subscriptions'].add(channel)
             
-            if channel not in self.room_subscribers:
-                self.room_subscribers[channel] = set()
-            self.room_subscribers[channel].add(session_id)
+            self.subscriptions.add(channel, session_id)
             
             print(f"[WebSocket] Client {session_id} subscribed to {channel}")
             
@@ -124,8 +144,7 @@ class WebSocketManager:
             if session_id in self.active_connections:
                 self.active_connections[session_id]['subscriptions'].discard(channel)
             
-            if channel in self.room_subscribers:
-                self.room_subscribers[channel].discard(session_id)
+            self.subscriptions.remove(channel, session_id)
             
             print(f"[WebSocket] Client {session_id} unsubscribed from {channel}")
             
@@ -144,10 +163,11 @@ class WebSocketManager:
             emit('pong', {'timestamp': datetime.now().isoformat()})
     
     def broadcast_to_channel(self, channel, event_type, data):
-        """Broadcast data to all subscribers of a channel"""
-        if channel in self.room_subscribers and self.room_subscribers[channel]:
-            self.socketio.emit(event_type, data, room=channel)
-            print(f"[WebSocket] Broadcasted {event_type} to {channel} ({len(self.room_subscribers[channel])} clients)")
+        """Broadcast data to all subscribers of a channel (trên mọi worker)"""
+        if self.socketio is None or not self.subscriptions.has_subscribers(channel):
+            return
+        self.socketio.emit(event_type, data, room=channel)
+        print(f"[WebSocket] Broadcasted {event_type} to {channel}")
     
     def broadcast_status_update(self, status_data):
         """Broadcast system status updates"""
@@ -171,8 +191,56 @@ class WebSocketManager:
             'data': report_data
         })
     
+    def broadcast_market_update(self, changes):
+        """Queue các field thị trường vừa thay đổi cho channel market (được coalesce)"""
+        self.queue_channel_update('market', 'market_update', changes)
+
+    def queue_channel_update(self, channel, event_type, changes):
+        """
+        Gộp thay đổi vào frame đang chờ của channel; field cập nhật sau ghi đè field trước.
+        Frame được gửi ngay nếu đã qua khoảng cách tối thiểu, nếu không thì chờ lần flush sau.
+        """
+        if not changes:
+            return
+        with self._pending_lock:
+            pending = self._pending_updates.setdefault(channel, {'event': event_type, 'data': {}})
+            pending['event'] = event_type
+            pending['data'].update(changes)
+        self.flush_channel_updates()
+
+    def flush_channel_updates(self):
+        """Gửi các frame đã chờ đủ lâu; tối đa một frame mỗi channel trong mỗi khoảng"""
+        now = time.time()
+        ready = []
+        with self._pending_lock:
+            for channel, pending in list(self._pending_updates.items()):
+                min_interval = CHANNEL_MIN_INTERVALS.get(channel, DEFAULT_MIN_INTERVAL)
+                if now - self._last_flush.get(channel, 0) >= min_interval:
+                    ready.append((channel, pending))
+                    del self._pending_updates[channel]
+                    self._last_flush[channel] = now
+
+        for channel, pending in ready:
+            self.broadcast_to_channel(channel, pending['event'], {
+                'timestamp': datetime.now().isoformat(),
+                'data': pending['data']
+            })
+        return len(ready)
+
+    def claim_publisher(self, name, ttl=30):
+        """True nếu worker hiện tại được quyền publish nguồn dữ liệu định kỳ `name`"""
+        owner = f"{os.uname().nodename}:{os.getpid()}"
+        return self.subscriptions.acquire_lease(name, owner, ttl)
+
     def start_background_tasks(self):
-        """Start background tasks for cleanup and heartbeat"""
+        """Start background tasks for cleanup and heartbeat (một lần cho mỗi process)"""
+        if self._background_pid == os.getpid():
+            return
+        with self._background_lock:
+            if self._background_pid == os.getpid():
+                return
+            self._background_pid = os.getpid()
+
         def cleanup_stale_connections():
             """Remove stale connections every 60 seconds"""
             while True:
@@ -180,28 +248,38 @@ class WebSocketManager:
                 current_time = datetime.now()
                 stale_connections = []
                 
-                for session_id, conn_info in self.active_connections.items():
+                for session_id, conn_info in list(self.active_connections.items()):
                     time_diff = (current_time - conn_info['last_ping']).total_seconds()
                     if time_diff > 120:  # 2 minutes timeout
                         stale_connections.append(session_id)
                 
                 for session_id in stale_connections:
-                    if session_id in self.active_connections:
+                    conn_info = self.active_connections.pop(session_id, None)
+                    if conn_info is not None:
                         print(f"[WebSocket] Removing stale connection: {session_id}")
-                        del self.active_connections[session_id]
+                        self.subscriptions.remove_session(session_id, conn_info['subscriptions'])
+        
+        def heartbeat_subscriptions():
+            """Gia hạn subscription của worker này trên backplane, dọn worker đã chết"""
+            while True:
+                try:
+                    self.subscriptions.heartbeat()
+                except Exception as e:
+                    print(f"[WebSocket] Subscription heartbeat error: {e}")
+                time.sleep(HEARTBEAT_INTERVAL)
         
         # Start cleanup thread
         cleanup_thread = threading.Thread(target=cleanup_stale_connections, daemon=True)
         cleanup_thread.start()
+        heartbeat_thread = threading.Thread(target=heartbeat_subscriptions, daemon=True)
+        heartbeat_thread.start()
     
     def get_connection_stats(self):
         """Get current connection statistics"""
         return {
             'total_connections': len(self.active_connections),
-            'channels': {
-                channel: len(subscribers) 
-                for channel, subscribers in self.room_subscribers.items()
-            },
+            'worker_pid': os.getpid(),
+            'channels': self.subscriptions.channels(),
             'connections': [
                 {
                     'session_id': session_id,
@@ -0,0 +1,144 @@
+"""
+Test conditional-request cache của api_client (ETag/Last-Modified, Cache-Control max-age)
+và circuit breaker + backup của fetch_service_json
+"""
+import asyncio
+import gc
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import api_client
+from app.services.api_client import freshness_lifetime
+from app.utils.async_runtime import AsyncRuntime
+from app.utils.rate_limiter import APIServiceManager
+from app.utils.token_bucket import InMemoryTokenBucket
+
+
+class _FakeResponse:
+    def __init__(self, status_code, headers, body=None):
+        self.status_code = status_code
+        self.headers = headers
+        self._body = body
+        self.content = b"{}" if body is not None else b""
+
+    def json(self):
+        return self._body
+
+    def raise_for_status(self):
+        pass
+
+
+class _FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, timeout=None, headers=None):
+        self.requests.append(headers or {})
+        return self.responses.pop(0)
+
+
+def test_freshness_lifetime_from_headers():
+    assert freshness_lifetime({"Cache-Control": "public, max-age=60", "Age": "15"}) == 45
+    assert freshness_lifetime({"Cache-Control": "no-cache, max-age=60"}) == 0
+    assert freshness_lifetime({"Cache-Control": "no-store"}) is None
+    assert freshness_lifetime({
+        "Date": "Wed, 21 Oct 2015 07:28:00 GMT",
+        "Expires": "Wed, 21 Oct 2015 07:30:00 GMT",
+    }) == 120
+    assert freshness_lifetime({}) == 0
+
+
+def test_revalidates_with_etag_then_serves_fresh_hits(monkeypatch):
+    url = "https://api.example.test/price"
+    session = _FakeSession([
+        _FakeResponse(200, {"ETag": '"v1"', "Cache-Control": "max-age=0"}, {"usd": 1}),
+        _FakeResponse(304, {"ETag": '"v1"', "Cache-Control": "max-age=60"}),
+    ])
+    monkeypatch.setattr(api_client.session_registry, "get", lambda _url: session)
+    monkeypatch.setattr(api_client, "response_cache", api_client.HttpResponseCache())
+
+    assert api_client.fetch_json(url) == ({"usd": 1}, None, 200)
+    # Hết max-age: gửi If-None-Match, 304 trả lại body đã cache
+    assert api_client.fetch_json(url) == ({"usd": 1}, None, 200)
+    assert session.requests[1] == {"If-None-Match": '"v1"'}
+    # 304 gia hạn max-age=60: lần sau không gọi mạng
+    assert api_client.fetch_json(url) == ({"usd": 1}, None, 200)
+    assert len(session.requests) == 2
+    assert api_client.response_cache.stats()["hits"] == 1
+
+
+def test_revalidation_keeps_entry_size():
+    cache = api_client.HttpResponseCache(max_bytes=1024)
+    url = "https://api.example.test/big"
+    cache.store(url, {"usd": 1}, {"ETag": '"v1"'}, 600)
+    assert cache._entries.current_bytes == 600
+
+    # 304 chỉ gia hạn entry: body vẫn chiếm đúng số byte ban đầu trong giới hạn max_bytes
+    cache.revalidated(url, cache.get(url), {"ETag": '"v1"', "Cache-Control": "max-age=60"})
+    assert cache._entries.current_bytes == 600
+    cache.store("https://api.example.test/other", {"usd": 2}, {"ETag": '"v2"'}, 600)
+    assert cache.get(url) is None
+
+
+def test_async_clients_are_released_with_their_loop():
+    async def get_client():
+        return api_client._get_async_client("https://api.example.test/a")
+
+    async def reuse_then_close():
+        client = await get_client()
+        assert client is await get_client()
+        await api_client.close_async_clients()
+        return client
+
+    closed = asyncio.run(reuse_then_close())
+    assert closed.is_closed
+
+    for _ in range(3):
+        asyncio.run(get_client())
+    gc.collect()
+    # Mỗi asyncio.run tạo loop mới: loop cũ bị thu gom thì client của nó không còn được giữ
+    assert not any(loop.is_closed() for loop in api_client._async_clients)
+
+
+def test_runtime_stop_closes_pooled_async_clients():
+    runtime = AsyncRuntime()
+    runtime.on_shutdown(api_client.close_async_clients)
+
+    async def get_client():
+        return api_client._get_async_client("https://api.example.test/a")
+
+    client = runtime.run_sync(get_client(), timeout=5)
+    loop = runtime.loop
+    runtime.stop()
+    assert client.is_closed
+    assert loop.is_closed()
+
+
+def test_open_circuit_short_circuits_to_backup(monkeypatch):
+    manager = APIServiceManager(InMemoryTokenBucket())
+    backup = {}
+    calls = []
+
+    def failing_fetch(url, timeout=5):
+        calls.append(url)
+        return None, "Lỗi kết nối", 503
+
+    monkeypatch.setattr(api_client, "api_service_manager", manager)
+    monkeypatch.setattr(api_client, "fetch_json", failing_fetch)
+    monkeypatch.setattr(api_client, "set_backup_cache", lambda key, data, max_age_hours=6: backup.__setitem__(key, data))
+    monkeypatch.setattr(api_client, "get_backup_cache", backup.get)
+
+    backup["price"] = {"btc_price_usd": 1}
+    limiter = manager.get_limiter("flaky")
+    limiter.config.burst_limit = 10
+    for _ in range(limiter.config.circuit_failure_threshold):
+        result = api_client.with_backup("price", api_client.fetch_service_json("flaky", "https://x"))
+        assert result == ({"btc_price_usd": 1}, None, api_client.BACKUP_STATUS)
+
+    # Circuit đã mở: không gọi upstream nữa, trả 503 ngay
+    assert manager.get_all_stats()["flaky"]["circuit_state"] == "open"
+    assert api_client.fetch_service_json("flaky", "https://x", acquire_timeout=0)[2] == 503
+    assert len(calls) == limiter.config.circuit_failure_threshold
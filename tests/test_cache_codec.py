@@ -0,0 +1,49 @@
+"""
+Test cache codec: round-trip, nén theo ngưỡng và đọc giá trị JSON cũ
+"""
+import sys
+import os
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.cache_codec import (
+    CacheCodec, SERIALIZER_JSON, SERIALIZER_ORJSON, SERIALIZER_MSGPACK,
+    COMPRESSION_NONE, COMPRESSION_ZLIB, COMPRESSION_ZSTD, orjson, ormsgpack, zstandard,
+)
+
+SAMPLE = {"html": "<div>Báo cáo thị trường</div>" * 200, "rsi": 55.5, "items": [1, 2, 3], "ok": True}
+
+
+def _available_codecs():
+    serializers = [SERIALIZER_JSON]
+    serializers += [SERIALIZER_ORJSON] if orjson else []
+    serializers += [SERIALIZER_MSGPACK] if ormsgpack else []
+    compressions = [COMPRESSION_NONE, COMPRESSION_ZLIB] + ([COMPRESSION_ZSTD] if zstandard else [])
+    return [CacheCodec(s, c) for s in serializers for c in compressions]
+
+
+def test_round_trip_all_codecs():
+    for codec in _available_codecs():
+        payload = codec.encode(SAMPLE)
+        assert isinstance(payload, bytes)
+        assert payload[0] & 0xF0 == 0xC0
+        assert codec.decode(payload) == SAMPLE
+
+
+def test_large_payloads_are_compressed_small_are_not():
+    codec = CacheCodec(compression=COMPRESSION_ZLIB, compress_threshold=1024)
+    large = codec.encode(SAMPLE)
+    assert len(large) < len(json.dumps(SAMPLE).encode()) / 4
+    assert (large[0] >> 2) & 0x03 == COMPRESSION_ZLIB
+
+    small = codec.encode({"a": 1})
+    assert (small[0] >> 2) & 0x03 == COMPRESSION_NONE
+
+
+def test_any_codec_reads_legacy_json_and_other_formats():
+    reader = CacheCodec(SERIALIZER_JSON, COMPRESSION_NONE)
+    assert reader.decode(json.dumps(SAMPLE, ensure_ascii=False).encode("utf-8")) == SAMPLE
+    assert reader.decode(json.dumps([1, 2])) == [1, 2]
+    for codec in _available_codecs():
+        assert reader.decode(codec.encode(SAMPLE)) == SAMPLE
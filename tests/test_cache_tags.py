@@ -0,0 +1,36 @@
+"""
+Test invalidate theo tag và namespace của EnhancedCache
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.enhanced_cache import EnhancedCache, CacheStrategy
+
+
+def test_invalidate_by_tag_removes_only_tagged_keys():
+    cache = EnhancedCache(CacheStrategy.MEMORY_ONLY)
+    cache.set("index", "<html>latest</html>", 60, namespace="pages_test", tags=["reports", "report:42"])
+    cache.set("report_42", "<html>42</html>", 60, namespace="pages_test", tags=["report:42"])
+    cache.set("report_41", "<html>41</html>", 60, namespace="pages_test", tags=["report:41"])
+
+    assert cache.invalidate_tags("reports") == 1
+    assert cache.get("index", namespace="pages_test") is None
+    assert cache.get("report_42", namespace="pages_test") == "<html>42</html>"
+
+    cache.invalidate_tags("report:42", "report:41")
+    assert cache.get("report_42", namespace="pages_test") is None
+    assert cache.get("report_41", namespace="pages_test") is None
+    assert cache.invalidate_tags("report:42") == 0
+
+
+def test_invalidate_namespace():
+    cache = EnhancedCache(CacheStrategy.MEMORY_ONLY)
+    cache.set("btc", {"price": 1}, 60, namespace="market_test")
+    cache.set("fng", {"value": 50}, 60, namespace="market_test")
+    cache.set("other", 1, 60, namespace="other_test")
+
+    assert cache.invalidate_namespace("market_test") == 2
+    assert cache.get("btc", namespace="market_test") is None
+    assert cache.get("other", namespace="other_test") == 1
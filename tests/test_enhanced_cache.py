@@ -0,0 +1,77 @@
+"""
+Test EnhancedCache nhiều tầng: read-through memory → file, write-behind và CacheStats
+"""
+import sys
+import os
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils import enhanced_cache
+from app.utils.enhanced_cache import EnhancedCache, CacheStrategy, cache_stats
+
+
+def _file_cache(tmpdir):
+    cache = EnhancedCache(CacheStrategy.FILE_BACKUP)
+    cache.backup_dir = tmpdir
+    return cache
+
+
+def test_write_behind_persists_to_file_tier():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache = _file_cache(tmpdir)
+        assert cache.set("rsi", {"rsi_14": 55}, timeout=60, namespace="wb_test")
+        assert cache.get("rsi", namespace="wb_test") == {"rsi_14": 55}
+        assert cache.flush()
+        assert os.listdir(tmpdir) == ["wb_test__rsi.json"]
+
+
+def test_read_through_promotes_file_hit_to_memory():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache = _file_cache(tmpdir)
+        cache.set("fng", {"value": 40}, timeout=60, namespace="rt_test")
+        cache.flush()
+        # Mô phỏng process mới: memory trống, chỉ còn file
+        enhanced_cache._memory_cache.delete("rt_test:fng")
+
+        cache_stats.reset()
+        assert cache.get("fng", namespace="rt_test") == {"value": 40}
+        assert cache.get("fng", namespace="rt_test") == {"value": 40}
+        assert cache.get("missing", namespace="rt_test") is None
+
+        stats = cache_stats.get_stats()
+        assert stats["tier_hits"] == {"file": 1, "memory": 1}
+        assert stats["misses"] == 1
+
+
+def test_backup_cache_functions_share_the_unified_cache(monkeypatch, tmp_path):
+    from app.utils.cache import set_backup_cache, get_backup_cache
+
+    # Không ghi vào instance/backup_cache thật
+    monkeypatch.setattr(enhanced_cache._backup_cache, "backup_dir", str(tmp_path))
+    set_backup_cache("unified_test", {"ok": True}, max_age_hours=1)
+    assert get_backup_cache("unified_test") == {"ok": True}
+    assert enhanced_cache.get_backup_cache("unified_test") == {"ok": True}
+    enhanced_cache._backup_cache.flush()
+    assert os.listdir(tmp_path) == ["backup__unified_test.json"]
+
+
+def test_metrics_by_namespace_and_tier():
+    from app.utils.enhanced_cache import cache_metrics, cache_metrics_prometheus
+
+    cache_stats.reset()
+    cache = EnhancedCache(CacheStrategy.MEMORY_ONLY)
+    cache.set("a", {"v": 1}, timeout=60, namespace="metrics_test")
+    cache.get("a", namespace="metrics_test")
+    cache.get("b", namespace="metrics_test")
+
+    memory = cache_metrics()["namespaces"]["metrics_test"]["memory"]
+    assert (memory["hits"], memory["misses"], memory["sets"]) == (1, 1, 1)
+    assert memory["bytes_written"] > 0
+    assert memory["get_latency"]["count"] == 2
+    assert memory["get_latency"]["buckets"]["+Inf"] == 2
+
+    text = cache_metrics_prometheus()
+    assert 'cache_hits_total{namespace="metrics_test",tier="memory"} 1' in text
+    assert 'cache_get_latency_seconds_bucket{namespace="metrics_test",tier="memory",le="+Inf"} 2' in text
+    assert "cache_memory_bytes " in text
@@ -0,0 +1,89 @@
+"""
+Test indicator engine: so sánh kết quả vectorized với cài đặt vòng lặp tham chiếu
+"""
+import sys
+import os
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.indicators import rsi, ema, macd, bollinger, CandleWindow, IndicatorEngine
+
+
+def _closes(n=300, seed=7):
+    rng = np.random.default_rng(seed)
+    return np.cumsum(rng.normal(0, 50, n)) + 60000
+
+
+def _reference_rsi(closes, period=14):
+    deltas = np.diff(closes)
+    gains = np.clip(deltas, 0, None)
+    losses = np.clip(-deltas, 0, None)
+    avg_gain, avg_loss = gains[:period].mean(), losses[:period].mean()
+    values = [100 - 100 / (1 + avg_gain / avg_loss)]
+    for i in range(period, len(deltas)):
+        avg_gain = (avg_gain * (period - 1) + gains[i]) / period
+        avg_loss = (avg_loss * (period - 1) + losses[i]) / period
+        values.append(100 - 100 / (1 + avg_gain / avg_loss))
+    return np.array(values)
+
+
+def _reference_ema(values, period):
+    alpha = 2 / (period + 1)
+    current = values[:period].mean()
+    out = [current]
+    for value in values[period:]:
+        current = (1 - alpha) * current + alpha * value
+        out.append(current)
+    return np.array(out)
+
+
+def test_rsi_matches_wilder_reference():
+    closes = _closes()
+    result = rsi(closes, 14)
+    assert np.isnan(result[:14]).all()
+    assert np.allclose(result[14:], _reference_rsi(closes, 14))
+
+
+def test_ema_and_macd_match_reference():
+    closes = _closes()
+    assert np.allclose(ema(closes, 26)[25:], _reference_ema(closes, 26))
+
+    macd_line, signal_line, histogram = macd(closes)
+    expected_macd = ema(closes, 12) - ema(closes, 26)
+    assert np.allclose(macd_line[25:], expected_macd[25:])
+    assert np.allclose(signal_line[33:], _reference_ema(expected_macd[25:], 9))
+    assert np.allclose(histogram[33:], macd_line[33:] - signal_line[33:])
+
+
+def test_bollinger_bands():
+    closes = _closes(50)
+    middle, upper, lower = bollinger(closes, 20, 2.0)
+    window = closes[-20:]
+    assert np.isclose(middle[-1], window.mean())
+    assert np.isclose(upper[-1], window.mean() + 2 * window.std())
+    assert np.isclose(lower[-1], window.mean() - 2 * window.std())
+
+
+def test_candle_window_merges_forming_candle_and_rolls():
+    window = CandleWindow(capacity=3)
+    window.merge([[1, 1, 1, 1, 1, 1], [2, 2, 2, 2, 2, 2]])
+    # Nến open_time=2 đang hình thành được ghi đè, nến mới được thêm vào
+    window.merge([[2, 2, 3, 2, 3, 5], [3, 3, 3, 3, 3, 1], [4, 4, 4, 4, 4, 1]])
+    assert list(window.column("open_time")) == [2, 3, 4]
+    assert window.column("close")[0] == 3
+
+
+def test_engine_snapshot_cached_per_window_version():
+    engine = IndicatorEngine(capacity=100)
+    candles = [[i, c, c, c, c, 1] for i, c in enumerate(_closes(100))]
+    assert engine._apply(candles, None, 200) == (None, 200)
+
+    snapshot = engine.snapshot()
+    assert snapshot["candles"] == 100
+    assert 0 <= snapshot["rsi_14"] <= 100
+    assert engine.snapshot() is snapshot
+
+    engine._apply([[99, 1, 1, 1, 1, 1]], None, 200)
+    assert engine.snapshot() is not snapshot
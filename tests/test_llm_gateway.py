@@ -0,0 +1,285 @@
+"""
+Test LLM gateway: cache theo nội dung, backoff theo loại lỗi, semaphore, budget RPM và streaming
+"""
+import sys
+import os
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.genai import errors, types
+import pytest
+
+from app.services import llm_gateway
+from app.services.progress_tracker import progress_tracker
+from app.services.workflow_nodes import research_deep
+from app.services.llm_gateway import LLMGateway, LLMResponseCache, LLMBudgetExceeded, classify_error
+from app.utils.enhanced_cache import CacheStrategy
+from app.utils.token_bucket import InMemoryTokenBucket
+
+
+class _FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class _FakeModels:
+    def __init__(self, text="answer"):
+        self.calls = 0
+        self.text = text
+
+    def generate_content(self, model, contents, config):
+        self.calls += 1
+        return _FakeResponse(self.text)
+
+
+class _FakeClient:
+    def __init__(self, text="answer"):
+        self.models = _FakeModels(text)
+
+
+def _contents(prompt):
+    return [types.Content(role="user", parts=[types.Part.from_text(text=prompt)])]
+
+
+def _use_cache(monkeypatch, **kwargs):
+    cache = LLMResponseCache(strategy=CacheStrategy.MEMORY_ONLY, **kwargs)
+    cache.clear()
+    monkeypatch.setattr(llm_gateway, "llm_cache", cache)
+    monkeypatch.setattr(llm_gateway, "gateway", _gateway(cache=cache))
+    return cache
+
+
+def _gateway(sleeps=None, **kwargs):
+    sleeps = [] if sleeps is None else sleeps
+    kwargs.setdefault("bucket", InMemoryTokenBucket())
+    kwargs.setdefault("rpm", 600)
+    kwargs.setdefault("cache", LLMResponseCache(strategy=CacheStrategy.MEMORY_ONLY, enabled=False))
+    return LLMGateway(sleep=sleeps.append, **kwargs)
+
+
+def test_identical_request_is_served_from_cache(monkeypatch):
+    _use_cache(monkeypatch, ttl=60, enabled=True)
+    client = _FakeClient()
+    config = types.GenerateContentConfig(temperature=0.1, candidate_count=1)
+
+    first = llm_gateway.generate_content(client, "m", _contents("dịch HTML"), config)
+    second = llm_gateway.generate_content(client, "m", _contents("dịch HTML"), config)
+    assert first.text == second.text == "answer"
+    assert client.models.calls == 1
+
+    # Khác model, prompt hoặc config là key khác
+    llm_gateway.generate_content(client, "m2", _contents("dịch HTML"), config)
+    llm_gateway.generate_content(client, "m", _contents("dịch CSS"), config)
+    llm_gateway.generate_content(client, "m", _contents("dịch HTML"), types.GenerateContentConfig(temperature=0.5))
+    assert client.models.calls == 4
+
+
+def test_forget_and_disabled_cache_call_model_again(monkeypatch):
+    _use_cache(monkeypatch, ttl=60, enabled=True)
+    client = _FakeClient()
+    llm_gateway.generate_content(client, "m", _contents("research"))
+    llm_gateway.forget("m", _contents("research"))
+    llm_gateway.generate_content(client, "m", _contents("research"))
+    assert client.models.calls == 2
+
+    _use_cache(monkeypatch, ttl=60, enabled=False)
+    llm_gateway.generate_content(client, "m", _contents("research"))
+    llm_gateway.generate_content(client, "m", _contents("research"))
+    assert client.models.calls == 4
+
+
+def test_empty_response_is_retried_and_not_cached(monkeypatch):
+    _use_cache(monkeypatch, ttl=60, enabled=True)
+    client = _FakeClient(text="")
+    response = llm_gateway.generate_content(client, "m", _contents("css"), max_attempts=2)
+    assert response.text == ""
+    llm_gateway.generate_content(client, "m", _contents("css"), max_attempts=2)
+    assert client.models.calls == 4
+
+
+class _FlakyModels:
+    """Raise lần lượt các lỗi trong `failures` rồi trả về response"""
+
+    def __init__(self, failures):
+        self.failures = list(failures)
+        self.calls = 0
+
+    def generate_content(self, model, contents, config):
+        self.calls += 1
+        if self.failures:
+            raise self.failures.pop(0)
+        return _FakeResponse("ok")
+
+
+def _api_error(code, status, details=None):
+    return errors.APIError(code, {"error": {"code": code, "status": status, "message": "x",
+                                            "details": details or []}})
+
+
+def test_backoff_follows_error_class():
+    assert classify_error(_api_error(429, "RESOURCE_EXHAUSTED")) == "rate_limit"
+    assert classify_error(_api_error(503, "UNAVAILABLE")) == "server"
+    assert classify_error(_api_error(400, "INVALID_ARGUMENT")) == "client"
+    assert classify_error(TimeoutError()) == "network"
+
+    sleeps = []
+    gateway = _gateway(sleeps)
+    client = _FakeClient()
+    client.models = _FlakyModels([
+        _api_error(429, "RESOURCE_EXHAUSTED", [{"@type": "type.googleapis.com/google.rpc.RetryInfo",
+                                                 "retryDelay": "27s"}]),
+        _api_error(503, "UNAVAILABLE"),
+    ])
+    assert gateway.generate_content(client, "m", _contents("report")).text == "ok"
+    assert client.models.calls == 3
+    # 429 chờ ít nhất retryDelay của server; 5xx lần 2: 4s * 2 với equal jitter -> [4, 8]
+    assert sleeps[0] >= 27
+    assert 4 <= sleeps[1] <= 8
+
+    stats = gateway.stats()["models"]["m"]
+    assert stats["retries"] == 2 and stats["errors"] == {"rate_limit": 1, "server": 1}
+    assert stats["calls"] == 1 and stats["failures"] == 0
+
+
+def test_client_error_is_not_retried():
+    sleeps = []
+    gateway = _gateway(sleeps)
+    client = _FakeClient()
+    client.models = _FlakyModels([_api_error(400, "INVALID_ARGUMENT")])
+    with pytest.raises(errors.APIError):
+        gateway.generate_content(client, "m", _contents("report"))
+    assert client.models.calls == 1 and sleeps == []
+    assert gateway.stats()["models"]["m"]["failures"] == 1
+
+
+def test_semaphore_bounds_concurrent_calls():
+    gateway = _gateway(max_concurrency=2)
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    class _SlowModels:
+        def generate_content(self, model, contents, config):
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            time.sleep(0.05)
+            with lock:
+                active.pop()
+            return _FakeResponse("ok")
+
+    client = _FakeClient()
+    client.models = _SlowModels()
+    threads = [threading.Thread(target=gateway.generate_content, args=(client, "m", _contents(str(i))))
+               for i in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(peak) == 6 and max(peak) == 2
+
+
+def test_rpm_budget_waits_then_gives_up_after_timeout():
+    sleeps = []
+    gateway = _gateway(sleeps, rpm=1, budget_timeout=10)
+    client = _FakeClient()
+    gateway.generate_content(client, "m", _contents("a"))
+    # Bucket 1 request/phút: lần sau cần chờ ~60s, vượt budget_timeout nên bỏ cuộc ngay
+    with pytest.raises(LLMBudgetExceeded):
+        gateway.generate_content(client, "m", _contents("b"))
+    assert client.models.calls == 1 and sleeps == []
+
+
+class _StreamingModels:
+    """generate_content_stream trả về từng chunk, ghi lại số chunk model đã phải sinh"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.produced = 0
+        self.calls = 0
+
+    def generate_content_stream(self, model, contents, config):
+        self.calls += 1
+        for piece in self.chunks:
+            self.produced += 1
+            yield _FakeResponse(piece)
+
+
+def test_stream_reports_progress_and_caches_full_text(monkeypatch):
+    cache = _use_cache(monkeypatch, ttl=60, enabled=True)
+    monkeypatch.setattr(llm_gateway, "STREAM_PROGRESS_INTERVAL", 0)
+    updates = []
+    monkeypatch.setattr(progress_tracker, "update_stream",
+                        lambda session_id, label, chars, tokens, preview: updates.append((chars, preview)))
+    client = _FakeClient()
+    client.models = _StreamingModels(["Phần 1. ", "Phần 2. ", "Phần 3."])
+
+    response = llm_gateway.generate_content(client, "m", _contents("report"), session_id="s", stream=True)
+    assert response.text == "Phần 1. Phần 2. Phần 3."
+    assert response.chunks == 3 and not response.stopped_early
+    assert [chars for chars, _ in updates] == [8, 16, 23]
+    assert updates[-1][1].endswith("Phần 3.")
+    assert cache.get(cache.key("m", _contents("report"))) == response.text
+
+
+def test_stream_info_is_cleared_when_call_finishes(monkeypatch):
+    _use_cache(monkeypatch, ttl=60, enabled=False)
+    monkeypatch.setattr(llm_gateway, "STREAM_PROGRESS_INTERVAL", 0)
+    seen = []
+    monkeypatch.setattr(progress_tracker, "_broadcast_progress",
+                        lambda session_id: seen.append("stream" in progress_tracker.current_progress[session_id]))
+    progress_tracker.start_progress("stream-test")
+    client = _FakeClient()
+    client.models = _StreamingModels(["Phần 1. ", "Phần 2."])
+
+    llm_gateway.generate_content(client, "m", _contents("report"), session_id="stream-test",
+                                 label="HTML", stream=True)
+    # Trong lúc stream có thông tin stream, lời gọi xong thì bị xóa khỏi progress
+    assert True in seen
+    assert "stream" not in progress_tracker.current_progress.pop("stream-test")
+
+
+def test_stream_stops_when_validation_fails(monkeypatch):
+    cache = _use_cache(monkeypatch, ttl=60, enabled=True)
+    client = _FakeClient()
+    client.models = _StreamingModels(["Phân tích...\n", "KẾT QUẢ KIỂM TRA: FAIL\n", "phần còn lại", "..."])
+
+    response = llm_gateway.generate_content(client, "m", _contents("research"), stream=True,
+                                            stop_when=research_deep._validation_failed)
+    assert response.stopped_early
+    assert client.models.produced == 2
+    # Response dừng sớm không đầy đủ nên không được cache
+    assert cache.get(cache.key("m", _contents("research"))) is None
+
+
+def test_stream_keeps_going_when_fail_is_not_the_final_verdict():
+    # Kết luận cuối cùng được tính, ở cả check_report_validation lẫn điều kiện dừng stream
+    assert research_deep.check_report_validation("KẾT QUẢ KIỂM TRA: FAIL\n... KẾT QUẢ KIỂM TRA: PASS") == "PASS"
+    assert research_deep.check_report_validation("KẾT QUẢ KIỂM TRA: PASS\n... KẾT QUẢ KIỂM TRA: FAIL") == "FAIL"
+
+    client = _FakeClient()
+    client.models = _StreamingModels(["Nháp: KẾT QUẢ KIỂM TRA: FAIL", " -> sửa lại: KẾT QUẢ KIỂM TRA: PASS\n",
+                                      "Báo cáo."])
+    response = _gateway().generate_content(client, "m", _contents("research"), stream=True,
+                                           stop_when=research_deep._validation_failed)
+    assert not response.stopped_early
+    assert client.models.produced == 3
+    assert research_deep.check_report_validation(response.text) == "PASS"
+    # Chưa viết xong dòng kết luận FAIL thì chưa dừng
+    assert not research_deep._validation_failed("KẾT QUẢ KIỂM TRA: FAIL")
+    assert research_deep._validation_failed("KẾT QUẢ KIỂM TRA: FAIL\n")
+
+
+def test_grounded_research_is_not_cached(monkeypatch):
+    _use_cache(monkeypatch, ttl=60, enabled=True)
+    client = _FakeClient()
+    client.models = _StreamingModels(["Nghiên cứu...\n", "KẾT QUẢ KIỂM TRA: PASS\n"])
+    state = {"session_id": "s", "current_attempt": 0, "research_analysis_prompt": "{{REAL_TIME_DATA}}",
+             "realtime_data": {"btc": 1}, "client": client, "model": "m", "error_messages": []}
+
+    research_deep.research_deep_node(state)
+    research_deep.research_deep_node(state)
+    # Google Search cho kết quả khác nhau theo thời gian: mỗi lần chạy đều gọi model
+    assert state["success"] and client.models.calls == 2
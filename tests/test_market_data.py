@@ -0,0 +1,124 @@
+"""
+Test tổng hợp dữ liệu dashboard và background poller
+"""
+import sys
+import os
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import market_data
+from app.services.market_poller import MarketDataPoller
+
+
+def _results(**overrides):
+    results = {
+        "global_data": ({"market_cap": 1000, "volume_24h": 10}, None, 200),
+        "btc_data": ({"btc_price_usd": 60000, "btc_change_24h": 1.5}, None, 200),
+        "fng_data": ({"fng_value": "70", "fng_classification": "Greed"}, None, 200),
+        "rsi_data": ({"rsi_14": 55.0}, None, 200),
+    }
+    results.update(overrides)
+    return results
+
+
+def test_build_dashboard_summary_combines_sources():
+    payload, status = market_data.build_dashboard_summary(_results())
+    assert status == 200
+    assert payload["btc_price_usd"] == 60000
+    assert payload["rsi_14"] == 55.0
+    assert "warnings" not in payload
+
+
+def test_build_dashboard_summary_degrades_non_critical_sources():
+    payload, status = market_data.build_dashboard_summary(_results(
+        fng_data=(None, "Rate limited", 429),
+        rsi_data=(None, "Timeout", 408),
+    ))
+    assert status == 200
+    assert payload["fng_value"] == 50
+    assert payload["rsi_14"] == 50
+    assert set(payload["warnings"]) == {"fng_data", "rsi_data"}
+
+
+def test_build_dashboard_summary_fails_on_critical_error():
+    payload, status = market_data.build_dashboard_summary(_results(
+        btc_data=(None, "Lỗi kết nối", 503),
+    ))
+    assert status == 500
+    assert "btc_data" in payload["errors"]
+
+
+def test_poller_precomputes_payload_bytes(monkeypatch):
+    monkeypatch.setattr(market_data, "build_dashboard_summary", lambda: ({"btc_price_usd": 1}, 200))
+
+    poller = MarketDataPoller(intervals={})
+    assert poller.get_payload() is None
+
+    poller.poll_once()
+    body, status = poller.get_payload()
+    assert status == 200
+    assert json.loads(body) == {"btc_price_usd": 1}
+
+
+def test_poller_publishes_only_changed_fields():
+    class Publisher:
+        def __init__(self):
+            self.frames = []
+
+        def claim_publisher(self, name, ttl=30):
+            return True
+
+        def broadcast_market_update(self, changes):
+            self.frames.append(changes)
+
+    poller = MarketDataPoller()
+    publisher = Publisher()
+    poller.set_websocket_manager(publisher)
+
+    payload = {"btc_price_usd": 60000, "btc_change_24h": 1.5, "rsi_14": 50, "warnings": {}}
+    assert poller.publish_changes(payload) == {"btc_price_usd": 60000, "btc_change_24h": 1.5, "rsi_14": 50}
+    assert poller.publish_changes(dict(payload, btc_price_usd=60100)) == {"btc_price_usd": 60100}
+    assert poller.publish_changes(dict(payload, btc_price_usd=60100)) == {}
+    assert len(publisher.frames) == 2
+
+
+def test_coin_markets_are_chunked_into_columnar_table(monkeypatch):
+    from app.services import coingecko
+
+    urls = []
+
+    def fake_fetch(service, url, timeout=5):
+        urls.append(url)
+        ids = url.split("ids=")[1].split("&")[0].split(",")
+        return [{"id": coin_id, "symbol": coin_id[:3], "current_price": len(coin_id)}
+                for coin_id in ids if coin_id != "missingcoin"], None, 200
+
+    monkeypatch.setattr(coingecko, "fetch_service_json", fake_fetch)
+    monkeypatch.setattr(coingecko, "MARKETS_CHUNK_SIZE", 2)
+    monkeypatch.setattr(coingecko, "with_backup", lambda key, result, max_age_hours=6: result)
+
+    table, error, status = coingecko.get_coin_markets(["bitcoin", "ethereum", "missingcoin", "solana"])
+    assert error is None and status == 200
+    assert len(urls) == 2
+    assert table["id"] == ["bitcoin", "ethereum", "solana"]
+    assert table["symbol"] == ["BIT", "ETH", "SOL"]
+    assert table["price_usd"] == [7, 8, 6]
+    assert table["missing"] == ["missingcoin"]
+    assert coingecko.market_row(table, "eth")["id"] == "ethereum"
+    assert coingecko.market_row(table, "doge") is None
+
+
+def test_build_dashboard_summary_includes_markets_without_failing_on_them():
+    payload, status = market_data.build_dashboard_summary(_results(
+        watchlist=({"id": ["bitcoin"], "price_usd": [60000]}, None, 200),
+    ))
+    assert status == 200
+    assert payload["markets"]["id"] == ["bitcoin"]
+
+    payload, status = market_data.build_dashboard_summary(_results(
+        watchlist=(None, "Lỗi kết nối", 503),
+    ))
+    assert status == 200
+    assert "markets" not in payload
+    assert "watchlist" in payload["warnings"]
@@ -0,0 +1,44 @@
+"""
+Test market history: rollup bucket OHLC và truy vấn dạng cột
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.market_history import MarketHistory
+
+BASE = 1_700_000_000 // 86400 * 86400  # đầu một ngày UTC
+
+
+def test_points_roll_up_into_ohlc_buckets():
+    history = MarketHistory()
+    for offset, value in [(0, 100), (10, 105), (20, 95), (50, 102), (60, 110)]:
+        history.record("btc_price_usd", value, BASE + offset)
+
+    minutes = history.query("btc_price_usd", "1m", BASE, BASE + 120)
+    assert minutes["t"] == [BASE, BASE + 60]
+    assert (minutes["o"][0], minutes["h"][0], minutes["l"][0], minutes["c"][0]) == (100, 105, 95, 102)
+    assert minutes["n"] == [4, 1]
+
+    hours = history.query("btc_price_usd", "1h", BASE, BASE + 3600)
+    assert hours["t"] == [BASE]
+    assert (hours["o"][0], hours["h"][0], hours["l"][0], hours["c"][0], hours["n"][0]) == (100, 110, 95, 110, 5)
+
+
+def test_closed_hourly_buckets_queued_for_persistence():
+    history = MarketHistory()
+    history.record("fng_value", 40, BASE)
+    history.record("fng_value", 45, BASE + 1800)
+    assert history._pending == []
+
+    history.record("fng_value", 50, BASE + 3600)
+    assert history._pending == [("fng_value", "1h", (BASE, 40.0, 45.0, 40.0, 45.0, 2))]
+
+
+def test_record_source_skips_non_numeric_fields():
+    history = MarketHistory()
+    history.record_source("btc_data", {"btc_price_usd": "65000.5", "btc_change_24h": None})
+    history.record_source("unknown", {"btc_price_usd": 1})
+    assert history.metrics() == ["btc_price_usd"]
+    assert history.query("btc_price_usd", "1m")["c"] == [65000.5]
@@ -0,0 +1,63 @@
+"""
+Test memory cache tier: LRU eviction, giới hạn bytes và hết hạn theo heap
+"""
+import sys
+import os
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.memory_cache import BoundedMemoryCache
+
+
+def test_lru_eviction_by_entry_count():
+    cache = BoundedMemoryCache(max_entries=2)
+    cache.set("a", 1, ttl=60)
+    cache.set("b", 2, ttl=60)
+    assert cache.get("a") == 1  # "a" mới được dùng, "b" là LRU
+    cache.set("c", 3, ttl=60)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_byte_budget_is_enforced():
+    cache = BoundedMemoryCache(max_entries=100, max_bytes=1000)
+    for i in range(10):
+        cache.set(f"k{i}", "x", ttl=60, size=300)
+    assert len(cache) == 3
+    assert cache.current_bytes == 900
+    assert cache.set("huge", "x", ttl=60, size=2000) is False
+
+    cache.set("k9", "x", ttl=60, size=100)
+    assert cache.current_bytes == 700
+
+
+def test_expired_entries_purged_from_heap():
+    cache = BoundedMemoryCache()
+    cache.set("short", 1, ttl=0.05)
+    cache.set("long", 2, ttl=60)
+    cache.set("short", 3, ttl=0.05)  # ghi đè: token cũ trong heap bị bỏ qua
+    time.sleep(0.1)
+    assert cache.purge_expired() == 1
+    assert cache.get("short") is None
+    assert cache.get("long") == 2
+    assert len(cache) == 1
+
+
+def test_concurrent_access_keeps_accounting_consistent():
+    cache = BoundedMemoryCache(max_entries=50)
+
+    def worker(offset):
+        for i in range(500):
+            cache.set(f"k{(i + offset) % 80}", i, ttl=60, size=10)
+            cache.get(f"k{i % 80}")
+
+    threads = [threading.Thread(target=worker, args=(n * 7,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(cache) <= 50
+    assert cache.current_bytes == len(cache) * 10
@@ -0,0 +1,77 @@
+"""
+Test smart_cache: request coalescing và làm mới sớm kiểu XFetch
+"""
+import sys
+import os
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.enhanced_cache import smart_cache, CacheStrategy, _should_recompute_early
+
+
+def test_concurrent_cold_callers_share_one_call():
+    calls = []
+
+    @smart_cache(timeout=60, key_prefix="coalesce", strategy=CacheStrategy.MEMORY_ONLY, beta=0)
+    def slow(x):
+        calls.append(x)
+        time.sleep(0.2)
+        return {"x": x}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(slow(1))) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert results == [{"x": 1}] * 10
+    assert slow(1) == {"x": 1} and len(calls) == 1
+
+
+def test_leader_error_propagates_to_waiters():
+    @smart_cache(timeout=60, key_prefix="error", strategy=CacheStrategy.MEMORY_ONLY)
+    def failing():
+        time.sleep(0.1)
+        raise RuntimeError("upstream down")
+
+    errors = []
+
+    def call():
+        try:
+            failing()
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == ["upstream down"] * 5
+
+
+def test_xfetch_probability_grows_near_expiry():
+    now = 1000.0
+    fresh = {"delta": 0.5, "expires_at": now + 3600}
+    expiring = {"delta": 0.5, "expires_at": now + 0.01}
+    assert not any(_should_recompute_early(fresh, 1.0, now) for _ in range(200))
+    assert sum(_should_recompute_early(expiring, 1.0, now) for _ in range(200)) > 150
+    assert not _should_recompute_early(expiring, 0, now)
+
+
+def test_early_recompute_refreshes_value():
+    calls = []
+
+    @smart_cache(timeout=60, key_prefix="early", strategy=CacheStrategy.MEMORY_ONLY, beta=1e9)
+    def counter():
+        calls.append(1)
+        time.sleep(0.01)
+        return len(calls)
+
+    assert counter() == 1
+    # beta rất lớn: lần đọc sau luôn được tính lại sớm
+    assert counter() == 2
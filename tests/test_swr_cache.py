@@ -0,0 +1,127 @@
+"""
+Test SWR cache: single-flight refresh và stale-while-revalidate
+"""
+import sys
+import os
+import asyncio
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.swr_cache import SWRCache, SourcePolicy
+from app.utils.async_runtime import run_sync, gather_with_timeouts
+
+
+def test_concurrent_misses_share_one_fetch():
+    calls = []
+
+    def slow_loader():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"value": len(calls)}, None, 200
+
+    swr = SWRCache()
+    swr.register("slow", slow_loader, SourcePolicy(soft_ttl=60, hard_ttl=600, wait_timeout=5))
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(swr.get("slow"))) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert all(r == ({"value": 1}, None, 200) for r in results)
+
+
+def test_stale_value_served_while_refreshing():
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        if len(calls) > 1:
+            release.wait(2)
+        return {"value": len(calls)}, None, 200
+
+    swr = SWRCache()
+    swr.register("src", loader, SourcePolicy(soft_ttl=0, hard_ttl=600, wait_timeout=5))
+    assert swr.get("src")[0] == {"value": 1}
+
+    # Quá soft TTL: trả ngay dữ liệu cũ, refresh chạy nền
+    start = time.time()
+    assert swr.get("src")[0] == {"value": 1}
+    assert time.time() - start < 0.5
+
+    release.set()
+    swr.refresh("src").result(timeout=2)
+    data, age = swr.peek("src")
+    assert data == {"value": 2}
+
+
+def test_failed_refresh_keeps_last_good_value():
+    responses = [({"value": 1}, None, 200), (None, "boom", 500)]
+
+    swr = SWRCache()
+    swr.register("src", lambda: responses.pop(0), SourcePolicy(soft_ttl=0, hard_ttl=600))
+    assert swr.get("src")[0] == {"value": 1}
+
+    swr.refresh("src").result(timeout=2)
+    assert swr.get("src")[0] == {"value": 1}
+    assert swr.stats()["src"]["last_error"] == "boom"
+
+
+def test_backup_values_are_cached_but_not_sent_to_listeners():
+    # 203: loader trả giá trị backup (xem api_client.with_backup)
+    responses = [({"value": 1}, None, 200), ({"value": 0}, None, 203)]
+    recorded = []
+
+    swr = SWRCache()
+    swr.register("src", lambda: responses.pop(0), SourcePolicy(soft_ttl=0, hard_ttl=600))
+    swr.add_listener(lambda name, data: recorded.append(data))
+    swr.refresh("src").result(timeout=2)
+    swr.refresh("src").result(timeout=2)
+
+    assert swr.peek("src")[0] == {"value": 0}
+    assert recorded == [{"value": 1}]
+
+
+def test_timeout_returns_408():
+    def hanging_loader():
+        time.sleep(1)
+        return {"value": 1}, None, 200
+
+    swr = SWRCache()
+    swr.register("hang", hanging_loader, SourcePolicy(wait_timeout=0.1))
+    data, error, status = swr.get("hang")
+    assert data is None and status == 408
+
+
+def test_async_loader_runs_on_shared_loop():
+    calls = []
+
+    async def async_loader():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return {"value": "async"}, None, 200
+
+    swr = SWRCache()
+    swr.register("async_src", async_loader, SourcePolicy(wait_timeout=5))
+    results = swr.get_many(["async_src"])
+    swr.get("async_src")
+    assert results["async_src"] == ({"value": "async"}, None, 200)
+    assert len(calls) == 1
+
+
+def test_gather_with_timeouts_isolates_slow_calls():
+    async def fast():
+        return {"ok": True}, None, 200
+
+    async def slow():
+        await asyncio.sleep(2)
+        return {"ok": False}, None, 200
+
+    results = run_sync(gather_with_timeouts({"fast": fast(), "slow": slow()}, timeout=0.2))
+    assert results["fast"] == ({"ok": True}, None, 200)
+    assert results["slow"] == (None, "Timeout", 408)
@@ -0,0 +1,104 @@
+"""
+Test token bucket dùng chung và rate limiter của các API upstream
+"""
+import asyncio
+import sys
+import os
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.token_bucket import InMemoryTokenBucket, create_token_bucket
+from app.utils.rate_limiter import APIServiceManager, AdaptiveRateLimiter, RateLimitConfig
+
+
+def test_bucket_allows_burst_then_reports_wait():
+    bucket = InMemoryTokenBucket()
+    assert bucket.acquire("svc", capacity=2, refill_rate=1)[0]
+    assert bucket.acquire("svc", capacity=2, refill_rate=1)[0]
+
+    allowed, wait_time = bucket.acquire("svc", capacity=2, refill_rate=1)
+    assert not allowed
+    assert 0 < wait_time <= 1
+
+    bucket.reset("svc")
+    assert bucket.acquire("svc", capacity=2, refill_rate=1)[0]
+
+
+def test_without_redis_uses_in_process_bucket():
+    assert isinstance(create_token_bucket(None), InMemoryTokenBucket)
+
+
+def test_managers_sharing_bucket_share_one_quota():
+    # Hai manager (như hai worker) dùng chung một backend: quota không nhân đôi
+    bucket = InMemoryTokenBucket()
+    worker_a = APIServiceManager(bucket)
+    worker_b = APIServiceManager(bucket)
+
+    assert worker_a.can_call_api("taapi")[0]
+    can_request, wait_time = worker_b.can_call_api("taapi")
+    assert not can_request
+    assert wait_time > 0
+
+
+
+def test_acquire_waits_for_next_token_within_timeout():
+    limiter = AdaptiveRateLimiter("fast", RateLimitConfig(requests_per_minute=1200, burst_limit=1),
+                                  InMemoryTokenBucket())
+
+    assert limiter.acquire(timeout=0)
+    # Token tiếp theo hồi sau ~0.05s: timeout quá ngắn thì trả False ngay
+    assert not limiter.acquire(timeout=0.001)
+    assert limiter.acquire(timeout=1)
+    assert limiter.get_stats()["requests_last_minute"] == 0
+
+
+def test_backoff_stays_local_and_shared_bucket_uses_configured_rate():
+    bucket = InMemoryTokenBucket()
+    config = RateLimitConfig(requests_per_minute=1200, burst_limit=10, circuit_failure_threshold=100)
+    worker_a = AdaptiveRateLimiter("svc", config, bucket)
+    worker_b = AdaptiveRateLimiter("svc", config, bucket)
+
+    # Worker A bị 429 nhiều lần: interval của A tăng lên vài giây
+    for _ in range(10):
+        worker_a.record_failure(429)
+    assert worker_a._current_interval > 1
+
+    assert worker_a.can_make_request()[0]
+    can_request, wait_time = worker_a.can_make_request()
+    assert not can_request and wait_time > 1
+    # Worker B vẫn gọi theo quota cấu hình, không bị backoff của A kéo chậm
+    assert all(worker_b.can_make_request()[0] for _ in range(5))
+
+
+def test_acquire_async_checks_bucket_off_the_event_loop():
+    threads = []
+
+    class _RecordingBucket(InMemoryTokenBucket):
+        def acquire(self, name, capacity, refill_rate, tokens=1):
+            threads.append(threading.get_ident())
+            return super().acquire(name, capacity, refill_rate, tokens)
+
+    limiter = APIServiceManager(_RecordingBucket()).get_limiter("async")
+
+    async def main():
+        loop_thread = threading.get_ident()
+        assert await limiter.acquire_async(timeout=1)
+        return loop_thread
+
+    loop_thread = asyncio.run(main())
+    # Bucket Redis là I/O đồng bộ: không được chạy trên thread của event loop
+    assert threads and loop_thread not in threads
+
+
+def test_stats_use_sliding_window_and_recent_response_times():
+    limiter = APIServiceManager(InMemoryTokenBucket()).get_limiter("stats")
+    limiter.config.adaptive_scaling = False
+    for i in range(12):
+        limiter.record_request(response_time=float(i))
+    limiter._requests.appendleft(0.0)  # request cũ hơn 60s bị bỏ khỏi cửa sổ
+
+    stats = limiter.get_stats()
+    assert stats["requests_last_minute"] == 12
+    # Chỉ 10 response time gần nhất: 2..11
+    assert stats["avg_response_time"] == 6.5
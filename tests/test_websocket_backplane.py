@@ -0,0 +1,154 @@
+"""
+Test WebSocket backplane: subscription store và broadcast theo channel
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from app.websocket import backplane
+from app.websocket.backplane import InMemorySubscriptionStore, RedisSubscriptionStore, create_subscription_store
+from app.websocket.manager import WebSocketManager
+
+
+def _make_manager():
+    app = Flask(__name__)
+    app.config['SOCKETIO_MESSAGE_QUEUE'] = None
+    return app, WebSocketManager(app)
+
+
+def test_in_memory_store_tracks_channels():
+    store = InMemorySubscriptionStore()
+    store.add("reports", "a")
+    store.add("reports", "b")
+    store.add("system_status", "a")
+    assert store.channels() == {"reports": 2, "system_status": 1}
+
+    store.remove_session("a", ["reports", "system_status"])
+    assert store.channels() == {"reports": 1}
+    assert not store.has_subscribers("system_status")
+
+
+class _FakeRedis:
+    """Các lệnh set/zset tối thiểu mà RedisSubscriptionStore dùng (pipeline chạy ngay)"""
+
+    def __init__(self):
+        self.sets = {}
+        self.zsets = {}
+
+    def pipeline(self):
+        return _FakePipeline(self)
+
+    def sadd(self, key, *members):
+        self.sets.setdefault(key, set()).update(members)
+
+    def srem(self, key, *members):
+        self.sets.get(key, set()).difference_update(members)
+
+    def scard(self, key):
+        return len(self.sets.get(key, ()))
+
+    def smembers(self, key):
+        return set(self.sets.get(key, ()))
+
+    def expire(self, key, ttl):
+        return key in self.sets
+
+    def delete(self, *keys):
+        for key in keys:
+            self.sets.pop(key, None)
+            self.zsets.pop(key, None)
+
+    def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    def zrem(self, key, *members):
+        for member in members:
+            self.zsets.get(key, {}).pop(member, None)
+
+    def zrangebyscore(self, key, low, high):
+        low = float("-inf") if low == "-inf" else low
+        high = float("inf") if high == "+inf" else high
+        return [m for m, score in self.zsets.get(key, {}).items() if low <= score <= high]
+
+
+class _FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.results = []
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.results.append(getattr(self.redis, name)(*args, **kwargs))
+            return self
+        return call
+
+    def execute(self):
+        results, self.results = self.results, []
+        return results
+
+
+def test_redis_store_expires_subscriptions_of_dead_workers():
+    redis = _FakeRedis()
+    live = RedisSubscriptionStore(redis)
+    dead = RedisSubscriptionStore(redis)
+    dead._owner, dead._owner_pid = "host:1:dead", os.getpid()
+
+    live.add("reports", "a")
+    dead.add("reports", "b")
+    dead.add("market", "b")
+    assert live.count("reports") == 2
+    assert live.channels() == {"reports": 2, "market": 1}
+
+    # Worker chết không còn heartbeat: hết TTL thì không được tính nữa và bị dọn
+    redis.zsets[backplane.WORKERS_KEY]["host:1:dead"] -= live.ttl + 1
+    assert live.count("reports") == 1
+    assert not live.has_subscribers("market")
+    live.heartbeat()
+    assert "host:1:dead" not in redis.zsets[backplane.WORKERS_KEY]
+    assert not [key for key in redis.sets if "host:1:dead" in key]
+
+    live.remove_session("a", ["reports"])
+    assert live.channels() == {}
+
+
+def test_without_message_queue_uses_in_process_store():
+    assert isinstance(create_subscription_store(None), InMemorySubscriptionStore)
+
+
+def test_broadcast_reaches_only_channel_subscribers():
+    app, manager = _make_manager()
+    subscriber = manager.socketio.test_client(app)
+    other = manager.socketio.test_client(app)
+    subscriber.emit('subscribe', {'channel': 'reports'})
+    subscriber.get_received()
+    other.get_received()
+
+    manager.broadcast_report_completed({'id': 1})
+    events = [msg['name'] for msg in subscriber.get_received()]
+    assert events == ['report_completed']
+    assert other.get_received() == []
+
+    subscriber.disconnect()
+    assert not manager.subscriptions.has_subscribers('reports')
+
+
+def test_channel_updates_are_coalesced():
+    app, manager = _make_manager()
+    client = manager.socketio.test_client(app)
+    client.emit('subscribe', {'channel': 'market'})
+    client.get_received()
+
+    manager.broadcast_market_update({'btc_price_usd': 1})
+    manager.broadcast_market_update({'btc_price_usd': 2, 'rsi_14': 55})
+    manager.broadcast_market_update({'fng_value': '40'})
+    frames = client.get_received()
+    assert [frame['args'][0]['data'] for frame in frames] == [{'btc_price_usd': 1}]
+
+    # Hết khoảng chờ: các thay đổi dồn lại được gửi trong một frame
+    manager._last_flush['market'] = 0
+    assert manager.flush_channel_updates() == 1
+    frames = client.get_received()
+    assert [frame['args'][0]['data'] for frame in frames] == [{'btc_price_usd': 2, 'rsi_14': 55, 'fng_value': '40'}]
@@ -0,0 +1,136 @@
+"""
+Test checkpoint theo node và resume report workflow v2
+"""
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from app.extensions import db
+from app.models import WorkflowCheckpoint  # noqa: F401  (đăng ký bảng workflow_checkpoint)
+from app.services import report_workflow_v2
+from app.services.workflow_checkpoints import WorkflowCheckpointStore
+from app.services.workflow_nodes import (
+    prepare_data,
+    research_deep,
+    validate_report,
+    generate_report_content,
+    create_interface_components,
+    translate_content,
+    save_database,
+)
+
+
+def _install_fake_nodes(monkeypatch, calls, translate_failures):
+    def node(name, **values):
+        def run(state):
+            calls.append(name)
+            state.update(values)
+            state["success"] = True
+            return state
+        return run
+
+    def translate(state):
+        calls.append("translate_content")
+        if translate_failures:
+            translate_failures.pop()
+            raise RuntimeError("translate quota exceeded")
+        state["html_content_en"] = "<div>Report EN</div>"
+        return state
+
+    def branch(kind):
+        def run(state):
+            calls.append(kind)
+            return {f"{kind}_content": f"/* {kind} */", f"{kind}_attempt": 1, f"{kind}_error": None}
+        return run
+
+    monkeypatch.setattr(prepare_data, "prepare_data_node", node("prepare_data", client=object(), current_attempt=0))
+    monkeypatch.setattr(research_deep, "research_deep_node", node("research_deep", research_content="research"))
+    monkeypatch.setattr(validate_report, "validate_report_node", node("validate_report", validation_result="PASS"))
+    monkeypatch.setattr(generate_report_content, "generate_report_content_node",
+                        node("generate_report_content", report_content="report"))
+    monkeypatch.setattr(create_interface_components, "create_html_node", node("create_html", html_content="<div>Report</div>"))
+    monkeypatch.setattr(create_interface_components, "create_javascript_node", branch("js"))
+    monkeypatch.setattr(create_interface_components, "create_css_node", branch("css"))
+    monkeypatch.setattr(translate_content, "translate_content_node", translate)
+    monkeypatch.setattr(save_database, "save_database_node", node("save_database", report_id=42))
+
+
+def test_failed_run_resumes_after_last_successful_node(monkeypatch):
+    store = WorkflowCheckpointStore()
+    monkeypatch.setattr(report_workflow_v2, "checkpoint_store", store)
+    calls = []
+    _install_fake_nodes(monkeypatch, calls, translate_failures=[True])
+
+    result = report_workflow_v2.generate_auto_research_report_langgraph_v2("key", session_id="s1")
+    assert not result["success"]
+
+    checkpoint = store.load("s1")
+    assert checkpoint["status"] == "failed"
+    assert checkpoint["last_node"] == "join_interface"
+    assert store.resume_point(checkpoint) == "translate_content"
+    # Không lưu client và API key
+    assert "client" not in checkpoint["state"] and "api_key" not in checkpoint["state"]
+    assert checkpoint["state"]["css_content"] == "/* css */"
+
+    calls.clear()
+    resumed = report_workflow_v2.resume_report_workflow_v2("key", "s1")
+    assert resumed["success"]
+    assert resumed["report_id"] == 42
+    assert resumed["js_content"] == "/* js */"
+    assert calls == ["prepare_data", "translate_content", "save_database"]
+    # Thành công thì checkpoint được xóa
+    assert store.load("s1") is None
+
+
+def test_sql_store_merges_node_updates():
+    flask_app = Flask(__name__)
+    flask_app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(flask_app)
+    store = WorkflowCheckpointStore()
+
+    with flask_app.app_context():
+        db.create_all()
+
+        store.save("s2", "create_html", {"html_content": "<div/>", "client": object(), "api_key": "secret"})
+        store.save("s2", "create_css", {"css_content": "body{}"})
+        store.finish("s2", success=False)
+
+        checkpoint = store.load("s2")
+        assert checkpoint["state"] == {"html_content": "<div/>", "css_content": "body{}"}
+        assert checkpoint["completed_nodes"] == ["create_html", "create_css"]
+        assert checkpoint["status"] == "failed"
+        assert store.resume_point(checkpoint) == "create_components"
+
+        store.finish("s2", success=True)
+        assert store.load("s2") is None
+
+
+def test_stale_running_checkpoint_is_resumable():
+    # Worker bị kill giữa chừng: checkpoint không bao giờ qua finish() nên vẫn là "running"
+    store = WorkflowCheckpointStore(stale_after=600)
+    store.save("s4", "research_deep", {"research_content": "research"})
+    assert not store.is_resumable(store.load("s4"))
+    store._memory["s4"]["updated_at"] -= 601
+    assert store.is_resumable(store.load("s4"))
+
+    flask_app = Flask(__name__)
+    flask_app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(flask_app)
+    with flask_app.app_context():
+        db.create_all()
+        store.save("s5", "research_deep", {"research_content": "research"})
+        assert not store.is_resumable(store.load("s5"))
+
+        row = db.session.get(WorkflowCheckpoint, "s5")
+        row.updated_at = datetime.now(timezone.utc) - timedelta(seconds=601)
+        db.session.commit()
+        assert store.is_resumable(store.load("s5"))
+
+
+def test_resumed_branch_with_content_skips_llm_call():
+    state = {"session_id": "s3", "css_content": "body{}", "css_attempt": 2, "client": None}
+    assert create_interface_components.create_css_node(state) == {"css_attempt": 2}
@@ -0,0 +1,119 @@
+"""
+Test fan-out JS/CSS song song sau HTML và registry graph đã compile của report workflow v2
+"""
+import sys
+import os
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.report_workflow_v2 import _build_workflow
+from app.services.workflow_nodes import create_interface_components as components
+
+
+class _FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class _FakeModels:
+    """Trả về khối mã theo prompt, ghi lại số request đang chạy đồng thời"""
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, model, contents, config):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.2)
+        with self._lock:
+            self.active -= 1
+        prompt = contents[0].parts[0].text
+        if prompt.startswith("JS"):
+            return _FakeResponse("```javascript\nconsole.log(1);\n```")
+        return _FakeResponse("```css\nbody { color: red; }\n```")
+
+    def generate_content_stream(self, model, contents, config):
+        text = self.generate_content(model, contents, config).text
+        middle = len(text) // 2
+        yield _FakeResponse(text[:middle])
+        yield _FakeResponse(text[middle:])
+
+
+class _FakeClient:
+    def __init__(self):
+        self.models = _FakeModels()
+
+
+def _state(client):
+    return {
+        "session_id": "parallel-test",
+        "html_content": "<div>Report</div>",
+        "error_messages": [],
+        "client": client,
+        "model": "test-model",
+    }
+
+
+def test_graph_fans_out_js_and_css_after_html():
+    edges = {(edge.source, edge.target) for edge in _build_workflow().get_graph().edges}
+    assert ("create_html", "create_javascript") in edges
+    assert ("create_html", "create_css") in edges
+    assert ("create_javascript", "join_interface") in edges
+    assert ("create_css", "join_interface") in edges
+    assert ("create_javascript", "create_css") not in edges
+
+
+def test_branches_return_own_keys_and_run_concurrently(monkeypatch):
+    monkeypatch.setattr(components, "read_prompt_file",
+                        lambda name: "JS prompt" if "javascript" in name else "CSS prompt")
+    client = _FakeClient()
+    state = _state(client)
+
+    results = {}
+    threads = [
+        threading.Thread(target=lambda: results.update(js=components.create_javascript_node(state))),
+        threading.Thread(target=lambda: results.update(css=components.create_css_node(state))),
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert client.models.max_active == 2
+    assert results["js"] == {"js_content": "console.log(1);", "js_attempt": 1, "js_error": None}
+    assert results["css"] == {"css_content": "body { color: red; }", "css_attempt": 1, "css_error": None}
+    # Nhánh song song không sửa state dùng chung
+    assert state["error_messages"] == [] and "js_attempt" not in state
+
+
+def test_join_collects_branch_errors():
+    state = _state(None)
+    assert components.join_interface_node({**state, "js_error": None, "css_error": None}) == {"success": True}
+
+    update = components.join_interface_node({**state, "css_error": "Không nhận được nội dung CSS từ AI"})
+    assert update["success"] is False
+    assert update["error_messages"] == ["Không nhận được nội dung CSS từ AI"]
+
+
+def test_compiled_workflow_is_reused_until_nodes_change(monkeypatch):
+    from app.services import report_workflow_v2
+
+    registry = report_workflow_v2.CompiledWorkflowRegistry()
+    monkeypatch.setattr(report_workflow_v2, "workflow_registry", registry)
+
+    first = report_workflow_v2.get_compiled_workflow()
+    assert report_workflow_v2.get_compiled_workflow() is first
+    assert registry.stats()["report_v2"]["builds"] == 1
+
+    # Thay node (hoặc đổi WORKFLOW_VERSION) thì fingerprint đổi và graph được compile lại
+    monkeypatch.setattr(components, "create_css_node", lambda state: {})
+    rebuilt = report_workflow_v2.get_compiled_workflow()
+    assert rebuilt is not first
+    monkeypatch.setattr(report_workflow_v2, "WORKFLOW_VERSION", report_workflow_v2.WORKFLOW_VERSION + 1)
+    assert report_workflow_v2.get_compiled_workflow() is not rebuilt
+    assert registry.stats()["report_v2"]["builds"] == 3